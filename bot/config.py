@@ -6,7 +6,7 @@ load_dotenv()
 
 # تنظیمات بات
 BOT_TOKEN = os.getenv('BOT_TOKEN')
-ADMIN_IDS = list(map(int, os.getenv('ADMIN_IDS', '').split(',')))
+ADMIN_IDS = [int(admin_id) for admin_id in os.getenv('ADMIN_IDS', '').split(',') if admin_id.strip()]
 
 
 # ساخت رشته اتصال به PostgreSQL
@@ -0,0 +1,70 @@
+"""
+Shared pytest fixtures.
+
+Tests marked postgres run against the database in DATABASE_URL, migrated
+with `python main.py migrate`, and are skipped when it is not a PostgreSQL
+URL. They share one connection whose transaction is rolled back at the end
+of the run, and each test runs in a savepoint rolled back after it: commits
+in the code under test only release savepoints, so nothing is left behind.
+
+Run the tests from the bot directory:
+
+    python -m pytest
+"""
+import os
+import pytest
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+# سیوپوینت‌ها را خود fixtureها می‌سازند و جزو کار عملیات نیستند
+_SAVEPOINT_STATEMENTS = ("SAVEPOINT", "RELEASE SAVEPOINT", "ROLLBACK TO SAVEPOINT")
+
+
+def pytest_configure(config):
+    config.addinivalue_line("markers", "postgres: needs the PostgreSQL database in DATABASE_URL")
+
+
+@pytest.fixture(scope="session")
+def pg_database():
+    """A connection to DATABASE_URL inside a transaction that is rolled back after the run."""
+    from database.db_handler import get_engine  # .env را هم بارگذاری می‌کند
+    if not os.getenv("DATABASE_URL", "").startswith("postgresql"):
+        pytest.skip("DATABASE_URL does not point to PostgreSQL")
+    with get_engine().connect() as connection:
+        transaction = connection.begin()
+        try:
+            yield connection
+        finally:
+            transaction.rollback()
+
+
+@pytest.fixture
+def pg_connection(pg_database):
+    """pg_database inside a savepoint that is rolled back after the test."""
+    savepoint = pg_database.begin_nested()
+    try:
+        yield pg_database
+    finally:
+        savepoint.rollback()
+
+
+@pytest.fixture
+def pg_session(pg_connection) -> Session:
+    """A session on pg_connection whose commits only release savepoints."""
+    session = Session(bind=pg_connection, join_transaction_mode="create_savepoint", expire_on_commit=False)
+    yield session
+    session.close()
+
+
+@pytest.fixture
+def sent_statements(pg_connection) -> list:
+    """(statement, parameters) of every statement sent on pg_connection, savepoints excluded; clear() it to start counting."""
+    sent = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        if not statement.lstrip().upper().startswith(_SAVEPOINT_STATEMENTS):
+            sent.append((statement, parameters))
+
+    event.listen(pg_connection, "before_cursor_execute", capture)
+    yield sent
+    event.remove(pg_connection, "before_cursor_execute", capture)
@@ -6,19 +6,12 @@ Handles database connections and operations.
 # This file marks the 'database' directory as a Python package
 # It allows importing modules from this directory
 
-from sqlalchemy import create_engine
-from .models import Base
-from dotenv import load_dotenv
-import os
-
-load_dotenv()
-DATABASE_URL = os.getenv('DATABASE_URL')
 
 def init_database():
-    """Initialize the database by creating all tables."""
-    engine = create_engine(DATABASE_URL)
-    Base.metadata.create_all(bind=engine)
-    print("Database tables created successfully!")
+    """Initialize the database by running the migrations (alembic upgrade head)."""
+    from .migrate import migrate
+    migrate()
+    print("Database schema is up to date!")
 
 if __name__ == "__main__":
     init_database()
@@ -0,0 +1,224 @@
+"""
+Async counterparts of the operations in db_operations.
+
+Every function here takes an AsyncSession and runs the matching sync
+operation through AsyncSession.run_sync, so the statements go out over the
+async driver and the handler awaits them instead of blocking the event loop.
+The queries themselves live only in db_operations.
+
+Item writes also refresh the in-process item_index used by inline search.
+Catalog reads (items and item lists) are served from catalog_cache as
+ItemSnapshots, and the writes that change the catalog invalidate it. Those
+reads and the comment list reads also go through single_flight, so identical
+concurrent calls share one query. get_user is served from user_cache, which
+the writes that change a user invalidate.
+"""
+import inspect
+from functools import wraps
+from sqlalchemy.ext.asyncio import AsyncSession
+from . import db_operations
+from .catalog_cache import LISTS_TAG, catalog_cache, item_tag, snapshot, type_tag
+from .search_index import item_index
+from .single_flight import in_flight, merged
+from .user_cache import UserSnapshot, session_users, user_cache
+
+
+def _run_sync(operation):
+    """Wrap a sync db operation so it can be awaited with an AsyncSession."""
+    @wraps(operation)
+    async def wrapper(db: AsyncSession, *args, **kwargs):
+        return await db.run_sync(operation, *args, **kwargs)
+    return wrapper
+
+def _reindex_item(operation):
+    """Wrap an async item write so the item it returns is (re)indexed in item_index."""
+    @wraps(operation)
+    async def wrapper(db: AsyncSession, *args, **kwargs):
+        item = await operation(db, *args, **kwargs)
+        if item is not None:
+            item_index.add(item)
+        return item
+    return wrapper
+
+def _cached_catalog_read(operation, tags):
+    """
+    Wrap an async catalog read so its results come from catalog_cache.
+
+    The key is the operation and its arguments; tags(arguments) gives the
+    cache tags of the result (see catalog_cache). Items in the result are
+    returned as ItemSnapshots, on hits and misses alike. Only results read
+    from the primary are stored: a replica may not have caught up with the
+    write behind the last invalidation yet.
+    """
+    signature = inspect.signature(operation)
+
+    @wraps(operation)
+    async def wrapper(db: AsyncSession, *args, **kwargs):
+        key = (operation.__name__, args, tuple(sorted(kwargs.items())))
+        hit, result = catalog_cache.get(key)
+        if hit:
+            return result
+        generation = catalog_cache.generation
+        from_primary = db.sync_session.reads_from_primary()
+        result = snapshot(await operation(db, *args, **kwargs))
+        if from_primary:
+            arguments = signature.bind(db, *args, **kwargs).arguments
+            catalog_cache.put(key, result, tags(arguments), generation)
+        return result
+    return wrapper
+
+def _single_flight(operation, share=None):
+    """
+    Wrap an async read so identical concurrent calls share one query (see single_flight).
+
+    Callers that joined another caller's query get its result through
+    share(db, result) when given, e.g. to merge ORM objects into their own session.
+    """
+    @wraps(operation)
+    async def wrapper(db: AsyncSession, *args, **kwargs):
+        key = (
+            operation.__name__, args, tuple(sorted(kwargs.items())),
+            db.sync_session.reads_from_primary(), catalog_cache.generation,
+        )
+        result, shared = await in_flight.do(key, lambda: operation(db, *args, **kwargs))
+        if shared and share is not None:
+            result = await share(db, result)
+        return result
+    return wrapper
+
+async def _merge_shared(db: AsyncSession, result):
+    return await db.run_sync(merged, result)
+
+def _invalidates_catalog(operation, invalidate):
+    """Wrap an async write so invalidate(result, *args, **kwargs) drops the catalog_cache entries it made stale."""
+    @wraps(operation)
+    async def wrapper(db: AsyncSession, *args, **kwargs):
+        result = await operation(db, *args, **kwargs)
+        invalidate(result, *args, **kwargs)
+        return result
+    return wrapper
+
+def _invalidate_written_item(item, *args, **kwargs):
+    if item is not None:
+        catalog_cache.invalidate_item(item.item_id, item.type)
+
+def _invalidate_commented_item(comment, *args, **kwargs):
+    catalog_cache.invalidate_item(comment.item_id)  # comment_count تغییر کرده است
+
+def _invalidate_moderated_content(changed, content_type, *args, **kwargs):
+    if content_type == "comment":
+        catalog_cache.clear()  # comment_count یک محصول نامشخص ممکن است تغییر کرده باشد
+
+def _cached_user_read(operation):
+    """
+    Wrap the async get_user so users come from the update's session, then user_cache, as UserSnapshots.
+
+    As in _cached_catalog_read, only users read from the primary go into user_cache.
+    """
+    @wraps(operation)
+    async def wrapper(db: AsyncSession, user_id: int):
+        users = session_users(db.info)
+        if user_id in users:
+            return users[user_id]
+        user = user_cache.get(user_id)
+        if user is None:
+            generation = user_cache.generation
+            from_primary = db.sync_session.reads_from_primary()
+            row = await operation(db, user_id)
+            user = UserSnapshot.from_user(row) if row is not None else None
+            if user is not None and from_primary:
+                user_cache.put(user, generation)
+        users[user_id] = user
+        return user
+    return wrapper
+
+def _invalidates_user(operation):
+    """Wrap an async write so the user in its user_id argument is dropped from the update's session and user_cache."""
+    signature = inspect.signature(operation)
+
+    @wraps(operation)
+    async def wrapper(db: AsyncSession, *args, **kwargs):
+        user_id = signature.bind(db, *args, **kwargs).arguments["user_id"]
+        try:
+            return await operation(db, *args, **kwargs)
+        finally:
+            session_users(db.info).pop(user_id, None)
+            user_cache.invalidate(user_id)
+    return wrapper
+
+def _type_list_tags(arguments):
+    return {LISTS_TAG, type_tag(arguments["type"])}
+
+##############################
+# User Operations
+##############################
+create_user = _invalidates_user(_run_sync(db_operations.create_user))
+get_user = _cached_user_read(_run_sync(db_operations.get_user))
+update_user_status = _invalidates_user(_run_sync(db_operations.update_user_status))
+update_user_rank_score = _invalidates_user(_run_sync(db_operations.update_user_rank_score))
+update_user = _invalidates_user(_run_sync(db_operations.update_user))
+add_rank_scores = _run_sync(db_operations.add_rank_scores)
+
+##########################
+# Item Operations
+##########################
+create_item = _invalidates_catalog(_reindex_item(_run_sync(db_operations.create_item)), _invalidate_written_item)
+update_item = _invalidates_catalog(_reindex_item(_run_sync(db_operations.update_item)), _invalidate_written_item)
+get_items_by_type = _cached_catalog_read(_single_flight(_run_sync(db_operations.get_items_by_type)), _type_list_tags)
+get_item_page = _cached_catalog_read(_single_flight(_run_sync(db_operations.get_item_page)), _type_list_tags)
+search_items = _run_sync(db_operations.search_items)
+get_item = _cached_catalog_read(_single_flight(_run_sync(db_operations.get_item)), lambda arguments: {item_tag(arguments["item_id"])})
+get_items = _cached_catalog_read(_single_flight(_run_sync(db_operations.get_items)), lambda arguments: {LISTS_TAG, type_tag(None)})
+get_items_uncached = _run_sync(db_operations.get_items)  # برای بازسازی item_index، مستقیم از دیتابیس
+
+###################################
+# Comment Operations
+###################################
+create_comment = _invalidates_catalog(_run_sync(db_operations.create_comment), _invalidate_commented_item)
+get_comments_by_item = _single_flight(_run_sync(db_operations.get_comments_by_item), _merge_shared)
+get_comment_page = _single_flight(_run_sync(db_operations.get_comment_page), _merge_shared)
+create_comment_reply = _run_sync(db_operations.create_comment_reply)
+get_comment_replies = _run_sync(db_operations.get_comment_replies)
+get_reply_replies = _run_sync(db_operations.get_reply_replies)
+count_direct_replies_to_comment = _run_sync(db_operations.count_direct_replies_to_comment)
+count_sub_replies = _run_sync(db_operations.count_sub_replies)
+get_reply_page = _run_sync(db_operations.get_reply_page)
+get_reply_tree_info = _run_sync(db_operations.get_reply_tree_info)
+get_reply_subtree = _run_sync(db_operations.get_reply_subtree)
+get_reply_ancestors = _run_sync(db_operations.get_reply_ancestors)
+
+##########################################
+# Technical Question Operations
+##########################################
+create_tech_question = _run_sync(db_operations.create_tech_question)
+get_top_tech_questions = _run_sync(db_operations.get_top_tech_questions)
+get_tech_question = _run_sync(db_operations.get_tech_question)
+create_question_reply = _run_sync(db_operations.create_question_reply)
+get_question_replies = _run_sync(db_operations.get_question_replies)
+get_question_reply_page = _run_sync(db_operations.get_question_reply_page)
+
+##################################
+# Rating Operations
+##################################
+create_item_rating = _invalidates_catalog(_reindex_item(_run_sync(db_operations.create_item_rating)), _invalidate_written_item)
+create_question_rating = _run_sync(db_operations.create_question_rating)
+
+#######################################
+# Product Suggestion Operations
+#######################################
+create_product_suggestion = _run_sync(db_operations.create_product_suggestion)
+get_product_suggestions = _run_sync(db_operations.get_product_suggestions)
+
+#######################################
+# Contact Message Operations
+#######################################
+create_contact_message = _run_sync(db_operations.create_contact_message)
+get_contact_messages = _run_sync(db_operations.get_contact_messages)
+update_message_status = _run_sync(db_operations.update_message_status)
+update_content_status = _invalidates_catalog(_run_sync(db_operations.update_content_status), _invalidate_moderated_content)
+check_daily_limit = _run_sync(db_operations.check_daily_limit)
+
+###################################
+# Full-Text Search Operations
+###################################
+search_content = _run_sync(db_operations.search_content)
@@ -0,0 +1,153 @@
+"""
+In-process cache of catalog reads (items and item lists).
+
+Browsing re-reads the same items on nearly every tap, while the catalog only
+changes when an item is created or edited, rated or commented on. Results of
+the cached reads in async_db_operations are kept here as ItemSnapshot
+tuples (plain immutable values, safe to share between sessions and
+updates), for at most CATALOG_CACHE_TTL seconds, up to CATALOG_CACHE_SIZE
+entries with least recently used ones evicted first.
+
+Every entry is tagged with the item and item type it covers; the async item
+writes drop the entries they make stale through invalidate_item() or
+clear(). A read that was in flight during an invalidation is not stored, so
+it cannot bring stale data back, and neither is a read served by the
+replica, which may still lag behind the invalidating write. The cache is
+only used from the event loop, so it needs no lock. Hits, misses and
+invalidations are counted in metrics under catalog_cache.*.
+"""
+import os
+import time
+from collections import OrderedDict, defaultdict
+from datetime import datetime
+from typing import Any, Hashable, Iterable, NamedTuple, Optional
+from uuid import UUID
+from . import metrics
+from .models import Item, ItemType
+
+CATALOG_CACHE_TTL = float(os.getenv('CATALOG_CACHE_TTL', 60))
+CATALOG_CACHE_SIZE = int(os.getenv('CATALOG_CACHE_SIZE', 1000))
+
+LISTS_TAG = "lists"  # every list entry, whatever its type
+
+
+class ItemSnapshot(NamedTuple):
+    """Read-only copy of an Item row, as returned by the cached catalog reads."""
+    item_id: UUID
+    type: ItemType
+    name: str
+    name_normalized: str
+    description: Optional[str]
+    average_rating: float
+    rating_count: int
+    rating_sum: int
+    rating_1_count: int
+    rating_2_count: int
+    rating_3_count: int
+    rating_4_count: int
+    rating_5_count: int
+    comment_count: int
+    created_at: datetime
+    updated_at: datetime
+
+    @classmethod
+    def from_item(cls, item: Item) -> "ItemSnapshot":
+        return cls(*(getattr(item, field) for field in cls._fields))
+
+
+def item_tag(item_id: UUID) -> str:
+    return f"item:{item_id}"
+
+
+def type_tag(item_type: Optional[ItemType]) -> str:
+    return f"type:{item_type.name if item_type else '*'}"
+
+
+def snapshot(value: Any) -> Any:
+    """Replace the Items in a read result (an Item, a list, or a tuple of those) with snapshots."""
+    if isinstance(value, Item):
+        return ItemSnapshot.from_item(value)
+    if isinstance(value, list):
+        return [snapshot(element) for element in value]
+    if isinstance(value, tuple) and not isinstance(value, ItemSnapshot):
+        return tuple(snapshot(element) for element in value)
+    return value
+
+
+def _copy(value: Any) -> Any:
+    """Fresh lists around the shared snapshots, so a caller changing its result cannot change the cache."""
+    if isinstance(value, list):
+        return [_copy(element) for element in value]
+    if isinstance(value, tuple) and not isinstance(value, ItemSnapshot):
+        return tuple(_copy(element) for element in value)
+    return value
+
+
+class CatalogCache:
+    def __init__(self, ttl: float = CATALOG_CACHE_TTL, max_entries: int = CATALOG_CACHE_SIZE):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.generation = 0  # بعد از هر invalidation زیاد می‌شود
+        self._entries: OrderedDict = OrderedDict()  # key -> (expires_at, value, tags)
+        self._tagged: dict[str, set] = defaultdict(set)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: Hashable) -> tuple[bool, Any]:
+        """(True, value) for a live entry, (False, None) otherwise."""
+        entry = self._entries.get(key)
+        if entry is None or entry[0] < time.monotonic():
+            if entry is not None:
+                self._drop(key)
+            metrics.increment("catalog_cache.misses")
+            return False, None
+        self._entries.move_to_end(key)
+        metrics.increment("catalog_cache.hits")
+        return True, _copy(entry[1])
+
+    def put(self, key: Hashable, value: Any, tags: Iterable[str], generation: int) -> None:
+        """Store value unless an invalidation happened since generation was read."""
+        if generation != self.generation:
+            return
+        self._drop(key)
+        tags = frozenset(tags)
+        self._entries[key] = (time.monotonic() + self.ttl, _copy(value), tags)
+        for tag in tags:
+            self._tagged[tag].add(key)
+        while len(self._entries) > self.max_entries:
+            self._drop(next(iter(self._entries)))
+
+    def invalidate(self, *tags: str) -> None:
+        """Drop every entry carrying any of tags."""
+        self.generation += 1
+        metrics.increment("catalog_cache.invalidations")
+        for tag in tags:
+            for key in list(self._tagged.get(tag, ())):
+                self._drop(key)
+
+    def invalidate_item(self, item_id: UUID, item_type: Optional[ItemType] = None) -> None:
+        """Drop an item and the lists it may appear in (all lists when its type is unknown)."""
+        self.invalidate(item_tag(item_id), type_tag(None), type_tag(item_type) if item_type else LISTS_TAG)
+
+    def clear(self) -> None:
+        self.generation += 1
+        metrics.increment("catalog_cache.invalidations")
+        self._entries.clear()
+        self._tagged.clear()
+
+    def _drop(self, key: Hashable) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        for tag in entry[2]:
+            keys = self._tagged.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tagged[tag]
+
+
+# Cache shared by the whole process
+catalog_cache = CatalogCache()
+metrics.register_gauge("catalog_cache.entries", lambda: len(catalog_cache))
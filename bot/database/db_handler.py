@@ -1,24 +1,292 @@
+from collections import OrderedDict
+import functools
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+import logging
+import time
+import weakref
 from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine, async_sessionmaker
+from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy.sql.selectable import CompoundSelect, Select
 import os
 from dotenv import load_dotenv
-from .models import Base
+from . import metrics
+from .pool import (
+    InstrumentedAsyncQueuePool, InstrumentedAsyncReplicaQueuePool, InstrumentedQueuePool,
+    InstrumentedReplicaQueuePool, instrument_pool,
+)
+
+logger = logging.getLogger(__name__)
 
 # Load environment variables
 load_dotenv()
 
-# Initialize database engine and session
+
+class TrackedSession(Session):
+    """Session that counts opens and closes, and reports sessions dropped without close()."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._close_state = {"closed": False}
+        metrics.increment("db.sessions.opened")
+        finalizer = weakref.finalize(self, _report_leaked_session, self._close_state)
+        finalizer.atexit = False
+
+    def close(self) -> None:
+        super().close()
+        if not self._close_state["closed"]:
+            self._close_state["closed"] = True
+            metrics.increment("db.sessions.closed")
+
+
+def _report_leaked_session(close_state: dict) -> None:
+    if not close_state["closed"]:
+        metrics.increment("db.sessions.leaked")
+        logger.warning("Database session was garbage-collected without being closed")
+
+
+metrics.register_gauge(
+    "db.sessions.open",
+    lambda: metrics.get("db.sessions.opened") - metrics.get("db.sessions.closed") - metrics.get("db.sessions.leaked"),
+)
+
+
+# Seconds after a user's write during which their reads stay on the primary
+REPLICA_STICKY_SECONDS = float(os.getenv('REPLICA_STICKY_SECONDS', 5))
+
+# user_id -> time of their last write, oldest first
+_recent_writers: OrderedDict = OrderedDict()
+
+
+def _is_plain_read(clause) -> bool:
+    """Whether clause is a SELECT the replica can serve: built with select() or union(), without FOR UPDATE."""
+    return isinstance(clause, (Select, CompoundSelect)) and clause._for_update_arg is None
+
+
+class RoutingSession(TrackedSession):
+    """
+    Session that sends plain reads to the read replica and everything else to the primary.
+
+    Only select() statements (and their UNIONs) without FOR UPDATE count as
+    plain reads. Flushes, INSERT/UPDATE/DELETE, text() statements (which may
+    write) and session.connection() without a statement go to the primary
+    and count as writes. Once the session has written, its later reads go
+    there too, so a handler reads its own writes (e.g. the item refresh after
+    a rating). The same holds for REPLICA_STICKY_SECONDS after a write by the
+    session's user (info["user_id"]), which covers the next Update despite
+    replica lag. Without a replica_bind every statement goes to the session's
+    bind.
+    """
+
+    def __init__(self, *args, replica_bind=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.replica_bind = replica_bind
+        self._wrote = False
+
+    def get_bind(self, mapper=None, clause=None, **kwargs):
+        primary = super().get_bind(mapper, clause=clause, **kwargs)
+        if self.replica_bind is None:
+            return primary
+        if self._flushing or not _is_plain_read(clause):
+            self._mark_write()
+            return primary
+        if self._wrote or self._user_wrote_recently():
+            metrics.increment("db.routing.primary_reads")
+            return primary
+        metrics.increment("db.routing.replica_reads")
+        return self.replica_bind
+
+    def reads_from_primary(self) -> bool:
+        """Whether the session's next plain read goes to the primary."""
+        return self.replica_bind is None or self._wrote or self._user_wrote_recently()
+
+    def _mark_write(self) -> None:
+        self._wrote = True
+        user_id = self.info.get("user_id")
+        if user_id is None:
+            return
+        now = time.monotonic()
+        _recent_writers[user_id] = now
+        _recent_writers.move_to_end(user_id)
+        while _recent_writers and next(iter(_recent_writers.values())) < now - REPLICA_STICKY_SECONDS:
+            _recent_writers.popitem(last=False)
+
+    def _user_wrote_recently(self) -> bool:
+        wrote_at = _recent_writers.get(self.info.get("user_id"))
+        if wrote_at is None or wrote_at < time.monotonic() - REPLICA_STICKY_SECONDS:
+            return False
+        self._wrote = True
+        return True
+
+
+# Connection pool settings, applied to both engines
+DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', 5))
+DB_MAX_OVERFLOW = int(os.getenv('DB_MAX_OVERFLOW', 10))
+DB_POOL_TIMEOUT = float(os.getenv('DB_POOL_TIMEOUT', 30))
+DB_POOL_RECYCLE = int(os.getenv('DB_POOL_RECYCLE', 1800))
+DB_POOL_PRE_PING = os.getenv('DB_POOL_PRE_PING', 'true').lower() in ('1', 'true', 'yes')
+
+POOL_OPTIONS = dict(
+    pool_size=DB_POOL_SIZE,
+    max_overflow=DB_MAX_OVERFLOW,
+    pool_timeout=DB_POOL_TIMEOUT,
+    pool_recycle=DB_POOL_RECYCLE,
+    pool_pre_ping=DB_POOL_PRE_PING,
+)
+
+# Connection URLs. Engines are created on first use, not on import, so
+# importing the handlers (or a script that only needs models) opens no
+# connection and needs no database settings.
 DATABASE_URL = os.getenv('DATABASE_URL')
-engine = create_engine(DATABASE_URL)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# Optional read replica: reads are routed to it by RoutingSession
+DATABASE_REPLICA_URL = os.getenv('DATABASE_REPLICA_URL')
+
+
+def _async_url(url: str):
+    """url with the asyncpg driver."""
+    return make_url(url).set(drivername='postgresql+asyncpg')
+
 
-# Create tables if they don't exist
-Base.metadata.create_all(engine)
+@functools.cache
+def get_engine():
+    """The sync engine for DATABASE_URL (primary)."""
+    if not DATABASE_URL:
+        raise RuntimeError("DATABASE_URL is not set")
+    engine = create_engine(DATABASE_URL, poolclass=InstrumentedQueuePool, **POOL_OPTIONS)
+    instrument_pool(engine, "db.pool")
+    return engine
+
+
+@functools.cache
+def get_replica_engine():
+    """The sync engine for DATABASE_REPLICA_URL, or None without a replica."""
+    if not DATABASE_REPLICA_URL:
+        return None
+    engine = create_engine(DATABASE_REPLICA_URL, poolclass=InstrumentedReplicaQueuePool, **POOL_OPTIONS)
+    instrument_pool(engine, "db.replica_pool")
+    return engine
+
+
+@functools.cache
+def get_async_engine():
+    """
+    Async engine used by the bot handlers (asyncpg driver).
+
+    Defaults to DATABASE_URL with the driver swapped, unless ASYNC_DATABASE_URL is set.
+    """
+    url = os.getenv('ASYNC_DATABASE_URL')
+    if not url:
+        if not DATABASE_URL:
+            raise RuntimeError("DATABASE_URL is not set")
+        url = _async_url(DATABASE_URL)
+    engine = create_async_engine(url, poolclass=InstrumentedAsyncQueuePool, **POOL_OPTIONS)
+    instrument_pool(engine.sync_engine, "db.async_pool")
+    return engine
+
+
+@functools.cache
+def get_async_replica_engine():
+    """Async engine for the replica (ASYNC_DATABASE_REPLICA_URL or DATABASE_REPLICA_URL), or None without a replica."""
+    if not DATABASE_REPLICA_URL:
+        return None
+    url = os.getenv('ASYNC_DATABASE_REPLICA_URL') or _async_url(DATABASE_REPLICA_URL)
+    engine = create_async_engine(url, poolclass=InstrumentedAsyncReplicaQueuePool, **POOL_OPTIONS)
+    instrument_pool(engine.sync_engine, "db.async_replica_pool")
+    return engine
+
+
+@functools.cache
+def get_session_factory() -> sessionmaker:
+    return sessionmaker(
+        autocommit=False, autoflush=False, bind=get_engine(), class_=RoutingSession, replica_bind=get_replica_engine()
+    )
+
+
+@functools.cache
+def get_async_session_factory() -> async_sessionmaker:
+    replica = get_async_replica_engine()
+    return async_sessionmaker(
+        bind=get_async_engine(), autoflush=False, expire_on_commit=False, sync_session_class=RoutingSession,
+        replica_bind=replica.sync_engine if replica else None,
+    )
+
+
+# The old module attributes, now created on first access
+_LAZY_ATTRIBUTES = {
+    "engine": get_engine,
+    "replica_engine": get_replica_engine,
+    "async_engine": get_async_engine,
+    "async_replica_engine": get_async_replica_engine,
+    "SessionLocal": get_session_factory,
+    "AsyncSessionLocal": get_async_session_factory,
+}
+
+
+def __getattr__(name: str):
+    if name in _LAZY_ATTRIBUTES:
+        return _LAZY_ATTRIBUTES[name]()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+# Session shared by everything that runs while handling the current Update
+_update_session: ContextVar[AsyncSession | None] = ContextVar("update_session", default=None)
 
 def get_db():
     """Yield a database session."""
-    db = SessionLocal()
+    db = get_session_factory()()
+    try:
+        yield db
+    finally:
+        db.close()
+
+@asynccontextmanager
+async def update_session_scope(user_id: int | None = None):
+    """
+    Open one session for the current Update.
+
+    Every get_async_db() block entered inside the scope shares this session.
+    On exit the session is committed, or rolled back if the handler raised,
+    and always closed. Nested scopes reuse the outer session. user_id is the
+    Update's user, so RoutingSession keeps their reads on the primary right
+    after they write.
+    """
+    if _update_session.get() is not None:
+        yield _update_session.get()
+        return
+
+    db = get_async_session_factory()()
+    db.info["user_id"] = user_id
+    token = _update_session.set(db)
     try:
         yield db
+        await db.commit()
+    except BaseException:
+        await db.rollback()
+        raise
     finally:
-        db.close()
\ No newline at end of file
+        _update_session.reset(token)
+        await db.close()
+
+@asynccontextmanager
+async def get_async_db():
+    """
+    Yield an async database session.
+
+    Inside an update scope this is the update's shared session; the block ends
+    its transaction (returning the connection to the pool) but leaves the
+    session open. Outside a scope a new session is opened and closed.
+    """
+    db = _update_session.get()
+    if db is None:
+        async with get_async_session_factory()() as db:
+            yield db
+        return
+
+    try:
+        yield db
+        await db.commit()
+    except BaseException:
+        await db.rollback()
+        raise
@@ -1,22 +1,69 @@
-from sqlalchemy import select, update, func
-from sqlalchemy.orm import Session
+import re
+from sqlalchemy import select, insert, update, values, column, func, cast, literal, literal_column, null, or_, tuple_, union_all, BigInteger, Float, Integer
+from sqlalchemy.dialects.postgresql import insert as pg_insert, ARRAY, UUID as PG_UUID
+from sqlalchemy.orm import Session, aliased
 from typing import List, Optional, Tuple
-from uuid import UUID
+from uuid import UUID, uuid4
 from datetime import datetime
 from .models import (
     User, Item, Comment, CommentReply, TechQuestion, QuestionReply,
     QuestionRating,ItemRating, ProductSuggestion, ContactMessage, UserStatus, ItemType,
     ContentStatus, MessageStatus, TargetType
 )
+from .normalization import normalize_name, normalize_text
+from . import rank_buffer
+##############################
+# Write Helpers
+##############################
+def _insert_returning(db: Session, model, **values):
+    """INSERT one row and get it back as an ORM object from the same statement (no refresh)."""
+    return db.execute(insert(model).values(**values).returning(model)).scalar_one()
+
+def _update_returning(db: Session, model, where, **values):
+    """UPDATE rows matching where and return the first updated object, or None if nothing matched."""
+    return db.execute(
+        update(model)
+        .where(where)
+        .values(**values)
+        .returning(model)
+        .execution_options(synchronize_session=False, populate_existing=True)
+    ).scalars().first()
+
+def _add_rank_points(db: Session, user_id: int, points: int) -> None:
+    """
+    Give a user rank points once the caller's transaction commits.
+
+    The points are staged for rank_buffer, which adds them to rank_score in
+    periodic batches (add_rank_scores), so the write takes no lock on the
+    users row.
+    """
+    rank_buffer.stage(db, user_id, points)
+
+
+def _counter_update(model, where, column: str, delta: int):
+    """
+    UPDATE adding delta to a denormalized counter column (comment_count, reply_count) of the rows matching where.
+
+    Objects already in the session are not updated; the reads that show
+    counters load with populate_existing so they always see the stored value.
+    """
+    counter = getattr(model, column)
+    return (
+        update(model)
+        .where(where)
+        # updated_at تغییر نمی‌کند: شمارنده بخشی از محتوای ردیف نیست
+        .values({column: counter + delta, "updated_at": model.updated_at})
+        .returning(counter)
+        .execution_options(synchronize_session=False)
+    )
+
 ##############################
 # User Operations
 ##############################
 def create_user(db: Session, user_id: int) -> User:
     """Create a new user with pending status."""
-    user = User(user_id=user_id, status=UserStatus.VERIFIED)
-    db.add(user)
+    user = _insert_returning(db, User, user_id=user_id, status=UserStatus.VERIFIED)
     db.commit()
-    db.refresh(user)
     return user
 
 def get_user(db: Session, user_id: int) -> Optional[User]:
@@ -25,23 +72,37 @@ def get_user(db: Session, user_id: int) -> Optional[User]:
 
 def update_user_status(db: Session, user_id: int, status: UserStatus) -> Optional[User]:
     """Update user authentication status."""
-    db.execute(
-        update(User)
-        .where(User.user_id == user_id)
-        .values(status=status)
-    )
+    user = _update_returning(db, User, User.user_id == user_id, status=status)
     db.commit()
-    return get_user(db, user_id)
+    return user
 
 def update_user_rank_score(db: Session, user_id: int, points: int) -> Optional[User]:
     """Update user's rank score."""
-    db.execute(
+    user = _update_returning(db, User, User.user_id == user_id, rank_score=User.rank_score + points)
+    db.commit()
+    return user
+
+def add_rank_scores(db: Session, points: dict[int, int]) -> int:
+    """
+    Add points to many users' rank scores (user_id -> points) with one
+    UPDATE … FROM (VALUES …); return the number of users updated.
+
+    Rows are listed in user_id order, so concurrent batches lock users in the
+    same order and cannot deadlock.
+    """
+    if not points:
+        return 0
+    increments = values(
+        column("user_id", BigInteger), column("points", Integer), name="increments"
+    ).data(sorted(points.items()))
+    updated = db.execute(
         update(User)
-        .where(User.user_id == user_id)
-        .values(rank_score=User.rank_score + points)
-    )
+        .where(User.user_id == increments.c.user_id)
+        .values(rank_score=User.rank_score + increments.c.points)
+        .execution_options(synchronize_session=False)
+    ).rowcount
     db.commit()
-    return get_user(db, user_id)
+    return updated
 
 def update_user(db, user_id, username=None):
     """Update user information in the database."""
@@ -52,13 +113,7 @@ def update_user(db, user_id, username=None):
     if not update_data:
         return None
     
-    user = db.query(User).filter(User.user_id == user_id).first()
-    if not user:
-        return None
-    
-    for key, value in update_data.items():
-        setattr(user, key, value)
-    
+    user = _update_returning(db, User, User.user_id == user_id, **update_data)
     db.commit()
     return user
 
@@ -68,42 +123,124 @@ def update_user(db, user_id, username=None):
 ##########################
 def create_item(db: Session, type: ItemType, name: str, description: str = None) -> Item:
     """Create a new item (Device or Liquid)."""
-    item = Item(type=type, name=name, description=description)
-    db.add(item)
+    item = _insert_returning(
+        db, Item, type=type, name=name, name_normalized=normalize_name(name), description=description
+    )
+    db.commit()
+    return item
+
+def update_item(db: Session, item_id: UUID, name: str = None, description: str = None) -> Optional[Item]:
+    """Update an item's name and/or description, keeping its search key in step with the name."""
+    update_data = {}
+    if name is not None:
+        update_data["name"] = name
+        update_data["name_normalized"] = normalize_name(name)
+    if description is not None:
+        update_data["description"] = description
+    
+    if not update_data:
+        return None
+    
+    item = _update_returning(db, Item, Item.item_id == item_id, **update_data)
     db.commit()
-    db.refresh(item)
     return item
 
-def get_items_by_type(db: Session, type: ItemType) -> List[Item]:
+def get_items_by_type(db: Session, type: ItemType, limit: Optional[int] = None, offset: int = 0) -> List[Item]:
     """Retrieve items by type with pagination."""
     items = db.execute(
         select(Item)
         .filter_by(type=type)
-        .order_by(Item.average_rating.desc())
-
+        .order_by(Item.average_rating.desc(), Item.item_id.desc())
+        .offset(offset)
+        .limit(limit)
+        .execution_options(populate_existing=True)
     ).scalars().all()
     
     return items  # اگر لیست خالی باشد، یک لیست خالی برمی‌گرداند
 
-def search_items(db: Session, query: str) -> List[Item]:
-    """Search items by name."""
+def get_item_page(
+    db: Session,
+    type: ItemType,
+    cursor: Optional[Tuple[float, UUID]] = None,
+    backward: bool = False,
+    limit: int = 5
+) -> Tuple[List[Item], bool]:
+    """
+    Load one page of a category using a keyset cursor.
+
+    Items are ordered by (average_rating, item_id) descending. cursor is the
+    (average_rating, item_id) of the last item of the previous page, or of
+    the first item of the next page when backward is True. One indexed query
+    reads limit + 1 rows; returns (items in display order, whether more items
+    exist beyond this page in the direction of travel).
+    """
+    query = select(Item).filter_by(type=type)
+    key = tuple_(Item.average_rating, Item.item_id)
+    if backward:
+        if cursor is not None:
+            query = query.where(key > tuple_(*cursor))
+        query = query.order_by(Item.average_rating.asc(), Item.item_id.asc())
+    else:
+        if cursor is not None:
+            query = query.where(key < tuple_(*cursor))
+        query = query.order_by(Item.average_rating.desc(), Item.item_id.desc())
+
+    items = list(db.execute(query.limit(limit + 1).execution_options(populate_existing=True)).scalars().all())
+    has_more = len(items) > limit
+    items = items[:limit]
+    if backward:
+        items.reverse()
+    return items, has_more
+
+def _like_pattern(text: str) -> str:
+    """Build an ILIKE pattern matching text anywhere, with its wildcards escaped."""
+    escaped = text.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return f"%{escaped}%"
+
+def search_items(db: Session, query: str, limit: Optional[int] = 10, offset: int = 0) -> List[Item]:
+    """
+    Search items by name and description.
+
+    The query is normalized like name_normalized, then matched as a
+    substring of the normalized name or of the description, or as a name
+    similar to it (pg_trgm `%`), all served by the trigram GIN indexes.
+    Results are ordered by name similarity, then rating.
+    """
+    key = normalize_text(query)
+    if not key:
+        return []
     items = db.execute(
         select(Item)
-        .filter(Item.name.ilike(f"%{query}%"))
-        .order_by(Item.average_rating.desc())
+        .filter(or_(
+            Item.name_normalized.op("%")(key),
+            Item.name_normalized.like(_like_pattern(key)),
+            Item.description.ilike(_like_pattern(query.strip()))
+        ))
+        .order_by(
+            func.similarity(Item.name_normalized, key).desc(),
+            Item.average_rating.desc(),
+            Item.item_id.desc()
+        )
+        .offset(offset)
+        .limit(limit)
     ).scalars().all()
     
     return items  # اگر لیست خالی باشد، یک لیست خالی برمی‌گرداند
 
 def get_item(db: Session, item_id: UUID) -> Optional[Item]:
     """Retrieve an item by item_id."""
-    return db.execute(select(Item).filter_by(item_id=item_id)).scalar_one_or_none()
+    return db.execute(
+        select(Item).filter_by(item_id=item_id).execution_options(populate_existing=True)
+    ).scalar_one_or_none()
 
-def get_items(db: Session) -> List[Item]:
+def get_items(db: Session, limit: Optional[int] = None, offset: int = 0) -> List[Item]:
     """Retrieve items by status with pagination."""
     items = db.execute(
         select(Item)
-      .order_by(Item.average_rating.desc())
+        .order_by(Item.average_rating.desc(), Item.item_id.desc())
+        .offset(offset)
+        .limit(limit)
+        .execution_options(populate_existing=True)
     ).scalars().all()
     return items  # اگر لیست خالی باشد، یک لیست خالی برمی‌گرداند
 ###################################
@@ -111,27 +248,63 @@ def get_items(db: Session) -> List[Item]:
 ###################################
 def create_comment(db: Session, item_id: UUID, user_id: int, text: str, media_url: str = None) -> Comment:
     """Create a new comment with pending status."""
-    comment = Comment(item_id=item_id, 
-                      user_id=user_id,
-                      text=text,
-                      media_url=media_url, 
-                      status=ContentStatus.APPROVED)
-    db.add(comment)
-    update_user_rank_score(db, user_id, 5)  # Add 5 points for commenting
+    comment = _insert_returning(db, Comment,
+                                item_id=item_id,
+                                user_id=user_id,
+                                text=text,
+                                media_url=media_url,
+                                status=ContentStatus.APPROVED)
+    db.execute(_counter_update(Item, Item.item_id == item_id, "comment_count", 1))
+    _add_rank_points(db, user_id, 5)  # Add 5 points for commenting
     db.commit()
-    db.refresh(comment)
     return comment
 
-def get_comments_by_item(db: Session, item_id: UUID, status: ContentStatus = ContentStatus.APPROVED) -> List[Comment]:
+def get_comments_by_item(
+    db: Session,
+    item_id: UUID,
+    status: ContentStatus = ContentStatus.APPROVED,
+    limit: Optional[int] = None,
+    offset: int = 0
+) -> List[Comment]:
     """Retrieve approved comments for an item, sorted by creation date."""
     comments = db.execute(
         select(Comment)
         .filter_by(item_id=item_id, status=status)
         .order_by(Comment.created_at.desc())
+        .offset(offset)
+        .limit(limit)
     ).scalars().all()
     
     return comments  # اگر لیست خالی باشد، یک لیست خالی برمی‌گرداند
 
+def get_comment_page(
+    db: Session,
+    item_id: UUID,
+    offset: int = 0,
+    limit: int = 5,
+    status: ContentStatus = ContentStatus.APPROVED
+) -> Tuple[List[Tuple[Comment, Optional[str], int]], int]:
+    """
+    Load one page of an item's comments for display.
+
+    Returns ([(comment, author username, direct reply count), ...], total comments).
+    One query: the page joined with its authors, the total from a window
+    count. Reply counts are the comments' reply_count (approved replies).
+    """
+    rows = db.execute(
+        select(Comment, User.username, func.count().over().label("total"))
+        .join(User, User.user_id == Comment.user_id)
+        .filter(Comment.item_id == item_id, Comment.status == status)
+        .order_by(Comment.created_at.desc())
+        .offset(offset)
+        .limit(limit)
+        .execution_options(populate_existing=True)
+    ).all()
+    if not rows:
+        return [], 0
+    page = [(comment, username, comment.reply_count) for comment, username, _ in rows]
+    return page, rows[0].total
+
 # Comment Reply Operations
 def create_comment_reply(
     db: Session, 
@@ -141,18 +314,36 @@ def create_comment_reply(
     media_url: str = None, 
     parent_reply_id: UUID | None = None  # برای پشتیبانی از reply to reply
 ) -> CommentReply:
-    new_reply = CommentReply(
+    """
+    Create a reply to a comment, or to another reply when parent_reply_id is given.
+
+    The reply's path and depth are taken from its parent inside the same
+    INSERT, so no extra round trip is needed. The reply_count of the comment
+    or parent reply is bumped in the same transaction.
+    """
+    reply_id = uuid4()
+    if parent_reply_id is None:
+        path, depth = f"{reply_id.hex}/", 0
+    else:
+        parent = aliased(CommentReply)
+        of_parent = parent.reply_id == parent_reply_id
+        path = select(parent.path + f"{reply_id.hex}/").where(of_parent).scalar_subquery()
+        depth = select(parent.depth + 1).where(of_parent).scalar_subquery()
+    new_reply = _insert_returning(
+        db, CommentReply,
+        reply_id=reply_id,
         comment_id=comment_id,
         user_id=user_id,
         text=text,
         media_url=media_url,
         parent_reply_id=parent_reply_id,
+        path=path,
+        depth=depth,
         status=ContentStatus.APPROVED
     )
-    db.add(new_reply)
-    update_user_rank_score(db, user_id, 5) 
+    db.execute(_parent_counter("comment_reply", new_reply, 1))
+    _add_rank_points(db, user_id, 5)
     db.commit()
-    db.refresh(new_reply)
     return new_reply
 
 
@@ -191,26 +382,105 @@ def get_reply_replies(
     replies = db.execute(replies).scalars().all()
     return list(replies)
 
-def count_direct_replies_to_comment(db: Session, comment_id: UUID, status: ContentStatus = ContentStatus.APPROVED) -> int:
-    """Counts direct replies to a main comment."""
-    return db.execute(
-        select(func.count(CommentReply.reply_id))
-        .where(
-            CommentReply.comment_id == comment_id,
-            CommentReply.parent_reply_id.is_(None), # Direct replies
-            CommentReply.status == status
+def count_direct_replies_to_comment(db: Session, comment_id: UUID) -> int:
+    """Counts approved direct replies to a main comment (its reply_count)."""
+    return db.execute(select(Comment.reply_count).where(Comment.comment_id == comment_id)).scalar() or 0
+
+def count_sub_replies(db: Session, parent_reply_id: UUID) -> int:
+    """Counts approved direct sub-replies to a given reply (its reply_count)."""
+    return db.execute(select(CommentReply.reply_count).where(CommentReply.reply_id == parent_reply_id)).scalar() or 0
+
+def get_reply_page(
+    db: Session,
+    comment_id: UUID | None = None,
+    parent_reply_id: UUID | None = None,
+    offset: int = 0,
+    limit: int = 3,
+    status: ContentStatus = ContentStatus.APPROVED
+) -> Tuple[List[Tuple[CommentReply, Optional[str]]], int]:
+    """
+    Load one page of a reply level with authors' usernames in one query.
+
+    With parent_reply_id the level is that reply's sub-replies, otherwise the
+    direct replies to comment_id. Returns ([(reply, username), ...], total at this level).
+    """
+    if parent_reply_id is not None:
+        level = CommentReply.parent_reply_id == parent_reply_id
+    else:
+        level = (CommentReply.comment_id == comment_id) & CommentReply.parent_reply_id.is_(None)
+
+    rows = db.execute(
+        select(CommentReply, User.username, func.count().over().label("total"))
+        .join(User, User.user_id == CommentReply.user_id)
+        .where(level, CommentReply.status == status)
+        .order_by(CommentReply.created_at.asc())  # مرتب‌سازی از قدیمی به جدید
+        .offset(offset)
+        .limit(limit)
+    ).all()
+    if not rows:
+        return [], 0
+    return [(reply, username) for reply, username, _ in rows], rows[0].total
+
+def get_reply_tree_info(db: Session, reply_ids: List[UUID]) -> dict:
+    """
+    Return {reply_id: row} for a set of replies in one query.
+
+    Each row has child_count (approved direct sub-replies), comment_id,
+    parent_reply_id, path and depth, which is enough to draw the
+    "nested replies" buttons of a page and its back buttons.
+    """
+    if not reply_ids:
+        return {}
+    rows = db.execute(
+        select(
+            CommentReply.reply_id,
+            CommentReply.comment_id,
+            CommentReply.parent_reply_id,
+            CommentReply.path,
+            CommentReply.depth,
+            CommentReply.reply_count.label("child_count"),
         )
-    ).scalar_one()
-
-def count_sub_replies(db: Session, parent_reply_id: UUID, status: ContentStatus = ContentStatus.APPROVED) -> int:
-    """Counts direct sub-replies to a given reply."""
-    return db.execute(
-        select(func.count(CommentReply.reply_id))
+        .where(CommentReply.reply_id.in_(reply_ids))
+    ).all()
+    return {row.reply_id: row for row in rows}
+
+def get_reply_subtree(
+    db: Session,
+    reply_id: UUID,
+    max_depth: Optional[int] = None,
+    status: ContentStatus = ContentStatus.APPROVED
+) -> List[CommentReply]:
+    """
+    All replies below reply_id in one query, at most max_depth levels down.
+
+    Descendants are the rows whose path starts with the reply's path, read
+    as a range scan on ix_comment_replies_path. Ordered by depth, then oldest first.
+    """
+    root = aliased(CommentReply)
+    query = (
+        select(CommentReply)
+        .join(root, root.reply_id == reply_id)
         .where(
-            CommentReply.parent_reply_id == parent_reply_id,
+            # محدوده پیشوند مسیر: مقایسه بایتی مانند text_pattern_ops
+            CommentReply.path.op("~>~", is_comparison=True)(root.path),
+            CommentReply.path.op("~<~", is_comparison=True)((root.path + "~").self_group()),
             CommentReply.status == status
         )
-    ).scalar_one()
+        .order_by(CommentReply.depth, CommentReply.created_at.asc())
+    )
+    if max_depth is not None:
+        query = query.where(CommentReply.depth <= root.depth + max_depth)
+    return list(db.execute(query).scalars().all())
+
+def get_reply_ancestors(db: Session, reply_id: UUID) -> List[CommentReply]:
+    """The replies above reply_id, from the direct reply to the comment down to its parent, in one query."""
+    path = select(CommentReply.path).where(CommentReply.reply_id == reply_id).scalar_subquery()
+    ancestor_ids = cast(func.string_to_array(func.rtrim(path, "/"), "/"), ARRAY(PG_UUID(as_uuid=True)))
+    return list(db.execute(
+        select(CommentReply)
+        .where(CommentReply.reply_id == func.any(ancestor_ids), CommentReply.reply_id != reply_id)
+        .order_by(CommentReply.depth)
+    ).scalars().all())
 
 
 ##########################################
@@ -218,128 +488,160 @@ def count_sub_replies(db: Session, parent_reply_id: UUID, status: ContentStatus
 ##########################################
 def create_tech_question(db: Session, user_id: int, text: str, media_url: str = None) -> TechQuestion:
     """Create a new technical question with pending status."""
-    question = TechQuestion(user_id=user_id, text=text, media_url=media_url, status=ContentStatus.APPROVED)
-    db.add(question)
-    update_user_rank_score(db, user_id, 10)  # Add 10 points for question
+    question = _insert_returning(db, TechQuestion, user_id=user_id, text=text, media_url=media_url, status=ContentStatus.APPROVED)
+    _add_rank_points(db, user_id, 10)  # Add 10 points for question
     db.commit()
-    db.refresh(question)
     return question
 
-def get_top_tech_questions(db: Session) -> List[TechQuestion]:
-    """Retrieve top 10 approved technical questions by average rating."""
+def get_top_tech_questions(db: Session, limit: Optional[int] = 10, offset: int = 0) -> List[TechQuestion]:
+    """Retrieve top approved technical questions by average rating (10 by default)."""
     questions = db.execute(
         select(TechQuestion)
         .filter_by(status=ContentStatus.APPROVED)
         .order_by(TechQuestion.average_rating.desc(), TechQuestion.created_at.desc())
+        .offset(offset)
+        .limit(limit)
+        .execution_options(populate_existing=True)
     ).scalars().all()
     
     return questions  # اگر لیست خالی باشد، یک لیست خالی برمی‌گرداند
 
 def get_tech_question(db: Session, question_id: UUID) -> Optional[TechQuestion]:
     """Retrieve a technical question by question_id."""
-    return db.execute(select(TechQuestion).filter_by(question_id=question_id)).scalar_one_or_none()
+    return db.execute(
+        select(TechQuestion).filter_by(question_id=question_id).execution_options(populate_existing=True)
+    ).scalar_one_or_none()
 
 # Question Reply Operations
 def create_question_reply(db: Session, question_id: UUID, user_id: int, text: str, media_url: str = None) -> QuestionReply:
     """Create a new reply to a technical question with pending status."""
-    reply = QuestionReply(question_id=question_id, user_id=user_id, text=text, media_url=media_url, status=ContentStatus.APPROVED)
-    db.add(reply)
-    update_user_rank_score(db, user_id, 3)  # Add 3 points for replying
+    reply = _insert_returning(db, QuestionReply, question_id=question_id, user_id=user_id, text=text, media_url=media_url, status=ContentStatus.APPROVED)
+    db.execute(_parent_counter("question_reply", reply, 1))
+    _add_rank_points(db, user_id, 3)  # Add 3 points for replying
     db.commit()
-    db.refresh(reply)
     return reply
 
-def get_question_replies(db: Session, question_id: UUID, status: ContentStatus = ContentStatus.APPROVED) -> List[QuestionReply]:
+def get_question_replies(
+    db: Session,
+    question_id: UUID,
+    status: ContentStatus = ContentStatus.APPROVED,
+    limit: Optional[int] = None,
+    offset: int = 0
+) -> List[QuestionReply]:
     """Retrieve approved replies for a technical question, sorted by creation date."""
     replies = db.execute(
         select(QuestionReply)
         .filter_by(question_id=question_id, status=status)
         .order_by(QuestionReply.created_at.desc())
+        .offset(offset)
+        .limit(limit)
     ).scalars().all()
     
     return replies  # اگر لیست خالی باشد، یک لیست خالی برمی‌گرداند
 
+def get_question_reply_page(
+    db: Session,
+    question_id: UUID,
+    offset: int = 0,
+    limit: Optional[int] = None,
+    status: ContentStatus = ContentStatus.APPROVED
+) -> Tuple[List[Tuple[QuestionReply, Optional[str]]], int]:
+    """
+    Load a question's replies with their authors' usernames in one query.
+
+    Returns ([(reply, author username), ...], total replies).
+    """
+    rows = db.execute(
+        select(QuestionReply, User.username, func.count().over().label("total"))
+        .join(User, User.user_id == QuestionReply.user_id)
+        .filter(QuestionReply.question_id == question_id, QuestionReply.status == status)
+        .order_by(QuestionReply.created_at.desc())
+        .offset(offset)
+        .limit(limit)
+    ).all()
+    if not rows:
+        return [], 0
+    return [(reply, username) for reply, username, _ in rows], rows[0].total
+
 ##################################
 # Rating Operations
 ##################################
-def create_item_rating(db: Session, user_id: int, item_id: UUID, score: int) -> Optional[ItemRating]:
-    """Create a new rating for an item."""
-    existing_rating = db.execute(
-        select(ItemRating)
-        .filter_by(user_id=user_id, item_id=item_id)
-    ).scalar_one_or_none()
-    
-    if existing_rating:
-        return None  # Prevent duplicate ratings
-    
-    rating = ItemRating(user_id=user_id, item_id=item_id, score=score)
-    db.add(rating)
-    update_user_rank_score(db, user_id, 1)  # Add 1 point for rating
-    
-    # Update average rating and count
-    avg_rating, count = db.execute(
-        select(func.avg(ItemRating.score), func.count(ItemRating.rating_id))
-        .filter_by(item_id=item_id)
-    ).first()
-    
-    db.execute(
-        update(Item)
-        .where(Item.item_id == item_id)
-        .values(average_rating=avg_rating, rating_count=count)
+def _add_rating(db: Session, rating_model, target_model, key: str, user_id: int, target_id: UUID, score: int, points: int):
+    """
+    Insert a rating and fold it into its target's aggregates in one
+    statement, then give the user their rank points.
+
+    The insert uses ON CONFLICT DO NOTHING on the (user, target) unique
+    constraint; when the user has already rated, nothing is inserted, the
+    UPDATEs match no rows and None is returned. Otherwise the target's
+    rating_sum, rating_count and the counter for this score are incremented
+    and average_rating is recomputed from them, so the cost of a vote does
+    not depend on how many ratings the target already has.
+    """
+    if not 1 <= score <= 5:
+        raise ValueError(f"score must be between 1 and 5, got {score}")
+
+    now = datetime.utcnow()  # onupdate برای UPDATE همراه با CTE مقداردهی نمی‌شود
+    new_rating = (
+        pg_insert(rating_model)
+        .values(user_id=user_id, score=score, **{key: target_id})
+        .on_conflict_do_nothing(index_elements=["user_id", key])
+        .returning(rating_model.user_id, getattr(rating_model, key), rating_model.score)
+        .cte("new_rating")
     )
-    
-    db.commit()
-    db.refresh(rating)
-    return rating
-
-def create_question_rating(db: Session, user_id: int, question_id: UUID, score: int) -> Optional[QuestionRating]:
-    """Create a new rating for a technical question."""
-    existing_rating = db.execute(
-        select(QuestionRating)
-        .filter_by(user_id=user_id, question_id=question_id)
+    star_column = f"rating_{score}_count"
+    target = db.execute(
+        update(target_model)
+        .where(getattr(target_model, key) == getattr(new_rating.c, key))
+        .values({
+            "rating_sum": target_model.rating_sum + new_rating.c.score,
+            "rating_count": target_model.rating_count + 1,
+            star_column: getattr(target_model, star_column) + 1,
+            "average_rating": cast(target_model.rating_sum + new_rating.c.score, Float) / cast(target_model.rating_count + 1, Float),
+            "updated_at": now,
+        })
+        .returning(target_model)
+        .execution_options(synchronize_session=False, populate_existing=True)
     ).scalar_one_or_none()
-    
-    if existing_rating:
-        return None  # Prevent duplicate ratings
-    
-    rating = QuestionRating(user_id=user_id, question_id=question_id, score=score)
-    db.add(rating)
-    update_user_rank_score(db, user_id, 1)  # Add 1 point for rating
-    
-    # Update average rating and count
-    avg_rating, count = db.execute(
-        select(func.avg(QuestionRating.score), func.count(QuestionRating.rating_id))
-        .filter_by(question_id=question_id)
-    ).first()
-    
-    db.execute(
-        update(TechQuestion)
-        .where(TechQuestion.question_id == question_id)
-        .values(average_rating=avg_rating, rating_count=count)
-    )
-    
+    if target is not None:
+        _add_rank_points(db, user_id, points)
+    return target
+
+def create_item_rating(db: Session, user_id: int, item_id: UUID, score: int) -> Optional[Item]:
+    """Rate an item. Returns the item with its updated aggregates, or None if the user already rated it."""
+    item = _add_rating(db, ItemRating, Item, "item_id", user_id, item_id, score, points=1)  # Add 1 point for rating
     db.commit()
-    db.refresh(rating)
-    return rating
+    return item
+
+def create_question_rating(db: Session, user_id: int, question_id: UUID, score: int) -> Optional[TechQuestion]:
+    """Rate a technical question. Returns the question with its updated aggregates, or None if the user already rated it."""
+    question = _add_rating(db, QuestionRating, TechQuestion, "question_id", user_id, question_id, score, points=1)  # Add 1 point for rating
+    db.commit()
+    return question
 
 #######################################
 # Product Suggestion Operations
 #######################################
-def create_product_suggestion(db: Session, user_id: int, name: str, description: str, media_url: str = None) -> ProductSuggestion:
+def create_product_suggestion(db: Session, user_id: int, name: str, description: str) -> ProductSuggestion:
     """Create a new product suggestion with pending status."""
-    suggestion = ProductSuggestion(user_id=user_id, name=name, description=description, media_url=media_url, status=ContentStatus.PENDING)
-    db.add(suggestion)
-    update_user_rank_score(db, user_id, 15)  # Add 15 points for product suggestion
+    suggestion = _insert_returning(db, ProductSuggestion, user_id=user_id, name=name, description=description, status=ContentStatus.PENDING)
+    _add_rank_points(db, user_id, 15)  # Add 15 points for product suggestion
     db.commit()
-    db.refresh(suggestion)
     return suggestion
 
-def get_product_suggestions(db: Session, status: ContentStatus = ContentStatus.PENDING) -> List[ProductSuggestion]:
+def get_product_suggestions(
+    db: Session,
+    status: ContentStatus = ContentStatus.PENDING,
+    limit: Optional[int] = None,
+    offset: int = 0
+) -> List[ProductSuggestion]:
     """Retrieve product suggestions by status with pagination."""
     suggestions = db.execute(
         select(ProductSuggestion)
         .filter_by(status=status)
         .order_by(ProductSuggestion.created_at.desc())
+        .offset(offset)
+        .limit(limit)
     ).scalars().all()
     
     return suggestions  # اگر لیست خالی باشد، یک لیست خالی برمی‌گرداند
@@ -350,35 +652,65 @@ def get_product_suggestions(db: Session, status: ContentStatus = ContentStatus.P
 #######################################
 def create_contact_message(db: Session, user_id: int, text: str, media_url: str = None) -> ContactMessage:
     """Create a new contact message with pending status."""
-    message = ContactMessage(user_id=user_id, text=text, media_url=media_url, status=MessageStatus.PENDING)
-    db.add(message)
+    message = _insert_returning(db, ContactMessage, user_id=user_id, text=text, media_url=media_url, status=MessageStatus.PENDING)
     db.commit()
-    db.refresh(message)
     return message
 
-def get_contact_messages(db: Session, status: MessageStatus = MessageStatus.PENDING) -> List[ContactMessage]:
+def get_contact_messages(
+    db: Session,
+    status: MessageStatus = MessageStatus.PENDING,
+    limit: Optional[int] = None,
+    offset: int = 0
+) -> List[ContactMessage]:
     """Retrieve contact messages by status with pagination."""
     messages = db.execute(
         select(ContactMessage)
         .filter_by(status=status)
         .order_by(ContactMessage.created_at.desc())
+        .offset(offset)
+        .limit(limit)
     ).scalars().all()
     
     return messages  # اگر لیست خالی باشد، یک لیست خالی برمی‌گرداند
 
 def update_message_status(db: Session, message_id: UUID, status: MessageStatus) -> Optional[ContactMessage]:
     """Update contact message status."""
-    db.execute(
-        update(ContactMessage)
-        .where(ContactMessage.message_id == message_id)
-        .values(status=status)
-    )
+    message = _update_returning(db, ContactMessage, ContactMessage.message_id == message_id, status=status)
     db.commit()
-    return db.execute(select(ContactMessage).filter_by(message_id=message_id)).scalar_one_or_none()
+    return message
 
 # Content Moderation Operations
+# Columns update_content_status() needs back to find the parent counter of each content type
+_COUNTED_PARENT_KEYS = {
+    "comment": (Comment.item_id,),
+    "comment_reply": (CommentReply.comment_id, CommentReply.parent_reply_id),
+    "question_reply": (QuestionReply.question_id,),
+}
+
+def _parent_counter(content_type: str, row, delta: int):
+    """
+    The _counter_update() that counts row on its parent, or None for content
+    types nobody counts. row needs the parent keys of its type (item_id,
+    comment_id/parent_reply_id, question_id).
+    """
+    if content_type == "comment":
+        return _counter_update(Item, Item.item_id == row.item_id, "comment_count", delta)
+    if content_type == "comment_reply":
+        if row.parent_reply_id is None:
+            return _counter_update(Comment, Comment.comment_id == row.comment_id, "reply_count", delta)
+        return _counter_update(CommentReply, CommentReply.reply_id == row.parent_reply_id, "reply_count", delta)
+    if content_type == "question_reply":
+        return _counter_update(TechQuestion, TechQuestion.question_id == row.question_id, "reply_count", delta)
+    return None
+
 def update_content_status(db: Session, content_type: str, content_id: UUID, status: ContentStatus) -> bool:
-    """Update status of any content type (comment, reply, question, suggestion)."""
+    """
+    Update status of any content type (comment, reply, question, suggestion).
+
+    Counters only include approved content, so when the row moves into or out
+    of APPROVED its parent's counter is adjusted in the same transaction.
+    The previous status is read (and the row locked) by the UPDATE itself.
+    """
     if content_type == "comment":
         table = Comment
         id_column = Comment.comment_id
@@ -397,11 +729,18 @@ def update_content_status(db: Session, content_type: str, content_id: UUID, stat
     else:
         return False
     
-    db.execute(
+    previous = select(id_column, table.status).where(id_column == content_id).with_for_update().subquery("previous")
+    changed = db.execute(
         update(table)
-        .where(id_column == content_id)
+        .where(id_column == previous.c[id_column.key], previous.c.status.is_distinct_from(status))
         .values(status=status)
-    )
+        .returning(previous.c.status.label("previous_status"), *_COUNTED_PARENT_KEYS.get(content_type, ()))
+        .execution_options(synchronize_session=False)
+    ).first()
+    if changed is not None and ContentStatus.APPROVED in (changed.previous_status, status):
+        counter = _parent_counter(content_type, changed, 1 if status == ContentStatus.APPROVED else -1)
+        if counter is not None:
+            db.execute(counter)
     db.commit()
     return True
 
@@ -429,4 +768,70 @@ def check_daily_limit(db: Session, user_id: int, action: str, limit: int = 10) -
         ).scalar()
     else:
         count = 0
-    return count < limit
\ No newline at end of file
+    return count < limit
+###################################
+# Full-Text Search Operations
+###################################
+def _prefix_tsquery(query: str) -> Optional[str]:
+    """to_tsquery text matching every word of query as a prefix, or None if it has no words."""
+    words = re.findall(r"\w+", normalize_text(query or ""))
+    return " & ".join(f"{word}:*" for word in words) or None
+
+def search_content(
+    db: Session,
+    query: str,
+    offset: int = 0,
+    limit: int = 5,
+    status: ContentStatus = ContentStatus.APPROVED
+) -> Tuple[list, int]:
+    """
+    Full-text search over items, tech questions, question replies and comments.
+
+    Every word of query must start a word of the text. Each table is matched
+    on its GIN-indexed search_vector; the results are merged, ranked with
+    ts_rank and paged in one query. Returns (rows, total) where each row has
+    kind ("item", "question", "question_reply" or "comment"), id, text,
+    item_id and item_type (items and comments), question_id (questions and
+    replies) and rank.
+    """
+    tsquery_text = _prefix_tsquery(query)
+    if tsquery_text is None:
+        return [], 0
+    tsquery = func.to_tsquery(literal_column("'simple'::regconfig"), tsquery_text)
+    no_uuid = cast(null(), PG_UUID(as_uuid=True))
+
+    matches = union_all(
+        select(
+            literal("item").label("kind"), Item.item_id.label("id"), Item.name.label("text"),
+            Item.item_id.label("item_id"), Item.type.label("item_type"), no_uuid.label("question_id"),
+            func.ts_rank(Item.search_vector, tsquery).label("rank"), Item.created_at.label("created_at")
+        ).where(Item.search_vector.op("@@")(tsquery)),
+        select(
+            literal("question"), TechQuestion.question_id, TechQuestion.text,
+            no_uuid, null(), TechQuestion.question_id,
+            func.ts_rank(TechQuestion.search_vector, tsquery), TechQuestion.created_at
+        ).where(TechQuestion.search_vector.op("@@")(tsquery), TechQuestion.status == status),
+        select(
+            literal("question_reply"), QuestionReply.reply_id, QuestionReply.text,
+            no_uuid, null(), QuestionReply.question_id,
+            func.ts_rank(QuestionReply.search_vector, tsquery), QuestionReply.created_at
+        ).where(QuestionReply.search_vector.op("@@")(tsquery), QuestionReply.status == status),
+        select(
+            literal("comment"), Comment.comment_id, Comment.text,
+            Comment.item_id, select(Item.type).where(Item.item_id == Comment.item_id).scalar_subquery(), no_uuid,
+            func.ts_rank(Comment.search_vector, tsquery), Comment.created_at
+        ).where(Comment.search_vector.op("@@")(tsquery), Comment.status == status)
+    ).subquery()
+
+    rows = db.execute(
+        select(
+            matches.c.kind, matches.c.id, matches.c.text, matches.c.item_id, matches.c.item_type,
+            matches.c.question_id, matches.c.rank, func.count().over().label("total")
+        )
+        .order_by(matches.c.rank.desc(), matches.c.created_at.desc(), matches.c.id)
+        .offset(offset)
+        .limit(limit)
+    ).all()
+    if not rows:
+        return [], 0
+    return rows, rows[0].total
@@ -0,0 +1,170 @@
+"""
+Streaming export of user content for analytics.
+
+Exports comments, comment_replies, item_ratings and question_ratings to
+JSONL or CSV files, optionally gzip-compressed. Rows are read through a
+server-side cursor (stream_results + yield_per) in (created_at, id) order,
+so memory use is bounded by one batch whatever the table size. When a
+read replica is configured (DATABASE_REPLICA_URL) it is read from instead
+of the primary.
+
+After every batch the output file is flushed and a checkpoint is written
+next to it with the file size, the latest exported created_at and the ids
+exported in the EXPORT_OVERLAP_SECONDS before it. An interrupted export
+resumes from its checkpoint: the file is cut back to the checkpointed size
+and the export continues from there. Running it again later appends only
+rows not exported yet. Every gzip batch is a separate gzip member, so a cut
+file is still valid gzip. A checkpoint whose file is gone or shorter than
+the checkpointed size (deleted or rotated) is ignored and the table is
+exported again in full.
+
+created_at is set by the bot when the row is built, not when it commits,
+and the replica trails the primary. So a resumed export reads again from
+EXPORT_OVERLAP_SECONDS before the checkpointed created_at and skips the ids
+it already wrote: a row committed up to that long after a newer one was
+exported is still picked up. A row arriving later than that (a transaction
+held open longer, or a replica lagging more) is missed.
+
+Run it from the bot directory:
+
+    python -m database.export_content comments item_ratings --format csv --gzip --output-dir exports
+"""
+import argparse
+import csv
+import enum
+import gzip
+import io
+import json
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+from uuid import UUID
+from sqlalchemy import select
+from sqlalchemy.dialects.postgresql import TSVECTOR
+from .db_handler import engine, replica_engine
+from .models import Comment, CommentReply, ItemRating, QuestionRating
+
+EXPORTABLE = {model.__tablename__: model for model in (Comment, CommentReply, ItemRating, QuestionRating)}
+BATCH_SIZE = 5000
+# How far before the checkpoint a resumed export reads again, for rows committed late
+EXPORT_OVERLAP_SECONDS = float(os.getenv('EXPORT_OVERLAP_SECONDS', 300))
+
+
+def _plain(value):
+    """JSON/CSV representation of a column value."""
+    if isinstance(value, enum.Enum):
+        return value.name
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, UUID):
+        return str(value)
+    return value
+
+
+def _read_checkpoint(path: str, output_path: str) -> dict | None:
+    """The checkpoint at path, or None when there is none or output_path no longer holds what it describes."""
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding="utf-8") as stream:
+        checkpoint = json.load(stream)
+    if not os.path.exists(output_path) or os.path.getsize(output_path) < checkpoint["size"]:
+        return None
+    return checkpoint
+
+
+def _write_checkpoint(path: str, checkpoint: dict) -> None:
+    """Replace the checkpoint file atomically, so a crash never leaves half of one."""
+    temporary = path + ".tmp"
+    with open(temporary, "w", encoding="utf-8") as stream:
+        json.dump(checkpoint, stream)
+        stream.flush()
+        os.fsync(stream.fileno())
+    os.replace(temporary, path)
+
+
+def _render(rows, columns, file_format: str, header: bool) -> bytes:
+    """Serialize one batch of rows."""
+    buffer = io.StringIO()
+    if file_format == "csv":
+        writer = csv.writer(buffer)
+        if header:
+            writer.writerow(columns)
+        for row in rows:
+            writer.writerow([_plain(value) for value in row])
+    else:
+        for row in rows:
+            buffer.write(json.dumps({column: _plain(value) for column, value in zip(columns, row)}, ensure_ascii=False))
+            buffer.write("\n")
+    return buffer.getvalue().encode("utf-8")
+
+
+def export_table(table: str, output_dir: str, file_format: str, compress: bool, batch_size: int = BATCH_SIZE) -> int:
+    """Export new rows of table into output_dir, resuming from its checkpoint; return the number of rows written."""
+    model = EXPORTABLE[table]
+    columns = [column for column in model.__table__.columns if not isinstance(column.type, TSVECTOR)]
+    key_column = next(iter(model.__table__.primary_key.columns))
+    created_column = model.__table__.c.created_at
+    path = os.path.join(output_dir, f"{table}.{file_format}" + (".gz" if compress else ""))
+    checkpoint_path = path + ".checkpoint"
+    checkpoint = _read_checkpoint(checkpoint_path, path)
+    overlap = timedelta(seconds=EXPORT_OVERLAP_SECONDS)
+
+    query = select(*columns).order_by(created_column, key_column)
+    latest = None
+    recent = {}  # id -> created_at of the exported rows less than overlap older than latest
+    if checkpoint:
+        latest = datetime.fromisoformat(checkpoint["created_at"])
+        recent = {UUID(key): datetime.fromisoformat(created) for key, created in checkpoint["recent"].items()}
+        query = query.where(created_column >= latest - overlap)
+
+    written = 0
+    with open(path, "r+b" if checkpoint else "wb") as output:
+        # هر چیزی که بعد از آخرین checkpoint نوشته شده، نیمه‌کاره است
+        output.truncate(checkpoint["size"] if checkpoint else 0)
+        output.seek(0, os.SEEK_END)
+        with (replica_engine or engine).connect() as connection:
+            result = connection.execution_options(stream_results=True, yield_per=batch_size).execute(query)
+            for rows in result.partitions():
+                rows = [row for row in rows if row._mapping[key_column] not in recent]
+                if not rows:
+                    continue
+                data = _render(rows, [column.name for column in columns], file_format, header=output.tell() == 0)
+                output.write(gzip.compress(data) if compress else data)
+                output.flush()
+                os.fsync(output.fileno())
+                written += len(rows)
+                for row in rows:
+                    recent[row._mapping[key_column]] = row._mapping[created_column]
+                latest = max(latest or rows[-1]._mapping[created_column], rows[-1]._mapping[created_column])
+                recent = {key: created for key, created in recent.items() if created >= latest - overlap}
+                checkpoint = {
+                    "created_at": latest.isoformat(),
+                    "recent": {str(key): created.isoformat() for key, created in recent.items()},
+                    "size": output.tell(),
+                    "rows": (checkpoint or {}).get("rows", 0) + len(rows),
+                }
+                _write_checkpoint(checkpoint_path, checkpoint)
+    return written
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Export user content to JSONL or CSV for analytics.")
+    parser.add_argument("tables", nargs="+", choices=sorted(EXPORTABLE), help="tables to export")
+    parser.add_argument("--format", choices=("jsonl", "csv"), default="jsonl")
+    parser.add_argument("--gzip", action="store_true", help="gzip the output files")
+    parser.add_argument("--output-dir", default="exports")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE, help="rows per fetch and per checkpoint")
+    args = parser.parse_args()
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    for table in args.tables:
+        started = time.perf_counter()
+        written = export_table(table, args.output_dir, args.format, args.gzip, args.batch_size)
+        elapsed = time.perf_counter() - started
+        print(f"{table}: {written} rows in {elapsed:.2f}s ({written / elapsed if elapsed else 0:,.0f} rows/s)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
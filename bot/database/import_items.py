@@ -0,0 +1,205 @@
+"""
+Bulk import of catalog items from a supplier CSV or JSONL file.
+
+Each record needs a type (an ItemType name such as DEVICE_PERMANENT, or its
+value such as devices_permanent) and a name; description is optional. The
+file is streamed: records are validated one at a time and written straight
+into a COPY … FROM STDIN on a temporary staging table, so memory does not
+grow with the file. One INSERT … SELECT then merges the staging table into
+items, keeping the first record of every normalized name (normalize_name)
+and skipping names already in the catalog. Everything runs in a single
+transaction, so a failed import leaves the catalog untouched.
+
+Run it from the bot directory after `alembic upgrade head`:
+
+    python -m database.import_items suppliers/items.csv
+    python -m database.import_items suppliers/items.jsonl.gz
+
+A running bot shows the new items in inline search after its next index
+rebuild (every ITEM_INDEX_REFRESH_INTERVAL seconds, pages.search), and in
+the category lists once their catalog_cache entries expire (at most
+CATALOG_CACHE_TTL seconds).
+"""
+import argparse
+import csv
+import gzip
+import io
+import json
+import sys
+import time
+from typing import Iterator, Optional, Tuple
+from sqlalchemy import text
+from .db_handler import engine
+from .models import Item, ItemType
+from .normalization import normalize_name
+
+NAME_MAX_LENGTH = Item.__table__.c.name.type.length
+MAX_REPORTED_ERRORS = 20
+
+_ITEM_TYPES = {item_type.name.lower(): item_type for item_type in ItemType}
+_ITEM_TYPES.update({item_type.value.lower(): item_type for item_type in ItemType})
+
+_MERGE = text(f"""
+    WITH candidates AS (
+        SELECT DISTINCT ON (name_normalized) type, name, name_normalized, description
+        FROM item_import
+        ORDER BY name_normalized, line
+    ), inserted AS (
+        INSERT INTO items (
+            item_id, type, name, name_normalized, description,
+            average_rating, rating_count, rating_sum,
+            rating_1_count, rating_2_count, rating_3_count, rating_4_count, rating_5_count,
+            comment_count, created_at, updated_at
+        )
+        SELECT
+            gen_random_uuid(), candidates.type::{Item.__table__.c.type.type.name}, candidates.name,
+            candidates.name_normalized, candidates.description,
+            0, 0, 0, 0, 0, 0, 0, 0, 0, now(), now()
+        FROM candidates
+        WHERE NOT EXISTS (SELECT 1 FROM items WHERE items.name_normalized = candidates.name_normalized)
+        RETURNING 1
+    )
+    SELECT (SELECT count(*) FROM item_import), (SELECT count(*) FROM candidates), (SELECT count(*) FROM inserted)
+""")
+
+
+class ImportStats:
+    def __init__(self):
+        self.read = 0
+        self.rejected = 0
+        self.errors = []
+
+    def reject(self, line: int, reason: str) -> None:
+        self.rejected += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append(f"line {line}: {reason}")
+
+
+def _open(path: str):
+    """Open path for text reading, decompressing .gz files on the fly."""
+    if path.endswith(".gz"):
+        return gzip.open(path, "rt", encoding="utf-8-sig", newline="")
+    return open(path, encoding="utf-8-sig", newline="")
+
+
+def _records(stream, file_format: str) -> Iterator[Tuple[int, Optional[dict]]]:
+    """Yield (line number, record) for every record of the file; record is None if the line cannot be parsed."""
+    if file_format == "csv":
+        reader = csv.DictReader(stream)
+        for record in reader:
+            yield reader.line_num, record
+        return
+    for line, raw in enumerate(stream, 1):
+        if not raw.strip():
+            continue
+        try:
+            record = json.loads(raw)
+        except json.JSONDecodeError:
+            record = None
+        yield line, record if isinstance(record, dict) else None
+
+
+def _staging_rows(records, stats: ImportStats) -> Iterator[tuple]:
+    """Validate records and yield (line, type name, name, name_normalized, description) for the valid ones."""
+    for line, record in records:
+        stats.read += 1
+        if record is None:
+            stats.reject(line, "not a valid record")
+            continue
+        item_type = _ITEM_TYPES.get(str(record.get("type") or "").strip().lower())
+        name = str(record.get("name") or "").strip()
+        description = str(record.get("description") or "").strip() or None
+        if item_type is None:
+            stats.reject(line, f"unknown type {record.get('type')!r}")
+        elif not name:
+            stats.reject(line, "missing name")
+        elif len(name) > NAME_MAX_LENGTH:
+            stats.reject(line, f"name longer than {NAME_MAX_LENGTH} characters")
+        else:
+            yield line, item_type.name, name, normalize_name(name), description
+
+
+class _CopyStream:
+    """File-like object that renders rows as CSV on demand for COPY … FROM STDIN."""
+
+    def __init__(self, rows: Iterator[tuple]):
+        self._rows = rows
+        self._buffer = io.StringIO()
+        self._writer = csv.writer(self._buffer)
+        self._pending = ""
+
+    def read(self, size: int = -1) -> str:
+        while self._rows is not None and (size < 0 or len(self._pending) < size):
+            row = next(self._rows, None)
+            if row is None:
+                self._rows = None
+                break
+            self._writer.writerow(row)
+            self._pending += self._buffer.getvalue()
+            self._buffer.seek(0)
+            self._buffer.truncate()
+        if size < 0:
+            size = len(self._pending)
+        chunk, self._pending = self._pending[:size], self._pending[size:]
+        return chunk
+
+
+def import_items(path: str, file_format: str) -> dict:
+    """Import the items in path and return the counts of the run."""
+    stats = ImportStats()
+    started = time.perf_counter()
+    with _open(path) as stream, engine.begin() as connection:
+        connection.execute(text("""
+            CREATE TEMPORARY TABLE item_import (
+                line integer, type text, name text, name_normalized text, description text
+            ) ON COMMIT DROP
+        """))
+        cursor = connection.connection.dbapi_connection.cursor()
+        rows = _staging_rows(_records(stream, file_format), stats)
+        cursor.copy_expert(
+            "COPY item_import (line, type, name, name_normalized, description) FROM STDIN WITH (FORMAT csv)",
+            _CopyStream(rows)
+        )
+        copied = time.perf_counter()
+        staged, unique, inserted = connection.execute(_MERGE).one()
+    finished = time.perf_counter()
+    return {
+        "read": stats.read,
+        "rejected": stats.rejected,
+        "duplicates": staged - unique,
+        "existing": unique - inserted,
+        "inserted": inserted,
+        "copy_seconds": copied - started,
+        "merge_seconds": finished - copied,
+        "seconds": finished - started,
+        "errors": stats.errors,
+    }
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Import catalog items from a CSV or JSONL file.")
+    parser.add_argument("path", help="CSV (type,name,description header) or JSONL file, optionally .gz")
+    parser.add_argument("--format", choices=("csv", "jsonl"), help="file format (default: from the file extension)")
+    args = parser.parse_args()
+    file_format = args.format or ("jsonl" if args.path.removesuffix(".gz").endswith((".jsonl", ".json")) else "csv")
+
+    result = import_items(args.path, file_format)
+    for error in result["errors"]:
+        print(error, file=sys.stderr)
+    if result["rejected"] > len(result["errors"]):
+        print(f"... and {result['rejected'] - len(result['errors'])} more rejected records", file=sys.stderr)
+    rate = result["read"] / result["seconds"] if result["seconds"] else 0
+    print(
+        f"{result['read']} records read, {result['rejected']} rejected, "
+        f"{result['duplicates']} duplicate names in file, {result['existing']} already in catalog, "
+        f"{result['inserted']} inserted"
+    )
+    print(
+        f"{result['seconds']:.2f}s ({result['copy_seconds']:.2f}s COPY, {result['merge_seconds']:.2f}s merge), "
+        f"{rate:,.0f} records/s"
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,59 @@
+"""
+In-process metrics for the database layer.
+
+Three kinds of metric are kept, all keyed by a dotted name:
+- counters: plain integers (e.g. "db.sessions.leaked")
+- observations: count/avg/max of a measured value (e.g. checkout wait in ms)
+- gauges: callables read at snapshot time (e.g. connections in use)
+
+They live for the lifetime of the process and can be read with snapshot().
+"""
+import threading
+from collections import defaultdict
+from typing import Callable
+
+_lock = threading.Lock()
+_counters: dict[str, int] = defaultdict(int)
+_observations: dict[str, list] = {}
+_gauges: dict[str, Callable[[], float]] = {}
+
+
+def increment(name: str, value: int = 1) -> None:
+    """Add value to the counter called name."""
+    with _lock:
+        _counters[name] += value
+
+
+def get(name: str) -> int:
+    """Return the current value of a counter."""
+    with _lock:
+        return _counters[name]
+
+
+def observe(name: str, value: float) -> None:
+    """Record one measurement for name."""
+    with _lock:
+        stats = _observations.setdefault(name, [0, 0.0, 0.0])  # count, total, max
+        stats[0] += 1
+        stats[1] += value
+        stats[2] = max(stats[2], value)
+
+
+def register_gauge(name: str, read: Callable[[], float]) -> None:
+    """Register a callable whose value is read on every snapshot."""
+    with _lock:
+        _gauges[name] = read
+
+
+def snapshot() -> dict:
+    """Return the current value of every metric."""
+    with _lock:
+        values = dict(_counters)
+        for name, (count, total, maximum) in _observations.items():
+            values[f"{name}.count"] = count
+            values[f"{name}.avg"] = round(total / count, 3) if count else 0
+            values[f"{name}.max"] = round(maximum, 3)
+        gauges = dict(_gauges)
+    for name, read in gauges.items():
+        values[name] = read()
+    return values
@@ -0,0 +1,34 @@
+"""
+Bring the database schema up to date.
+
+The schema is owned by the Alembic migrations in migrations/versions; the
+bot itself never creates or alters tables. Run this as the release step of
+a deploy, before starting the new version of the bot:
+
+    python -m database.migrate          # or: python main.py migrate
+
+It is the same as `alembic upgrade head`, but works from any directory.
+"""
+import os
+import sys
+from alembic import command
+from alembic.config import Config
+
+BOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def migrate(revision: str = "head") -> None:
+    """Upgrade the database at DATABASE_URL to revision."""
+    config = Config(os.path.join(BOT_DIR, "alembic.ini"))
+    config.set_main_option("script_location", os.path.join(BOT_DIR, "migrations"))
+    config.set_main_option("prepend_sys_path", BOT_DIR)  # env.py و مایگریشن‌ها ماژول database را import می‌کنند
+    command.upgrade(config, revision)
+
+
+def main() -> int:
+    migrate(sys.argv[1] if len(sys.argv) > 1 else "head")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,17 +1,33 @@
 import uuid
 from datetime import datetime
 from sqlalchemy import (
-    BigInteger, String, Text, Float, Integer, ForeignKey, CheckConstraint, Enum, UniqueConstraint
+    BigInteger, String, Text, Float, Integer, ForeignKey, CheckConstraint, Enum, UniqueConstraint, Index, Computed
 )
-from sqlalchemy.dialects.postgresql import UUID, TIMESTAMP
+from sqlalchemy.dialects.postgresql import UUID, TIMESTAMP, TSVECTOR
 from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column, relationship
 from enum import Enum as PyEnum
 from sqlalchemy import func
+from .normalization import NAME_KEY_LENGTH, sql_normalize
 # کلاس پایه برای مدل‌های SQLAlchemy
 # این کلاس به عنوان کلاس پایه برای تمام مدل‌های دیگر استفاده می‌شود
 class Base(DeclarativeBase):
     pass
 
+def search_vector_column(expression: str):
+    """
+    Generated tsvector column over the SQL expression, for full-text search.
+
+    Text is normalized like normalize_text() and parsed with the 'simple'
+    configuration (no stemming), so Persian and English words match as typed.
+    Postgres keeps it current on every write; it is deferred so ordinary
+    queries do not load it.
+    """
+    return mapped_column(
+        TSVECTOR,
+        Computed(f"to_tsvector('simple'::regconfig, {sql_normalize(expression)})", persisted=True),
+        deferred=True
+    )
+
 # شمارشگر برای وضعیت کاربر
 # وضعیت‌های ممکن: در انتظار تأیید، تأیید شده
 class UserStatus(PyEnum):
@@ -82,9 +98,18 @@ class Item(Base):
     item_id: Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)  # شناسه محصول (کلید اصلی)
     type: Mapped[ItemType] = mapped_column(Enum(ItemType), nullable=False)  # نوع محصول (الزامی)
     name: Mapped[str] = mapped_column(String(100), nullable=False)  # نام محصول (الزامی)
+    name_normalized: Mapped[str] = mapped_column(String(NAME_KEY_LENGTH), nullable=False)  # نام نرمال‌شده برای جستجو (normalize_name)
     description: Mapped[str] = mapped_column(Text, nullable=True)  # توضیحات محصول (اختیاری)
+    search_vector: Mapped[str] = search_vector_column("(name || ' ' || coalesce(description, ''))")  # بردار جستجوی متنی (تولیدشده)
     average_rating: Mapped[float] = mapped_column(Float, default=0)  # میانگین امتیاز (پیش‌فرض: 0)
     rating_count: Mapped[int] = mapped_column(Integer, default=0)  # تعداد امتیازدهی (پیش‌فرض: 0)
+    rating_sum: Mapped[int] = mapped_column(Integer, default=0)  # مجموع امتیازها (پیش‌فرض: 0)
+    rating_1_count: Mapped[int] = mapped_column(Integer, default=0)  # تعداد رأی‌های یک ستاره
+    rating_2_count: Mapped[int] = mapped_column(Integer, default=0)  # تعداد رأی‌های دو ستاره
+    rating_3_count: Mapped[int] = mapped_column(Integer, default=0)  # تعداد رأی‌های سه ستاره
+    rating_4_count: Mapped[int] = mapped_column(Integer, default=0)  # تعداد رأی‌های چهار ستاره
+    rating_5_count: Mapped[int] = mapped_column(Integer, default=0)  # تعداد رأی‌های پنج ستاره
+    comment_count: Mapped[int] = mapped_column(Integer, nullable=False, default=0)  # تعداد نظرات تأییدشده
     created_at: Mapped[datetime] = mapped_column(TIMESTAMP(timezone=True), default=datetime.utcnow)  # زمان ایجاد
     updated_at: Mapped[datetime] = mapped_column(TIMESTAMP(timezone=True), default=datetime.utcnow, onupdate=datetime.utcnow)  # زمان بروزرسانی
     
@@ -96,6 +121,11 @@ class Item(Base):
     __table_args__ = (
         CheckConstraint("average_rating >= 0 AND average_rating <= 5", name="check_average_rating_range"),  # میانگین امتیاز باید بین 0 تا 5 باشد
         CheckConstraint("rating_count >= 0", name="check_rating_count_non_negative"),  # تعداد امتیازدهی نمی‌تواند منفی باشد
+        Index("ix_items_type_average_rating_item_id", "type", "average_rating", "item_id"),  # صفحه‌بندی keyset لیست محصولات هر دسته
+        Index("ix_items_name_normalized", "name_normalized"),  # جستجوی دقیق نام نرمال‌شده
+        Index("ix_items_name_normalized_trgm", "name_normalized", postgresql_using="gin", postgresql_ops={"name_normalized": "gin_trgm_ops"}),  # جستجوی نام محصول (pg_trgm)
+        Index("ix_items_description_trgm", "description", postgresql_using="gin", postgresql_ops={"description": "gin_trgm_ops"}),  # جستجوی توضیحات محصول (pg_trgm)
+        Index("ix_items_search_vector", "search_vector", postgresql_using="gin"),  # جستجوی متنی
     )
 
 # جدول نظرات
@@ -107,8 +137,10 @@ class Comment(Base):
     item_id: Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True), ForeignKey("items.item_id", ondelete="CASCADE"), nullable=False)  # شناسه محصول (کلید خارجی)
     user_id: Mapped[int] = mapped_column(BigInteger, ForeignKey("users.user_id", ondelete="CASCADE"), nullable=False)  # شناسه کاربر (کلید خارجی)
     text: Mapped[str] = mapped_column(Text, nullable=False)  # متن نظر (الزامی)
+    search_vector: Mapped[str] = search_vector_column("text")  # بردار جستجوی متنی (تولیدشده)
     media_url: Mapped[str] = mapped_column(String(255), nullable=True)  # آدرس رسانه (اختیاری)
     status: Mapped[ContentStatus] = mapped_column(Enum(ContentStatus), default=ContentStatus.PENDING)  # وضعیت نظر (پیش‌فرض: در انتظار)
+    reply_count: Mapped[int] = mapped_column(Integer, nullable=False, default=0)  # تعداد پاسخ‌های مستقیم تأییدشده
     created_at: Mapped[datetime] = mapped_column(TIMESTAMP(timezone=True), default=datetime.utcnow)  # زمان ایجاد
     updated_at: Mapped[datetime] = mapped_column(TIMESTAMP(timezone=True), default=datetime.utcnow, onupdate=datetime.utcnow)  # زمان بروزرسانی
     
@@ -117,6 +149,13 @@ class Comment(Base):
     user: Mapped["User"] = relationship(back_populates="comments")  # رابطه با کاربر
     replies: Mapped[list["CommentReply"]] = relationship(back_populates="comment")  # رابطه با پاسخ‌های نظر
 
+    # ایندکس‌ها
+    __table_args__ = (
+        Index("ix_comments_item_id_status_created_at", "item_id", "status", "created_at"),  # نظرات یک محصول
+        Index("ix_comments_user_id_created_at", "user_id", "created_at"),  # محدودیت روزانه
+        Index("ix_comments_search_vector", "search_vector", postgresql_using="gin"),  # جستجوی متنی
+    )
+
 # جدول پاسخ‌های نظرات
 # این جدول پاسخ‌های کاربران به نظرات را ذخیره می‌کند
 class CommentReply(Base):
@@ -131,10 +170,14 @@ class CommentReply(Base):
         ForeignKey("comment_replies.reply_id", ondelete="CASCADE"), 
         nullable=True
     )  # پاسخ والد (در صورت وجود)
+    # مسیر از ریشه رشته: شناسه hex همه اجداد و خود پاسخ، هر کدام با "/" در انتها
+    path: Mapped[str] = mapped_column(Text, nullable=False)
+    depth: Mapped[int] = mapped_column(Integer, nullable=False, default=0)  # عمق در رشته (پاسخ مستقیم به نظر: 0)
     
     text: Mapped[str] = mapped_column(Text, nullable=False)
     media_url: Mapped[str] = mapped_column(String(255), nullable=True)
     status: Mapped[ContentStatus] = mapped_column(Enum(ContentStatus), default=ContentStatus.PENDING)
+    reply_count: Mapped[int] = mapped_column(Integer, nullable=False, default=0)  # تعداد پاسخ‌های مستقیم تأییدشده
     created_at: Mapped[datetime] = mapped_column(TIMESTAMP(timezone=True), default=datetime.utcnow)
     updated_at: Mapped[datetime] = mapped_column(TIMESTAMP(timezone=True), default=datetime.utcnow, onupdate=datetime.utcnow)
 
@@ -156,6 +199,16 @@ class CommentReply(Base):
         foreign_keys=[parent_reply_id] # ارجاع به صفت parent_reply_id همین کلاس
     )
 
+    # ایندکس‌ها
+    __table_args__ = (
+        # پاسخ‌های مستقیم به یک نظر (بدون پاسخ والد)
+        Index(
+            "ix_comment_replies_comment_id_status_created_at", "comment_id", "status", "created_at",
+            postgresql_where=parent_reply_id.is_(None),
+        ),
+        Index("ix_comment_replies_parent_reply_id_status_created_at", "parent_reply_id", "status", "created_at"),  # پاسخ‌های یک پاسخ
+        Index("ix_comment_replies_path", "path", postgresql_ops={"path": "text_pattern_ops"}),  # زیردرخت یک پاسخ (پیشوند مسیر)
+    )
  
     
 # جدول سوالات فنی
@@ -166,10 +219,18 @@ class TechQuestion(Base):
     question_id: Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)  # شناسه سوال (کلید اصلی)
     user_id: Mapped[int] = mapped_column(BigInteger, ForeignKey("users.user_id", ondelete="CASCADE"), nullable=False)  # شناسه کاربر (کلید خارجی)
     text: Mapped[str] = mapped_column(Text, nullable=False)  # متن سوال (الزامی)
+    search_vector: Mapped[str] = search_vector_column("text")  # بردار جستجوی متنی (تولیدشده)
     media_url: Mapped[str] = mapped_column(String(255), nullable=True)  # آدرس رسانه (اختیاری)
     status: Mapped[ContentStatus] = mapped_column(Enum(ContentStatus), default=ContentStatus.PENDING)  # وضعیت سوال (پیش‌فرض: در انتظار)
     average_rating: Mapped[float] = mapped_column(Float, default=0)  # میانگین امتیاز (پیش‌فرض: 0)
     rating_count: Mapped[int] = mapped_column(Integer, default=0)  # تعداد امتیازدهی (پیش‌فرض: 0)
+    rating_sum: Mapped[int] = mapped_column(Integer, default=0)  # مجموع امتیازها (پیش‌فرض: 0)
+    rating_1_count: Mapped[int] = mapped_column(Integer, default=0)  # تعداد رأی‌های یک ستاره
+    rating_2_count: Mapped[int] = mapped_column(Integer, default=0)  # تعداد رأی‌های دو ستاره
+    rating_3_count: Mapped[int] = mapped_column(Integer, default=0)  # تعداد رأی‌های سه ستاره
+    rating_4_count: Mapped[int] = mapped_column(Integer, default=0)  # تعداد رأی‌های چهار ستاره
+    rating_5_count: Mapped[int] = mapped_column(Integer, default=0)  # تعداد رأی‌های پنج ستاره
+    reply_count: Mapped[int] = mapped_column(Integer, nullable=False, default=0)  # تعداد پاسخ‌های تأییدشده
     created_at: Mapped[datetime] = mapped_column(TIMESTAMP(timezone=True), default=datetime.utcnow)  # زمان ایجاد
     updated_at: Mapped[datetime] = mapped_column(TIMESTAMP(timezone=True), default=datetime.utcnow, onupdate=datetime.utcnow)  # زمان بروزرسانی
     
@@ -182,6 +243,9 @@ class TechQuestion(Base):
     __table_args__ = (
         CheckConstraint("average_rating >= 0 AND average_rating <= 5", name="check_question_average_rating_range"),  # میانگین امتیاز باید بین 0 تا 5 باشد
         CheckConstraint("rating_count >= 0", name="check_question_rating_count_non_negative"),  # تعداد امتیازدهی نمی‌تواند منفی باشد
+        Index("ix_tech_questions_status_average_rating_created_at", "status", "average_rating", "created_at"),  # سوالات برتر
+        Index("ix_tech_questions_user_id_created_at", "user_id", "created_at"),  # محدودیت روزانه
+        Index("ix_tech_questions_search_vector", "search_vector", postgresql_using="gin"),  # جستجوی متنی
     )
 
 # جدول پاسخ‌های سوالات
@@ -193,6 +257,7 @@ class QuestionReply(Base):
     question_id: Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True), ForeignKey("tech_questions.question_id", ondelete="CASCADE"), nullable=False)  # شناسه سوال (کلید خارجی)
     user_id: Mapped[int] = mapped_column(BigInteger, ForeignKey("users.user_id", ondelete="CASCADE"), nullable=False)  # شناسه کاربر (کلید خارجی)
     text: Mapped[str] = mapped_column(Text, nullable=False)  # متن پاسخ (الزامی)
+    search_vector: Mapped[str] = search_vector_column("text")  # بردار جستجوی متنی (تولیدشده)
     media_url: Mapped[str] = mapped_column(String(255), nullable=True)  # آدرس رسانه (اختیاری)
     status: Mapped[ContentStatus] = mapped_column(Enum(ContentStatus), default=ContentStatus.PENDING)  # وضعیت پاسخ (پیش‌فرض: در انتظار)
     created_at: Mapped[datetime] = mapped_column(TIMESTAMP(timezone=True), default=datetime.utcnow)  # زمان ایجاد
@@ -202,6 +267,12 @@ class QuestionReply(Base):
     question: Mapped["TechQuestion"] = relationship(back_populates="replies")  # رابطه با سوال
     user: Mapped["User"] = relationship(back_populates="question_replies")  # رابطه با کاربر
 
+    # ایندکس‌ها
+    __table_args__ = (
+        Index("ix_question_replies_question_id_status_created_at", "question_id", "status", "created_at"),  # پاسخ‌های یک سوال
+        Index("ix_question_replies_search_vector", "search_vector", postgresql_using="gin"),  # جستجوی متنی
+    )
+
 # جدول امتیازدهی به محصولات
 # این جدول امتیازهای کاربران به محصولات را ذخیره می‌کند
 class ItemRating(Base):
@@ -221,6 +292,7 @@ class ItemRating(Base):
     __table_args__ = (
         CheckConstraint("score >= 1 AND score <= 5", name="check_item_score_range"),  # امتیاز باید بین 1 تا 5 باشد
         UniqueConstraint("user_id", "item_id", name="unique_user_item_rating"),  # هر کاربر فقط یک بار می‌تواند به هر محصول امتیاز دهد
+        Index("ix_item_ratings_item_id", "item_id"),  # محاسبه میانگین امتیاز محصول
     )
 
 # جدول امتیازدهی به سوالات فنی
@@ -242,6 +314,7 @@ class QuestionRating(Base):
     __table_args__ = (
         CheckConstraint("score >= 1 AND score <= 5", name="check_question_score_range"),  # امتیاز باید بین 1 تا 5 باشد
         UniqueConstraint("user_id", "question_id", name="unique_user_question_rating"),  # هر کاربر فقط یک بار می‌تواند به هر سوال امتیاز دهد
+        Index("ix_question_ratings_question_id", "question_id"),  # محاسبه میانگین امتیاز سوال
     )
 # جدول پیشنهادات محصول
 # این جدول پیشنهادات کاربران برای محصولات جدید را ذخیره می‌کند
@@ -259,6 +332,11 @@ class ProductSuggestion(Base):
     # روابط با سایر جدول‌ها
     user: Mapped["User"] = relationship(back_populates="product_suggestions")  # رابطه با کاربر
 
+    # ایندکس‌ها
+    __table_args__ = (
+        Index("ix_product_suggestions_status_created_at", "status", "created_at"),  # صف بررسی پیشنهادات
+    )
+
 # جدول پیام‌های تماس
 # این جدول پیام‌های تماس کاربران را ذخیره می‌کند
 class ContactMessage(Base):
@@ -275,3 +353,9 @@ class ContactMessage(Base):
     
     # روابط با سایر جدول‌ها
     user: Mapped["User"] = relationship(back_populates="contact_messages")  # رابطه با کاربر
+
+    # ایندکس‌ها
+    __table_args__ = (
+        Index("ix_contact_messages_status_created_at", "status", "created_at"),  # صف پیام‌های در انتظار
+        Index("ix_contact_messages_user_id_created_at", "user_id", "created_at"),  # محدودیت روزانه
+    )
@@ -0,0 +1,60 @@
+"""
+Normalization of Persian text for search keys.
+
+Users type the same product name in many ways: Arabic ي/ك instead of
+Persian ی/ک, with or without a zero-width non-joiner, with Persian, Arabic
+or ASCII digits, with diacritics or tatweel. normalize_text() maps all of
+these to one form. It is applied when items are written (name_normalized,
+through normalize_name()) and to every search query, so matching is a plain
+comparison in SQL.
+sql_normalize() applies the same character mapping inside Postgres, for
+expressions such as the full-text search columns.
+"""
+import re
+import unicodedata
+
+_CHARACTER_MAP = {
+    # حروف عربی به فارسی
+    "ي": "ی", "ى": "ی", "ك": "ک",
+    "ة": "ه", "ۀ": "ه",
+    "أ": "ا", "إ": "ا", "ٱ": "ا",
+    # نیم‌فاصله و اتصال‌دهنده به فاصله
+    "\u200c": " ", "\u200d": " ",
+}
+# ارقام فارسی و عربی به ارقام لاتین
+_CHARACTER_MAP.update({chr(0x06F0 + digit): str(digit) for digit in range(10)})
+_CHARACTER_MAP.update({chr(0x0660 + digit): str(digit) for digit in range(10)})
+# اعراب و کشیده حذف می‌شوند
+_CHARACTER_MAP.update({chr(code): None for code in range(0x064B, 0x0660)})
+_CHARACTER_MAP.update({"\u0670": None, "\u0640": None})
+
+_TRANSLATION = str.maketrans(_CHARACTER_MAP)
+
+# The same mapping as arguments for SQL translate(), which deletes the
+# characters of the first string that have no counterpart in the second
+_REPLACED = [(source, target) for source, target in _CHARACTER_MAP.items() if target is not None]
+SQL_TRANSLATE_FROM = "".join(source for source, _ in _REPLACED) + "".join(source for source, target in _CHARACTER_MAP.items() if target is None)
+SQL_TRANSLATE_TO = "".join(target for _, target in _REPLACED)
+_WHITESPACE = re.compile(r"\s+")
+
+# Length of items.name_normalized; normalization can lengthen a name (NFKC expands some ligatures)
+NAME_KEY_LENGTH = 100
+
+
+def normalize_text(text: str) -> str:
+    """Return the search key for text: unified letters and digits, no diacritics, lower case, single spaces."""
+    if text is None:
+        return None
+    # NFKC folds Arabic presentation forms and full-width characters first
+    text = unicodedata.normalize("NFKC", text).translate(_TRANSLATION)
+    return _WHITESPACE.sub(" ", text.casefold()).strip()
+
+
+def normalize_name(name: str) -> str:
+    """Return the name_normalized of an item name: normalize_text(name), cut to NAME_KEY_LENGTH."""
+    return normalize_text(name)[:NAME_KEY_LENGTH]
+
+
+def sql_normalize(expression: str) -> str:
+    """SQL that applies the character mapping of normalize_text() to expression (case and spacing are left to the caller)."""
+    return f"translate({expression}, '{SQL_TRANSLATE_FROM}', '{SQL_TRANSLATE_TO}')"
@@ -0,0 +1,58 @@
+"""
+Connection pools that report their activity to database.metrics.
+
+For each checkout they record how long the caller waited for a connection
+and pool timeouts. instrument_pool() adds gauges for connections in use and
+current overflow, and counts every connection opened beyond pool_size.
+"""
+import time
+from sqlalchemy import event, exc
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+from . import metrics
+
+
+class _InstrumentedPoolMixin:
+    metrics_prefix = "db.pool"
+
+    def connect(self):
+        started = time.perf_counter()
+        try:
+            connection = super().connect()
+        except exc.TimeoutError:
+            metrics.increment(f"{self.metrics_prefix}.timeouts")
+            raise
+        metrics.observe(f"{self.metrics_prefix}.checkout_wait_ms", (time.perf_counter() - started) * 1000)
+        return connection
+
+
+class InstrumentedQueuePool(_InstrumentedPoolMixin, QueuePool):
+    """QueuePool for the sync engine."""
+    metrics_prefix = "db.pool"
+
+
+class InstrumentedAsyncQueuePool(_InstrumentedPoolMixin, AsyncAdaptedQueuePool):
+    """QueuePool for the asyncpg engine."""
+    metrics_prefix = "db.async_pool"
+
+
+class InstrumentedReplicaQueuePool(InstrumentedQueuePool):
+    """QueuePool for the sync read-replica engine."""
+    metrics_prefix = "db.replica_pool"
+
+
+class InstrumentedAsyncReplicaQueuePool(InstrumentedAsyncQueuePool):
+    """QueuePool for the asyncpg read-replica engine."""
+    metrics_prefix = "db.async_replica_pool"
+
+
+def instrument_pool(engine, prefix: str) -> None:
+    """Expose engine's pool usage as gauges and count overflow connections."""
+    metrics.register_gauge(f"{prefix}.size", lambda: engine.pool.size())
+    metrics.register_gauge(f"{prefix}.in_use", lambda: engine.pool.checkedout())
+    metrics.register_gauge(f"{prefix}.overflow", lambda: max(engine.pool.overflow(), 0))
+
+    @event.listens_for(engine, "connect")
+    def count_overflow_connection(dbapi_connection, connection_record):
+        # the pool raises its overflow counter before opening the connection
+        if engine.pool.overflow() > 0:
+            metrics.increment(f"{prefix}.overflow_connections")
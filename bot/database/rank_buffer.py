@@ -0,0 +1,147 @@
+"""
+Write-behind buffer for rank_score increments.
+
+Comments, replies, questions, ratings and suggestions all give their author
+rank points. Instead of an UPDATE of the author's users row in every one of
+those transactions (a row lock contended during bursts), the points are
+staged on the session (stage()) and, once the transaction commits, added to
+rank_buffer. The buffer sums them per user and flush() writes them all with
+one UPDATE … FROM (VALUES …) (db_operations.add_rank_scores). Points of a
+transaction that rolls back are dropped with it.
+
+The bot runs the flusher from post_init (start()) and flushes a last time on
+shutdown (stop()). Points are flushed every RANK_FLUSH_INTERVAL seconds, or
+sooner once RANK_BUFFER_MAX_USERS users have points pending, so a crash loses
+at most that much. A flush that fails before its COMMIT is sent puts its
+points back for the next one. One that fails during the COMMIT may or may
+not have been applied, so its points are logged and dropped rather than
+risk adding them twice. Flushes, flushed, dropped and pending users are in
+metrics under rank_buffer.*.
+"""
+import asyncio
+import logging
+import os
+import threading
+import time
+from collections import defaultdict
+from typing import Optional
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from . import metrics
+from .db_handler import RoutingSession, get_async_db
+from .user_cache import user_cache
+
+logger = logging.getLogger(__name__)
+
+RANK_FLUSH_INTERVAL = float(os.getenv('RANK_FLUSH_INTERVAL', 5))
+RANK_BUFFER_MAX_USERS = int(os.getenv('RANK_BUFFER_MAX_USERS', 1000))
+
+
+def stage(db: Session, user_id: int, points: int) -> None:
+    """Add points to user_id's rank score when db's transaction commits."""
+    db.info.setdefault("rank_points", defaultdict(int))[user_id] += points
+
+
+@event.listens_for(RoutingSession, "after_commit")
+def _commit_staged(session: Session) -> None:
+    staged = session.info.pop("rank_points", None)
+    if staged:
+        rank_buffer.add(staged)
+
+
+@event.listens_for(RoutingSession, "after_rollback")
+def _drop_staged(session: Session) -> None:
+    session.info.pop("rank_points", None)
+
+
+class RankBuffer:
+    def __init__(self, interval: float = RANK_FLUSH_INTERVAL, max_users: int = RANK_BUFFER_MAX_USERS):
+        self.interval = interval
+        self.max_users = max_users
+        self._lock = threading.Lock()
+        self._pending: dict[int, int] = defaultdict(int)
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._wake: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+    def add(self, points: dict[int, int]) -> None:
+        """Add committed points (user_id -> points) to the next flush."""
+        with self._lock:
+            for user_id, value in points.items():
+                self._pending[user_id] += value
+            full = len(self._pending) >= self.max_users
+        if full and self._loop is not None:
+            self._loop.call_soon_threadsafe(self._wake.set)
+
+    def _take(self) -> dict[int, int]:
+        with self._lock:
+            points, self._pending = self._pending, defaultdict(int)
+        return {user_id: value for user_id, value in points.items() if value}
+
+    async def flush(self) -> int:
+        """Write the pending points to users.rank_score; return the number of users updated."""
+        from .async_db_operations import add_rank_scores  # async_db_operations → db_operations → این ماژول
+
+        points = self._take()
+        if not points:
+            return 0
+        started = time.perf_counter()
+        committing = []
+        try:
+            async with get_async_db() as db:
+                event.listen(db.sync_session, "before_commit", committing.append)
+                updated = await add_rank_scores(db, points)
+        except BaseException:
+            if committing:
+                # نتیجه COMMIT معلوم نیست؛ برگرداندن امتیازها ممکن است آن‌ها را دو بار اضافه کند
+                metrics.increment("rank_buffer.dropped_users", len(points))
+                logger.error("Rank points of %d users may not have been written; dropping them: %s", len(points), points)
+            else:
+                self.add(points)
+            raise
+        finally:
+            if committing:
+                for user_id in points:
+                    user_cache.invalidate(user_id)
+        metrics.increment("rank_buffer.flushes")
+        metrics.increment("rank_buffer.flushed_users", len(points))
+        metrics.observe("rank_buffer.flush_ms", (time.perf_counter() - started) * 1000)
+        return updated
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), self.interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            try:
+                await self.flush()
+            except Exception:
+                logger.exception("Flushing rank points failed; next flush in %.0f s", self.interval)
+
+    def start(self) -> None:
+        """Start flushing periodically on the running event loop."""
+        self._loop = asyncio.get_running_loop()
+        self._wake = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Stop the periodic flush and write what is still pending."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        self._loop = None
+        await self.flush()
+
+
+# Buffer shared by the whole process
+rank_buffer = RankBuffer()
+metrics.register_gauge("rank_buffer.pending_users", lambda: len(rank_buffer))
@@ -0,0 +1,159 @@
+"""
+In-process search index over item names, for inline queries.
+
+Inline queries arrive on every keystroke, so they are answered from memory
+instead of Postgres. Names are keyed by normalize_text(), like
+items.name_normalized, and indexed two ways:
+- every prefix of every word, for as-you-type matches
+- trigrams of every word, for typos and partial words when prefixes miss
+
+Items are also kept in a list ordered by rating, so a short prefix that
+matches much of the catalog is answered by walking that list instead of
+sorting every match. The index is filled at startup (rebuild), kept current
+by the async item writes (add) and rebuilt periodically for items written
+outside this process (pages.search.refresh_item_search_index). It is only
+touched from the event loop, so it needs no lock.
+"""
+import bisect
+import heapq
+import math
+from collections import defaultdict
+from typing import Iterable, List, NamedTuple, Optional
+from uuid import UUID
+from .models import Item, ItemType
+from .normalization import normalize_text
+
+MAX_PREFIX_LENGTH = 20     # پیشوندهای بلندتر فقط با بررسی مستقیم نام تطبیق داده می‌شوند
+MIN_SIMILARITY = 0.5       # سهم سه‌حرفی‌های عبارت جستجو که باید در نام باشند
+
+
+class IndexedItem(NamedTuple):
+    item_id: UUID
+    type: ItemType
+    name: str
+    description: Optional[str]
+    average_rating: float
+    name_normalized: str
+
+
+def _trigrams(text: str) -> set:
+    """Trigrams of each word padded like pg_trgm ('  w', ' wo', 'wor', 'ord', 'rd ')."""
+    grams = set()
+    for word in text.split():
+        padded = f"  {word} "
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+class ItemSearchIndex:
+    def __init__(self):
+        self._items: dict[UUID, IndexedItem] = {}
+        self._prefixes: dict[str, set] = defaultdict(set)
+        self._trigrams: dict[str, set] = defaultdict(set)
+        self._item_trigrams: dict[UUID, set] = {}
+        self._by_rating: list = []  # (-average_rating, item_id) به ترتیب امتیاز
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def rebuild(self, items: Iterable[Item]) -> None:
+        """Replace the whole index with items."""
+        self._items.clear()
+        self._prefixes.clear()
+        self._trigrams.clear()
+        self._item_trigrams.clear()
+        self._by_rating.clear()
+        for item in items:
+            self.add(item)
+
+    def add(self, item: Item) -> None:
+        """Index item, replacing what was indexed for it before."""
+        self.remove(item.item_id)
+        key = item.name_normalized or normalize_text(item.name)
+        entry = IndexedItem(item.item_id, item.type, item.name, item.description, item.average_rating or 0, key)
+        self._items[item.item_id] = entry
+        bisect.insort(self._by_rating, (-entry.average_rating, item.item_id))
+        for prefix in self._prefix_keys(key):
+            self._prefixes[prefix].add(item.item_id)
+        grams = _trigrams(key)
+        self._item_trigrams[item.item_id] = grams
+        for gram in grams:
+            self._trigrams[gram].add(item.item_id)
+
+    def remove(self, item_id: UUID) -> None:
+        entry = self._items.pop(item_id, None)
+        if entry is None:
+            return
+        position = bisect.bisect_left(self._by_rating, (-entry.average_rating, item_id))
+        del self._by_rating[position]
+        grams = self._item_trigrams.pop(item_id)
+        for index, keys in ((self._prefixes, self._prefix_keys(entry.name_normalized)), (self._trigrams, grams)):
+            for key in keys:
+                ids = index.get(key)
+                if ids is not None:
+                    ids.discard(item_id)
+                    if not ids:
+                        del index[key]
+
+    def search(self, query: str, limit: int = 20) -> List[IndexedItem]:
+        """
+        Items matching query, best first.
+
+        Items where every query word starts a word of the name, by rating.
+        Only when there are none (usually a typo) are names sharing enough
+        trigrams with the query returned, by similarity. An empty query
+        returns the top-rated items.
+        """
+        words = normalize_text(query or "").split()
+        if not words:
+            return [self._items[item_id] for _, item_id in self._by_rating[:limit]]
+
+        prefix_ids = None
+        for word in words:
+            ids = self._prefixes.get(word[:MAX_PREFIX_LENGTH], set())
+            prefix_ids = ids if prefix_ids is None else prefix_ids & ids
+            if not prefix_ids:
+                break
+        if any(len(word) > MAX_PREFIX_LENGTH for word in words):
+            prefix_ids = {
+                item_id for item_id in prefix_ids
+                if all(any(name_word.startswith(word) for name_word in self._items[item_id].name_normalized.split()) for word in words)
+            }
+        if prefix_ids:
+            return self._top_rated(prefix_ids, limit)
+        return self._similar(words, limit)
+
+    def _top_rated(self, item_ids: set, limit: int) -> List[IndexedItem]:
+        """The limit best-rated of item_ids."""
+        if len(item_ids) > 8 * limit:
+            # بیشتر کاتالوگ تطبیق دارد: پیمایش لیست مرتب تا پر شدن نتایج
+            top = []
+            for _, item_id in self._by_rating:
+                if item_id in item_ids:
+                    top.append(self._items[item_id])
+                    if len(top) == limit:
+                        break
+            return top
+        return heapq.nlargest(limit, (self._items[item_id] for item_id in item_ids), key=lambda entry: entry.average_rating)
+
+    def _similar(self, words: List[str], limit: int) -> List[IndexedItem]:
+        """Items whose name contains at least MIN_SIMILARITY of the query's trigrams (like pg_trgm word_similarity), most similar first."""
+        query_grams = _trigrams(" ".join(words))
+        # هر نام با شباهت کافی حداقل یکی از کم‌تکرارترین سه‌حرفی‌ها را دارد
+        needed = math.ceil(MIN_SIMILARITY * len(query_grams))
+        rarest = sorted(query_grams, key=lambda gram: len(self._trigrams.get(gram, ())))[:len(query_grams) - needed + 1]
+        candidates = set().union(*(self._trigrams.get(gram, ()) for gram in rarest))
+        scored = []
+        for item_id in candidates:
+            similarity = len(query_grams & self._item_trigrams[item_id]) / len(query_grams)
+            if similarity >= MIN_SIMILARITY:
+                scored.append((similarity, self._items[item_id].average_rating, self._items[item_id]))
+        return [entry for _, _, entry in heapq.nlargest(limit, scored, key=lambda row: row[:2])]
+
+    @staticmethod
+    def _prefix_keys(key: str) -> set:
+        return {word[:length] for word in key.split() for length in range(1, min(len(word), MAX_PREFIX_LENGTH) + 1)}
+
+
+# Index shared by the whole process
+item_index = ItemSearchIndex()
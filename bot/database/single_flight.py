@@ -0,0 +1,74 @@
+"""
+Request coalescing (single-flight) for identical concurrent reads.
+
+When many users open the same category or item at once, every update would
+send the same query. Reads wrapped with single_flight in async_db_operations
+instead share one query per key: the first caller (the leader) runs it, and
+callers arriving while it is in flight await its result. Nothing is kept once
+the query finishes; caching is catalog_cache's job.
+
+The key is the operation, its arguments, whether the caller reads from the
+primary (see RoutingSession) and catalog_cache.generation, so a caller never
+joins a query that started before a write it has to see. An error of the
+leader is raised to every caller sharing its query; if the leader is
+cancelled, the callers waiting on it run the query themselves. Shared and
+leading calls are counted in metrics under single_flight.*.
+"""
+import asyncio
+from typing import Any, Awaitable, Callable, Hashable
+from sqlalchemy.orm import Session
+from . import metrics
+from .models import Base
+
+
+class SingleFlight:
+    def __init__(self):
+        self._calls: dict[Hashable, asyncio.Future] = {}
+
+    def __len__(self) -> int:
+        return len(self._calls)
+
+    async def do(self, key: Hashable, call: Callable[[], Awaitable[Any]]) -> tuple[Any, bool]:
+        """Return (result, shared): the result of call(), or of the call already in flight for key."""
+        while (future := self._calls.get(key)) is not None:
+            metrics.increment("single_flight.shared")
+            try:
+                return await asyncio.shield(future), True
+            except asyncio.CancelledError:
+                # فقط اگر leader لغو شده باشد (نه خود این task) دوباره تلاش می‌کنیم
+                if not future.cancelled() or asyncio.current_task().cancelling():
+                    raise
+
+        future = asyncio.get_running_loop().create_future()
+        self._calls[key] = future
+        metrics.increment("single_flight.leaders")
+        try:
+            result = await call()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except BaseException as error:
+            future.set_exception(error)
+            future.exception()  # بدون منتظر هم هشدار "never retrieved" ندهد
+            raise
+        finally:
+            if self._calls.get(key) is future:
+                del self._calls[key]
+        future.set_result(result)
+        return result, False
+
+
+def merged(session: Session, value: Any) -> Any:
+    """Copy the ORM objects in a shared result (an object, a list, or a tuple of those) into session, without SQL."""
+    if isinstance(value, Base):
+        return session.merge(value, load=False)
+    if isinstance(value, list):
+        return [merged(session, element) for element in value]
+    if isinstance(value, tuple):
+        return tuple(merged(session, element) for element in value)
+    return value
+
+
+# Queries in flight in this process
+in_flight = SingleFlight()
+metrics.register_gauge("single_flight.in_flight", lambda: len(in_flight))
@@ -0,0 +1,91 @@
+"""
+In-process cache of user profiles.
+
+get_user runs on every /start, every return to the main menu and on the
+profile pages, nearly always for the same few active users. Profiles are
+kept at two levels, both as UserSnapshot tuples (plain immutable values):
+
+- per update: the session's info["users"], so one update never looks up
+  the same user twice, whatever the outcome (a missing user included);
+- across updates: user_cache, an LRU of at most USER_CACHE_SIZE profiles
+  kept for USER_CACHE_TTL seconds.
+
+The async writes that change a user (create_user, update_user,
+update_user_status, update_user_rank_score) drop the user from both levels,
+and rank_buffer drops the users whose rank points it has flushed. As in
+catalog_cache, neither a read that was in flight during an invalidation nor
+one served by the replica (which may lag behind the write) is stored. Hits,
+misses and invalidations are counted in metrics under user_cache.*.
+"""
+import os
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import NamedTuple, Optional
+from . import metrics
+from .models import User, UserStatus
+
+USER_CACHE_TTL = float(os.getenv('USER_CACHE_TTL', 300))
+USER_CACHE_SIZE = int(os.getenv('USER_CACHE_SIZE', 5000))
+
+
+class UserSnapshot(NamedTuple):
+    """Read-only copy of a User row, as returned by the cached get_user."""
+    user_id: int
+    username: Optional[str]
+    phone_number: Optional[str]
+    status: UserStatus
+    rank_score: int
+    created_at: datetime
+    updated_at: datetime
+
+    @classmethod
+    def from_user(cls, user: User) -> "UserSnapshot":
+        return cls(*(getattr(user, field) for field in cls._fields))
+
+
+def session_users(info: dict) -> dict:
+    """The per-update map user_id -> UserSnapshot (or None) kept in a session's info."""
+    return info.setdefault("users", {})
+
+
+class UserCache:
+    def __init__(self, ttl: float = USER_CACHE_TTL, max_entries: int = USER_CACHE_SIZE):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.generation = 0  # بعد از هر invalidation زیاد می‌شود
+        self._entries: OrderedDict[int, tuple[float, UserSnapshot]] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, user_id: int) -> Optional[UserSnapshot]:
+        """The cached profile of user_id, or None."""
+        entry = self._entries.get(user_id)
+        if entry is None or entry[0] < time.monotonic():
+            if entry is not None:
+                del self._entries[user_id]
+            metrics.increment("user_cache.misses")
+            return None
+        self._entries.move_to_end(user_id)
+        metrics.increment("user_cache.hits")
+        return entry[1]
+
+    def put(self, user: UserSnapshot, generation: int) -> None:
+        """Store user unless an invalidation happened since generation was read."""
+        if generation != self.generation:
+            return
+        self._entries[user.user_id] = (time.monotonic() + self.ttl, user)
+        self._entries.move_to_end(user.user_id)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, user_id: int) -> None:
+        self.generation += 1
+        metrics.increment("user_cache.invalidations")
+        self._entries.pop(user_id, None)
+
+
+# Cache shared by the whole process
+user_cache = UserCache()
+metrics.register_gauge("user_cache.entries", lambda: len(user_cache))
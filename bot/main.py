@@ -1,4 +1,9 @@
+import time
+_PROCESS_STARTED = time.perf_counter()  # پیش از import ماژول‌ها، برای اندازه‌گیری زمان راه‌اندازی
+
+import asyncio
 import logging
+import sys
 from telegram.ext import Updater, CommandHandler, CallbackQueryHandler, MessageHandler, filters , ApplicationBuilder
 import os
 from dotenv import load_dotenv
@@ -6,12 +11,18 @@ from dotenv import load_dotenv
 # ماژول‌های داخلی
 from pages.mainpage import start
 from utils.error_handlers import error_handler
+from utils.db_session import register_db_session_middleware
 from utils.callback_handlers import register_callback_handlers
 from utils.items.item_handlers import register_item_callback_handlers
 from utils.questions.question_handlers import register_questions_callback_handlers
 from pages.create_user import register_username_handlers
-from pages.search import register_search_callback_handlers
+from pages.search import register_search_callback_handlers, load_item_search_index, refresh_item_search_index
 from pages.contact_us import register_contact_us_handlers
+from pages.db_stats import register_db_stats_handlers
+from database import metrics
+from database.rank_buffer import rank_buffer
+
+_IMPORTS_DONE = time.perf_counter()
 
 
 # تنظیم لاگینگ
@@ -23,11 +34,47 @@ logger = logging.getLogger(__name__)
 # بارگذاری متغیرهای محیطی
 load_dotenv()
 TOKEN = os.getenv('BOT_TOKEN')
+# بودجه زمان راه‌اندازی (از شروع پروسه تا آماده شدن برای دریافت آپدیت‌ها)
+STARTUP_BUDGET_MS = float(os.getenv('STARTUP_BUDGET_MS', 3000))
+
+def _elapsed_ms(since: float) -> float:
+    return (time.perf_counter() - since) * 1000
+
+async def post_init(application) -> None:
+    """کارهای آغازین پس از ساخت اپلیکیشن و پیش از دریافت آپدیت‌ها"""
+    # ساخت ایندکس جستجوی inline از روی محصولات (اولین اتصال به دیتابیس)
+    index_started = time.perf_counter()
+    await load_item_search_index()
+    index_ms = _elapsed_ms(index_started)
+    # بازسازی دوره‌ای ایندکس برای محصولاتی که بیرون از این پروسه ثبت می‌شوند
+    application.bot_data["index_refresh"] = asyncio.create_task(refresh_item_search_index())
+
+    # امتیازهای رتبه در حافظه جمع و به‌صورت دوره‌ای یکجا در دیتابیس نوشته می‌شوند
+    rank_buffer.start()
+
+    startup_ms = _elapsed_ms(_PROCESS_STARTED)
+    metrics.observe("bot.startup_ms", startup_ms)
+    message = (
+        f"Startup took {startup_ms:.0f} ms (imports {(_IMPORTS_DONE - _PROCESS_STARTED) * 1000:.0f} ms, "
+        f"search index {index_ms:.0f} ms; budget {STARTUP_BUDGET_MS:.0f} ms)"
+    )
+    if startup_ms > STARTUP_BUDGET_MS:
+        logger.warning(message)
+    else:
+        logger.info(message)
+
+async def post_shutdown(application) -> None:
+    """کارهای پایانی پس از توقف اپلیکیشن"""
+    index_refresh = application.bot_data.pop("index_refresh", None)
+    if index_refresh is not None:
+        index_refresh.cancel()
+    # نوشتن امتیازهای رتبه‌ای که هنوز در حافظه مانده‌اند
+    await rank_buffer.stop()
 
 def main() -> None:
     """راه‌اندازی بات"""
     # ایجاد اپلیکیشن
-    application = ApplicationBuilder().token(TOKEN).build()
+    application = ApplicationBuilder().token(TOKEN).post_init(post_init).post_shutdown(post_shutdown).build()
 
     # ثبت هندلرها
     register_username_handlers(application)
@@ -36,9 +83,13 @@ def main() -> None:
     register_questions_callback_handlers(application)
     register_search_callback_handlers(application)
     register_contact_us_handlers(application)
+    register_db_stats_handlers(application)
     
     
     application.add_handler(CommandHandler("start", start))
+
+    # یک سشن دیتابیس برای هر آپدیت (باید بعد از ثبت همه هندلرها باشد)
+    register_db_session_middleware(application)
     
     # ثبت هندلر خطا
     application.add_error_handler(error_handler)
@@ -47,4 +98,9 @@ def main() -> None:
     application.run_polling()
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    if sys.argv[1:2] == ["migrate"]:
+        # اسکیمای دیتابیس فقط با مایگریشن‌ها ساخته و به‌روز می‌شود (نه هنگام اجرای بات)
+        from database.migrate import migrate
+        migrate()
+    else:
+        main()
\ No newline at end of file
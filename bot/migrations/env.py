@@ -0,0 +1,58 @@
+import os
+from logging.config import fileConfig
+
+from dotenv import load_dotenv
+from sqlalchemy import create_engine
+from sqlalchemy import pool
+
+from alembic import context
+
+from database.models import Base
+
+# Load environment variables
+load_dotenv()
+
+# this is the Alembic Config object, which provides
+# access to the values within the .ini file in use.
+config = context.config
+
+# Interpret the config file for Python logging.
+if config.config_file_name is not None:
+    fileConfig(config.config_file_name)
+
+target_metadata = Base.metadata
+
+# The database URL comes from the environment, like the bot itself
+DATABASE_URL = os.getenv('DATABASE_URL')
+
+
+def run_migrations_offline() -> None:
+    """Run migrations in 'offline' mode, emitting SQL to the script output."""
+    context.configure(
+        url=DATABASE_URL,
+        target_metadata=target_metadata,
+        literal_binds=True,
+        dialect_opts={"paramstyle": "named"},
+    )
+
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+def run_migrations_online() -> None:
+    """Run migrations in 'online' mode against DATABASE_URL."""
+    connectable = create_engine(DATABASE_URL, poolclass=pool.NullPool)
+
+    with connectable.connect() as connection:
+        context.configure(
+            connection=connection, target_metadata=target_metadata
+        )
+
+        with context.begin_transaction():
+            context.run_migrations()
+
+
+if context.is_offline_mode():
+    run_migrations_offline()
+else:
+    run_migrations_online()
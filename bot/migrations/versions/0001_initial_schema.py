@@ -0,0 +1,167 @@
+"""initial schema
+
+Tables as created by Base.metadata.create_all() before migrations existed.
+
+Revision ID: 0001
+Revises: 
+Create Date: 2026-10-18 08:49:09.370604
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision: str = '0001'
+down_revision: Union[str, None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('items',
+    sa.Column('item_id', sa.UUID(), nullable=False),
+    sa.Column('type', sa.Enum('DEVICE_PERMANENT', 'DEVICE_DISPOSABLE', 'LIQUID_SALT', 'LIQUID_JUICE', name='itemtype'), nullable=False),
+    sa.Column('name', sa.String(length=100), nullable=False),
+    sa.Column('description', sa.Text(), nullable=True),
+    sa.Column('average_rating', sa.Float(), nullable=False),
+    sa.Column('rating_count', sa.Integer(), nullable=False),
+    sa.Column('created_at', postgresql.TIMESTAMP(timezone=True), nullable=False),
+    sa.Column('updated_at', postgresql.TIMESTAMP(timezone=True), nullable=False),
+    sa.CheckConstraint('average_rating >= 0 AND average_rating <= 5', name='check_average_rating_range'),
+    sa.CheckConstraint('rating_count >= 0', name='check_rating_count_non_negative'),
+    sa.PrimaryKeyConstraint('item_id')
+    )
+    op.create_table('users',
+    sa.Column('user_id', sa.BigInteger(), nullable=False),
+    sa.Column('username', sa.String(length=30), nullable=True),
+    sa.Column('phone_number', sa.String(length=20), nullable=True),
+    sa.Column('status', sa.Enum('PENDING', 'VERIFIED', name='userstatus'), nullable=False),
+    sa.Column('rank_score', sa.Integer(), nullable=False),
+    sa.Column('created_at', postgresql.TIMESTAMP(timezone=True), nullable=False),
+    sa.Column('updated_at', postgresql.TIMESTAMP(timezone=True), nullable=False),
+    sa.CheckConstraint('rank_score >= 0', name='check_rank_score_non_negative'),
+    sa.PrimaryKeyConstraint('user_id')
+    )
+    op.create_table('comments',
+    sa.Column('comment_id', sa.UUID(), nullable=False),
+    sa.Column('item_id', sa.UUID(), nullable=False),
+    sa.Column('user_id', sa.BigInteger(), nullable=False),
+    sa.Column('text', sa.Text(), nullable=False),
+    sa.Column('media_url', sa.String(length=255), nullable=True),
+    sa.Column('status', sa.Enum('PENDING', 'APPROVED', 'REJECTED', name='contentstatus'), nullable=False),
+    sa.Column('created_at', postgresql.TIMESTAMP(timezone=True), nullable=False),
+    sa.Column('updated_at', postgresql.TIMESTAMP(timezone=True), nullable=False),
+    sa.ForeignKeyConstraint(['item_id'], ['items.item_id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['user_id'], ['users.user_id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('comment_id')
+    )
+    op.create_table('contact_messages',
+    sa.Column('message_id', sa.UUID(), nullable=False),
+    sa.Column('user_id', sa.BigInteger(), nullable=False),
+    sa.Column('text', sa.Text(), nullable=False),
+    sa.Column('media_url', sa.String(length=255), nullable=True),
+    sa.Column('status', sa.Enum('PENDING', 'ANSWERED', 'REJECTED', name='messagestatus'), nullable=False),
+    sa.Column('response', sa.Text(), nullable=True),
+    sa.Column('created_at', postgresql.TIMESTAMP(timezone=True), nullable=False),
+    sa.Column('updated_at', postgresql.TIMESTAMP(timezone=True), nullable=False),
+    sa.ForeignKeyConstraint(['user_id'], ['users.user_id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('message_id')
+    )
+    op.create_table('item_ratings',
+    sa.Column('rating_id', sa.UUID(), nullable=False),
+    sa.Column('user_id', sa.BigInteger(), nullable=False),
+    sa.Column('item_id', sa.UUID(), nullable=False),
+    sa.Column('score', sa.Integer(), nullable=False),
+    sa.Column('created_at', postgresql.TIMESTAMP(timezone=True), nullable=False),
+    sa.CheckConstraint('score >= 1 AND score <= 5', name='check_item_score_range'),
+    sa.ForeignKeyConstraint(['item_id'], ['items.item_id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['user_id'], ['users.user_id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('rating_id'),
+    sa.UniqueConstraint('user_id', 'item_id', name='unique_user_item_rating')
+    )
+    op.create_table('product_suggestions',
+    sa.Column('suggestion_id', sa.UUID(), nullable=False),
+    sa.Column('user_id', sa.BigInteger(), nullable=False),
+    sa.Column('name', sa.String(length=100), nullable=False),
+    sa.Column('description', sa.Text(), nullable=True),
+    sa.Column('status', sa.Enum('PENDING', 'APPROVED', 'REJECTED', name='contentstatus'), nullable=False),
+    sa.Column('created_at', postgresql.TIMESTAMP(timezone=True), nullable=False),
+    sa.Column('updated_at', postgresql.TIMESTAMP(timezone=True), nullable=False),
+    sa.ForeignKeyConstraint(['user_id'], ['users.user_id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('suggestion_id')
+    )
+    op.create_table('tech_questions',
+    sa.Column('question_id', sa.UUID(), nullable=False),
+    sa.Column('user_id', sa.BigInteger(), nullable=False),
+    sa.Column('text', sa.Text(), nullable=False),
+    sa.Column('media_url', sa.String(length=255), nullable=True),
+    sa.Column('status', sa.Enum('PENDING', 'APPROVED', 'REJECTED', name='contentstatus'), nullable=False),
+    sa.Column('average_rating', sa.Float(), nullable=False),
+    sa.Column('rating_count', sa.Integer(), nullable=False),
+    sa.Column('created_at', postgresql.TIMESTAMP(timezone=True), nullable=False),
+    sa.Column('updated_at', postgresql.TIMESTAMP(timezone=True), nullable=False),
+    sa.CheckConstraint('average_rating >= 0 AND average_rating <= 5', name='check_question_average_rating_range'),
+    sa.CheckConstraint('rating_count >= 0', name='check_question_rating_count_non_negative'),
+    sa.ForeignKeyConstraint(['user_id'], ['users.user_id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('question_id')
+    )
+    op.create_table('comment_replies',
+    sa.Column('reply_id', sa.UUID(), nullable=False),
+    sa.Column('comment_id', sa.UUID(), nullable=False),
+    sa.Column('user_id', sa.BigInteger(), nullable=False),
+    sa.Column('parent_reply_id', sa.UUID(), nullable=True),
+    sa.Column('text', sa.Text(), nullable=False),
+    sa.Column('media_url', sa.String(length=255), nullable=True),
+    sa.Column('status', sa.Enum('PENDING', 'APPROVED', 'REJECTED', name='contentstatus'), nullable=False),
+    sa.Column('created_at', postgresql.TIMESTAMP(timezone=True), nullable=False),
+    sa.Column('updated_at', postgresql.TIMESTAMP(timezone=True), nullable=False),
+    sa.ForeignKeyConstraint(['comment_id'], ['comments.comment_id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['parent_reply_id'], ['comment_replies.reply_id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['user_id'], ['users.user_id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('reply_id')
+    )
+    op.create_table('question_ratings',
+    sa.Column('rating_id', sa.UUID(), nullable=False),
+    sa.Column('user_id', sa.BigInteger(), nullable=False),
+    sa.Column('question_id', sa.UUID(), nullable=False),
+    sa.Column('score', sa.Integer(), nullable=False),
+    sa.Column('created_at', postgresql.TIMESTAMP(timezone=True), nullable=False),
+    sa.CheckConstraint('score >= 1 AND score <= 5', name='check_question_score_range'),
+    sa.ForeignKeyConstraint(['question_id'], ['tech_questions.question_id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['user_id'], ['users.user_id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('rating_id'),
+    sa.UniqueConstraint('user_id', 'question_id', name='unique_user_question_rating')
+    )
+    op.create_table('question_replies',
+    sa.Column('reply_id', sa.UUID(), nullable=False),
+    sa.Column('question_id', sa.UUID(), nullable=False),
+    sa.Column('user_id', sa.BigInteger(), nullable=False),
+    sa.Column('text', sa.Text(), nullable=False),
+    sa.Column('media_url', sa.String(length=255), nullable=True),
+    sa.Column('status', sa.Enum('PENDING', 'APPROVED', 'REJECTED', name='contentstatus'), nullable=False),
+    sa.Column('created_at', postgresql.TIMESTAMP(timezone=True), nullable=False),
+    sa.Column('updated_at', postgresql.TIMESTAMP(timezone=True), nullable=False),
+    sa.ForeignKeyConstraint(['question_id'], ['tech_questions.question_id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['user_id'], ['users.user_id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('reply_id')
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('question_replies')
+    op.drop_table('question_ratings')
+    op.drop_table('comment_replies')
+    op.drop_table('tech_questions')
+    op.drop_table('product_suggestions')
+    op.drop_table('item_ratings')
+    op.drop_table('contact_messages')
+    op.drop_table('comments')
+    op.drop_table('users')
+    op.drop_table('items')
+    for enum_name in ('contentstatus', 'messagestatus', 'userstatus', 'itemtype'):
+        sa.Enum(name=enum_name).drop(op.get_bind(), checkfirst=True)
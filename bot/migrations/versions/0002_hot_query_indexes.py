@@ -0,0 +1,52 @@
+"""hot query indexes
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-18 08:50:13.843738
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0002'
+down_revision: Union[str, None] = '0001'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index('ix_comment_replies_comment_id_status_created_at', 'comment_replies', ['comment_id', 'status', 'created_at'], unique=False, postgresql_where=sa.text('parent_reply_id IS NULL'))
+    op.create_index('ix_comment_replies_parent_reply_id_status_created_at', 'comment_replies', ['parent_reply_id', 'status', 'created_at'], unique=False)
+    op.create_index('ix_comments_item_id_status_created_at', 'comments', ['item_id', 'status', 'created_at'], unique=False)
+    op.create_index('ix_comments_user_id_created_at', 'comments', ['user_id', 'created_at'], unique=False)
+    op.create_index('ix_contact_messages_status_created_at', 'contact_messages', ['status', 'created_at'], unique=False)
+    op.create_index('ix_contact_messages_user_id_created_at', 'contact_messages', ['user_id', 'created_at'], unique=False)
+    op.create_index('ix_item_ratings_item_id', 'item_ratings', ['item_id'], unique=False)
+    op.create_index('ix_items_type_average_rating', 'items', ['type', 'average_rating'], unique=False)
+    op.create_index('ix_product_suggestions_status_created_at', 'product_suggestions', ['status', 'created_at'], unique=False)
+    op.create_index('ix_question_ratings_question_id', 'question_ratings', ['question_id'], unique=False)
+    op.create_index('ix_question_replies_question_id_status_created_at', 'question_replies', ['question_id', 'status', 'created_at'], unique=False)
+    op.create_index('ix_tech_questions_status_average_rating_created_at', 'tech_questions', ['status', 'average_rating', 'created_at'], unique=False)
+    op.create_index('ix_tech_questions_user_id_created_at', 'tech_questions', ['user_id', 'created_at'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_tech_questions_user_id_created_at', table_name='tech_questions')
+    op.drop_index('ix_tech_questions_status_average_rating_created_at', table_name='tech_questions')
+    op.drop_index('ix_question_replies_question_id_status_created_at', table_name='question_replies')
+    op.drop_index('ix_question_ratings_question_id', table_name='question_ratings')
+    op.drop_index('ix_product_suggestions_status_created_at', table_name='product_suggestions')
+    op.drop_index('ix_items_type_average_rating', table_name='items')
+    op.drop_index('ix_item_ratings_item_id', table_name='item_ratings')
+    op.drop_index('ix_contact_messages_user_id_created_at', table_name='contact_messages')
+    op.drop_index('ix_contact_messages_status_created_at', table_name='contact_messages')
+    op.drop_index('ix_comments_user_id_created_at', table_name='comments')
+    op.drop_index('ix_comments_item_id_status_created_at', table_name='comments')
+    op.drop_index('ix_comment_replies_parent_reply_id_status_created_at', table_name='comment_replies')
+    op.drop_index('ix_comment_replies_comment_id_status_created_at', table_name='comment_replies', postgresql_where=sa.text('parent_reply_id IS NULL'))
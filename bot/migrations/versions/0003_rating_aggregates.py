@@ -0,0 +1,66 @@
+"""rating aggregates
+
+Store the sum of scores and a per-star histogram next to rating_count, so a
+vote updates its target in constant time. Existing rows are backfilled from
+the rating tables.
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-18 08:51:45.567156
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0003'
+down_revision: Union[str, None] = '0002'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+AGGREGATE_COLUMNS = ['rating_sum'] + [f'rating_{star}_count' for star in range(1, 6)]
+
+# (target table, its key, rating table)
+TARGETS = [
+    ('items', 'item_id', 'item_ratings'),
+    ('tech_questions', 'question_id', 'question_ratings'),
+]
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    for table, _, _ in TARGETS:
+        for column in AGGREGATE_COLUMNS:
+            op.add_column(table, sa.Column(column, sa.Integer(), nullable=False, server_default='0'))
+
+    for table, key, rating_table in TARGETS:
+        star_counts = ",\n".join(
+            f"                count(*) FILTER (WHERE score = {star}) AS rating_{star}_count" for star in range(1, 6)
+        )
+        star_assignments = ", ".join(f"rating_{star}_count = r.rating_{star}_count" for star in range(1, 6))
+        op.execute(f"""
+            UPDATE {table} AS t
+            SET rating_sum = r.rating_sum,
+                rating_count = r.rating_count,
+                average_rating = r.rating_sum::float / r.rating_count,
+                {star_assignments}
+            FROM (
+                SELECT {key},
+                sum(score) AS rating_sum,
+                count(*) AS rating_count,
+{star_counts}
+                FROM {rating_table}
+                GROUP BY {key}
+            ) AS r
+            WHERE t.{key} = r.{key}
+        """)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    for table, _, _ in TARGETS:
+        for column in reversed(AGGREGATE_COLUMNS):
+            op.drop_column(table, column)
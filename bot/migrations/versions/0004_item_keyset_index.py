@@ -0,0 +1,34 @@
+"""item keyset index
+
+Item lists are paged with a keyset on (average_rating, item_id), so the
+category index gets item_id as a tie-breaker column and replaces the
+(type, average_rating) index.
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-18 10:12:31.402117
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0004'
+down_revision: Union[str, None] = '0003'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index('ix_items_type_average_rating_item_id', 'items', ['type', 'average_rating', 'item_id'], unique=False)
+    op.drop_index('ix_items_type_average_rating', table_name='items')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.create_index('ix_items_type_average_rating', 'items', ['type', 'average_rating'], unique=False)
+    op.drop_index('ix_items_type_average_rating_item_id', table_name='items')
@@ -0,0 +1,34 @@
+"""item trigram search
+
+Enable pg_trgm and index items.name and items.description with trigram GIN
+indexes, so substring and similarity search does not read the whole table.
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-18 10:41:07.226391
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0005'
+down_revision: Union[str, None] = '0004'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    op.create_index('ix_items_name_trgm', 'items', ['name'], unique=False, postgresql_using='gin', postgresql_ops={'name': 'gin_trgm_ops'})
+    op.create_index('ix_items_description_trgm', 'items', ['description'], unique=False, postgresql_using='gin', postgresql_ops={'description': 'gin_trgm_ops'})
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_items_description_trgm', table_name='items', postgresql_using='gin', postgresql_ops={'description': 'gin_trgm_ops'})
+    op.drop_index('ix_items_name_trgm', table_name='items', postgresql_using='gin', postgresql_ops={'name': 'gin_trgm_ops'})
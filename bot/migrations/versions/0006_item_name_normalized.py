@@ -0,0 +1,58 @@
+"""item name normalized
+
+Add items.name_normalized, the Persian-normalized search key of the name,
+fill it for existing rows and index it: a btree for exact lookups and a
+trigram GIN index that replaces the one on the raw name.
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-18 11:06:52.918204
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from database.normalization import normalize_name
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0006'
+down_revision: Union[str, None] = '0005'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+items = sa.table(
+    'items',
+    sa.column('item_id', sa.UUID()),
+    sa.column('name', sa.String()),
+    sa.column('name_normalized', sa.String()),
+)
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('items', sa.Column('name_normalized', sa.String(length=100), nullable=True))
+
+    # نرمال‌سازی در پایتون انجام می‌شود تا با create_item یکسان باشد
+    connection = op.get_bind()
+    rows = connection.execute(sa.select(items.c.item_id, items.c.name)).all()
+    if rows:
+        connection.execute(
+            items.update().where(items.c.item_id == sa.bindparam('key')).values(name_normalized=sa.bindparam('normalized')),
+            [{'key': item_id, 'normalized': normalize_name(name)} for item_id, name in rows],
+        )
+
+    op.alter_column('items', 'name_normalized', existing_type=sa.String(length=100), nullable=False)
+    op.create_index('ix_items_name_normalized', 'items', ['name_normalized'], unique=False)
+    op.create_index('ix_items_name_normalized_trgm', 'items', ['name_normalized'], unique=False, postgresql_using='gin', postgresql_ops={'name_normalized': 'gin_trgm_ops'})
+    op.drop_index('ix_items_name_trgm', table_name='items', postgresql_using='gin', postgresql_ops={'name': 'gin_trgm_ops'})
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.create_index('ix_items_name_trgm', 'items', ['name'], unique=False, postgresql_using='gin', postgresql_ops={'name': 'gin_trgm_ops'})
+    op.drop_index('ix_items_name_normalized_trgm', table_name='items', postgresql_using='gin', postgresql_ops={'name_normalized': 'gin_trgm_ops'})
+    op.drop_index('ix_items_name_normalized', table_name='items')
+    op.drop_column('items', 'name_normalized')
@@ -0,0 +1,52 @@
+"""full text search
+
+Add a generated search_vector tsvector column with a GIN index to items,
+tech_questions, question_replies and comments. Postgres fills it for
+existing rows and keeps it current on every write.
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-18 11:47:20.610385
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+from database.normalization import sql_normalize
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0007'
+down_revision: Union[str, None] = '0006'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# (table, text expression)
+SEARCHABLE = [
+    ('items', "(name || ' ' || coalesce(description, ''))"),
+    ('tech_questions', 'text'),
+    ('question_replies', 'text'),
+    ('comments', 'text'),
+]
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    for table, expression in SEARCHABLE:
+        op.add_column(table, sa.Column(
+            'search_vector',
+            postgresql.TSVECTOR(),
+            sa.Computed(f"to_tsvector('simple'::regconfig, {sql_normalize(expression)})", persisted=True),
+            nullable=True,
+        ))
+        op.create_index(f'ix_{table}_search_vector', table, ['search_vector'], unique=False, postgresql_using='gin')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    for table, _ in reversed(SEARCHABLE):
+        op.drop_index(f'ix_{table}_search_vector', table_name=table, postgresql_using='gin')
+        op.drop_column(table, 'search_vector')
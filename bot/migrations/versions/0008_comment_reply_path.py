@@ -0,0 +1,54 @@
+"""comment reply path
+
+Store a materialized path and depth on comment_replies so a reply's subtree
+and ancestors can be read with one indexed query. The path of a reply is the
+hex id of every ancestor and of the reply itself, each followed by "/".
+Existing threads are filled with a recursive query.
+
+Revision ID: 0008
+Revises: 0007
+Create Date: 2026-10-18 12:31:44.170952
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0008'
+down_revision: Union[str, None] = '0007'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('comment_replies', sa.Column('path', sa.Text(), nullable=True))
+    op.add_column('comment_replies', sa.Column('depth', sa.Integer(), nullable=True))
+    op.execute("""
+        WITH RECURSIVE tree AS (
+            SELECT reply_id, replace(reply_id::text, '-', '') || '/' AS path, 0 AS depth
+            FROM comment_replies
+            WHERE parent_reply_id IS NULL
+            UNION ALL
+            SELECT child.reply_id, tree.path || replace(child.reply_id::text, '-', '') || '/', tree.depth + 1
+            FROM comment_replies AS child
+            JOIN tree ON child.parent_reply_id = tree.reply_id
+        )
+        UPDATE comment_replies
+        SET path = tree.path, depth = tree.depth
+        FROM tree
+        WHERE comment_replies.reply_id = tree.reply_id
+    """)
+    op.alter_column('comment_replies', 'path', existing_type=sa.Text(), nullable=False)
+    op.alter_column('comment_replies', 'depth', existing_type=sa.Integer(), nullable=False)
+    op.create_index('ix_comment_replies_path', 'comment_replies', ['path'], unique=False, postgresql_ops={'path': 'text_pattern_ops'})
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_comment_replies_path', table_name='comment_replies', postgresql_ops={'path': 'text_pattern_ops'})
+    op.drop_column('comment_replies', 'depth')
+    op.drop_column('comment_replies', 'path')
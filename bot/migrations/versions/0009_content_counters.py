@@ -0,0 +1,55 @@
+"""content counters
+
+Add denormalized counters of approved children: items.comment_count,
+comments.reply_count (direct replies), comment_replies.reply_count
+(direct sub-replies) and tech_questions.reply_count. They are filled from
+the existing rows here and kept current by the write operations.
+
+Revision ID: 0009
+Revises: 0008
+Create Date: 2026-10-18 13:05:12.402117
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0009'
+down_revision: Union[str, None] = '0008'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# (table, counter column, key column, children table, children key column, extra condition on children)
+COUNTERS = [
+    ('items', 'comment_count', 'item_id', 'comments', 'item_id', ''),
+    ('comments', 'reply_count', 'comment_id', 'comment_replies', 'comment_id', 'AND children.parent_reply_id IS NULL'),
+    ('comment_replies', 'reply_count', 'reply_id', 'comment_replies', 'parent_reply_id', ''),
+    ('tech_questions', 'reply_count', 'question_id', 'question_replies', 'question_id', ''),
+]
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    for table, column, key, children, children_key, condition in COUNTERS:
+        op.add_column(table, sa.Column(column, sa.Integer(), server_default='0', nullable=False))
+        op.execute(f"""
+            UPDATE {table}
+            SET {column} = counts.total
+            FROM (
+                SELECT children.{children_key} AS key, count(*) AS total
+                FROM {children} AS children
+                WHERE children.status = 'APPROVED' {condition}
+                GROUP BY children.{children_key}
+            ) AS counts
+            WHERE {table}.{key} = counts.key
+        """)
+        op.alter_column(table, column, server_default=None)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    for table, column, *_ in reversed(COUNTERS):
+        op.drop_column(table, column)
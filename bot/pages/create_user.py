@@ -1,8 +1,8 @@
 import logging
 from telegram import Update, InlineKeyboardMarkup, InlineKeyboardButton
 from telegram.ext import ContextTypes, ConversationHandler, CallbackQueryHandler, MessageHandler, filters, CommandHandler
-from database.db_handler import get_db
-from database.db_operations import create_user, get_user, update_user
+from database.db_handler import get_async_db
+from database.async_db_operations import create_user, get_user, update_user
 from utils.buttons import create_username_buttons
 # Define conversation states
 USERNAME = range(1)
@@ -15,17 +15,18 @@ logger = logging.getLogger(__name__)
 
 async def check_and_create_user(update: Update, context: ContextTypes.DEFAULT_TYPE) -> bool:
     """Check if user exists in database and create if not. Returns True if successful."""
-    db = next(get_db())
     user_id = update.effective_user.id
-    user = get_user(db, user_id)
+    async with get_async_db() as db:
+        user = await get_user(db, user_id)
     
     # If user doesn't exist, create new user
     if not user:
         try:
-            create_user(
-                db,
-                user_id=user_id,
-            )
+            async with get_async_db() as db:
+                await create_user(
+                    db,
+                    user_id=user_id,
+                )
             logger.info(f"Created new user: {user_id}")
             await start_username_form(update, context)
             return True
@@ -41,8 +42,8 @@ async def username_section(update: Update, context: ContextTypes.DEFAULT_TYPE) -
     await query.answer()
 
     # Get user data from database
-    db = next(get_db())
-    user = get_user(db, update.effective_user.id)
+    async with get_async_db() as db:
+        user = await get_user(db, update.effective_user.id)
 
     # Format user rank score if available
     # Format user information with proper formatting
@@ -65,9 +66,9 @@ async def username_section(update: Update, context: ContextTypes.DEFAULT_TYPE) -
 async def start_username_form(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """Start the username form conversation."""
     # Check if user already has a username
-    db = next(get_db())
     user_id = update.effective_user.id
-    user = get_user(db, user_id)
+    async with get_async_db() as db:
+        user = await get_user(db, user_id)
     
     if user and user.username:
         await context.bot.send_message(
@@ -120,9 +121,9 @@ async def process_username(update: Update, context: ContextTypes.DEFAULT_TYPE) -
     
     # Save username to database
     try:
-        db = next(get_db())
         user_id = update.effective_user.id
-        update_user(db, user_id, username=username)
+        async with get_async_db() as db:
+            await update_user(db, user_id, username=username)
         
         await update.message.reply_text(
             f"نام کاربری شما با موفقیت به '{username}' تغییر یافت.",
@@ -163,8 +164,8 @@ async def user_score(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None
     await query.answer()
 
     # Get user data from database
-    db = next(get_db())
-    user = get_user(db, update.effective_user.id)
+    async with get_async_db() as db:
+        user = await get_user(db, update.effective_user.id)
 
     # Format user rank score if available
     rank_display = f"\n🏆 امتیاز رتبه: {user.rank_score}" if user and hasattr(user, 'rank_score') else ""
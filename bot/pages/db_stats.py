@@ -0,0 +1,21 @@
+from telegram import Update
+from telegram.ext import Application, CommandHandler, ContextTypes
+from config import ADMIN_IDS
+from database import metrics
+
+async def db_stats_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Show database pool and session metrics to admins."""
+    if update.effective_user.id not in ADMIN_IDS:
+        return
+
+    values = metrics.snapshot()
+    if not values:
+        await update.message.reply_text("هنوز آماری ثبت نشده است.")
+        return
+
+    lines = [f"{name}: {value}" for name, value in sorted(values.items())]
+    await update.message.reply_text("📊 آمار دیتابیس:\n\n" + "\n".join(lines))
+
+def register_db_stats_handlers(application: Application) -> None:
+    """Register database metrics handlers."""
+    application.add_handler(CommandHandler("dbstats", db_stats_command))
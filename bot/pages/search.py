@@ -1,12 +1,15 @@
-from telegram import Update, InlineKeyboardMarkup, InlineKeyboardButton
-from telegram.ext import Application, CallbackContext, ConversationHandler, CallbackQueryHandler, MessageHandler , filters
+from telegram import Update, InlineKeyboardMarkup, InlineKeyboardButton, InlineQueryResultArticle, InputTextMessageContent
+from telegram.ext import Application, CallbackContext, ConversationHandler, CallbackQueryHandler, MessageHandler , InlineQueryHandler, filters
 from typing import Dict, Any, List, Optional, Tuple
 from uuid import UUID
+import asyncio
 import logging
-from database.db_handler import get_db
-from database.db_operations import (
-    get_items_by_type,get_items
+import os
+from database.db_handler import get_async_db
+from database.async_db_operations import (
+    get_items_by_type,get_items,get_items_uncached,search_items,search_content
 )
+from database.search_index import item_index
 from database.models import (
     ItemType,ContentStatus,ItemType
                              )
@@ -19,66 +22,119 @@ from utils.buttons import (
 from utils.callback_handlers import (
     cancel_callback
 )
+from utils.items.item_handlers import CATEGORY_ITEM_TYPES
 SEARCH = range(1)
+SEARCH_RESULTS_LIMIT = 10  # حداکثر تعداد نتایج جستجو
+SEARCH_PAGE_SIZE = 5  # تعداد نتایج جستجوی متنی در هر صفحه
+SNIPPET_LENGTH = 60  # طول خلاصه متن هر نتیجه
+INLINE_RESULTS_LIMIT = 20  # حداکثر تعداد نتایج حالت inline
+INLINE_CACHE_TIME = 60  # مدت نگهداری نتایج inline در سرور تلگرام (ثانیه)
+# فاصله بازسازی ایندکس inline (ثانیه)؛ محصولات import_items و پروسه‌های دیگر بات را هم شامل می‌شود
+ITEM_INDEX_REFRESH_INTERVAL = float(os.getenv('ITEM_INDEX_REFRESH_INTERVAL', 300))
+
+# عنوان نمایشی هر نوع محصول
+ITEM_TYPE_TITLES = {item_type: title for item_type, title in CATEGORY_ITEM_TYPES.values()}
+
+async def load_item_search_index() -> None:
+    """Fill the inline search index with every item, read from the database rather than catalog_cache."""
+    async with get_async_db() as db:
+        items = await get_items_uncached(db)
+    item_index.rebuild(items)
+    logging.info(f"Inline search index built with {len(item_index)} items")
+
+async def refresh_item_search_index() -> None:
+    """
+    Rebuild the inline search index every ITEM_INDEX_REFRESH_INTERVAL seconds.
+
+    The bot's own item writes update the index as they happen, but items
+    written elsewhere (import_items, another bot process) only show up here.
+    Started from post_init after the first load; runs until cancelled.
+    """
+    while True:
+        await asyncio.sleep(ITEM_INDEX_REFRESH_INTERVAL)
+        try:
+            await load_item_search_index()
+        except Exception:
+            logging.exception("Rebuilding the inline search index failed; keeping the current one")
+
+# برچسب و دکمه هر نوع نتیجه جستجوی متنی
+RESULT_LABELS = {
+    "item": "📦 محصول",
+    "question": "❓ سوال فنی",
+    "question_reply": "💡 پاسخ سوال",
+    "comment": "💬 نظر",
+}
+
+def _result_callback_data(result) -> str:
+    """Where a full-text result leads: the item page for items and comments, the question for questions and answers."""
+    if result.kind in ("item", "comment"):
+        return f"item_{result.item_type.value}_{result.item_id}"
+    return f"question_{result.question_id}"
+
+def create_search_results_page(results, total: int, offset: int) -> Tuple[str, InlineKeyboardMarkup]:
+    """Message text and buttons for one page of full-text search results."""
+    lines = [f"🔍 نتایج جستجو ({offset + 1} تا {offset + len(results)} از {total}):\n"]
+    keyboard = []
+    for number, result in enumerate(results, start=offset + 1):
+        snippet = " ".join(result.text.split())
+        if len(snippet) > SNIPPET_LENGTH:
+            snippet = snippet[:SNIPPET_LENGTH] + "…"
+        lines.append(f"{number}. {RESULT_LABELS[result.kind]}: {snippet}")
+        keyboard.append([InlineKeyboardButton(f"{number}. {RESULT_LABELS[result.kind]}", callback_data=_result_callback_data(result))])
+
+    pagination = []
+    if offset > 0:
+        pagination.append(InlineKeyboardButton("◀️ قبلی", callback_data=f"search_page_{max(offset - SEARCH_PAGE_SIZE, 0)}"))
+    if offset + len(results) < total:
+        pagination.append(InlineKeyboardButton("بعدی ▶️", callback_data=f"search_page_{offset + SEARCH_PAGE_SIZE}"))
+    if pagination:
+        keyboard.append(pagination)
+    keyboard.append([InlineKeyboardButton("🔙 بازگشت به منوی اصلی", callback_data="main_menu")])
+    return "\n".join(lines), InlineKeyboardMarkup(keyboard)
 
 # Search callback handler - start conversation
 async def search_callback(update: Update, context: CallbackContext) -> int:
-    """Start conversation for product search."""
+    """Start conversation for search."""
     query = update.callback_query
     await query.answer()
     
     await query.edit_message_text(
-        "لطفاً نام محصول مورد نظر خود را وارد کنید:",
+        "لطفاً نام محصول یا موضوع مورد نظر خود را وارد کنید:",
         reply_markup=create_cancel_button()
     )
     
     return SEARCH
-# Search message handler - search for products
+# Search message handler - search products, questions, answers and comments
 async def search_message(update: Update, context: CallbackContext) -> int:
-    """Search for products based on user input."""
+    """Search for content based on user input."""
     query = update.message.text
-    db = next(get_db())
-    items = get_items(db)
+    context.user_data["search_query"] = query
+    items = []
+    async with get_async_db() as db:
+        results, total = await search_content(db, query, offset=0, limit=SEARCH_PAGE_SIZE)
+        if not results:
+            # بدون نتیجه متنی: جستجوی تقریبی نام محصولات (برای غلط تایپی)
+            items = await search_items(db, query, limit=SEARCH_RESULTS_LIMIT)
 
-    if not items:
-        await update.message.reply_text("متاسفانه محصولی با این نام یافت نشد.")
+    if results:
+        text, reply_markup = create_search_results_page(results, total, 0)
+        await update.message.reply_text(text, reply_markup=reply_markup)
         return ConversationHandler.END
 
-    # Create keyboard layout with found items
-    keyboard = []
-    
-    # Convert the SQLAlchemy result to a list of items
-    items_dict = [
-        {
-            "item_id": str(item.item_id),
-            "name": item.name,
-            "type": ItemType(item.type),
-        } for item in items
-    ]
-    logging.info(f"Items: {str(items_dict)}")
-    for item in items_dict:
-        logging.info(f"Item: {str(item)}")
-        # Search for items containing the query in their name
-        if query.lower() in item["name"].lower():
-            type = item["type"].value
-            item_id = item["item_id"]
-            keyboard.append([
-                InlineKeyboardButton(
-                    f"{item['name']}",
-                    callback_data=f"item_{type}_{item_id}"
-                ),
-            ])
-    logging.info(f"Keyboard: {str(keyboard)}")
     # If no items were found, send a message and end the conversation
-    if not keyboard:
+    if not items:
         await update.message.reply_text("متاسفانه محصولی با این نام یافت نشد.")
         return ConversationHandler.END
-    
-    await context.bot.send_message(
-        text = "لطفاً محصول مورد نظر خود را از لیست زیر انتخاب کنید:",
-        chat_id=update.effective_chat.id,
-        reply_markup=InlineKeyboardMarkup(keyboard)
-    )
+
+    # Create keyboard layout with found items, most relevant first
+    keyboard = [
+        [
+            InlineKeyboardButton(
+                f"{item.name}",
+                callback_data=f"item_{ItemType(item.type).value}_{item.item_id}"
+            ),
+        ] for item in items
+    ]
     # Add a back button to the keyboard
     keyboard.append([
         InlineKeyboardButton(
@@ -86,8 +142,60 @@ async def search_message(update: Update, context: CallbackContext) -> int:
             callback_data="main_menu"
         )
     ])
+    
+    await context.bot.send_message(
+        text = "لطفاً محصول مورد نظر خود را از لیست زیر انتخاب کنید:",
+        chat_id=update.effective_chat.id,
+        reply_markup=InlineKeyboardMarkup(keyboard)
+    )
     return ConversationHandler.END
 
+# Search page callback handler - other pages of full-text results
+async def search_page_callback(update: Update, context: CallbackContext) -> None:
+    """Show another page of the last full-text search."""
+    query = update.callback_query
+    await query.answer()
+
+    search_query = context.user_data.get("search_query")
+    if search_query is None:
+        await query.edit_message_text(
+            "این جستجو منقضی شده است. لطفاً دوباره جستجو کنید.",
+            reply_markup=create_main_menu_buttons()
+        )
+        return
+
+    offset = max(int(query.data[len("search_page_"):]), 0)
+    async with get_async_db() as db:
+        results, total = await search_content(db, search_query, offset=offset, limit=SEARCH_PAGE_SIZE)
+
+    if not results:
+        await query.edit_message_text(
+            "نتیجه دیگری یافت نشد.",
+            reply_markup=create_main_menu_buttons()
+        )
+        return
+
+    text, reply_markup = create_search_results_page(results, total, offset)
+    await query.edit_message_text(text, reply_markup=reply_markup)
+
+# Inline query handler - product cards while the user types @bot <name>
+async def inline_search(update: Update, context: CallbackContext) -> None:
+    """Answer an inline query from the in-memory item index."""
+    results = []
+    for item in item_index.search(update.inline_query.query, limit=INLINE_RESULTS_LIMIT):
+        title = ITEM_TYPE_TITLES.get(item.type, "")
+        stars = "★" * int(item.average_rating) + "☆" * (5 - int(item.average_rating))
+        card = f"📦 {item.name}\n🏷️ {title}\n⭐ امتیاز: {stars} ({item.average_rating:.1f})"
+        if item.description:
+            card += f"\n\n{item.description}"
+        results.append(InlineQueryResultArticle(
+            id=str(item.item_id),
+            title=item.name,
+            description=f"{title} - {stars}",
+            input_message_content=InputTextMessageContent(card)
+        ))
+    await update.inline_query.answer(results, cache_time=INLINE_CACHE_TIME)
+
 # Search cancel callback handler - cancel conversation
 async def search_cancel_callback(update: Update, context: CallbackContext) -> int:
     """Cancel current conversation and return to main menu."""
@@ -116,5 +224,7 @@ def register_search_callback_handlers(application: Application) -> None:
         per_message=False
     )
     application.add_handler(search_conv_handler)
+    application.add_handler(CallbackQueryHandler(search_page_callback, pattern=r"^search_page_\d+$"))
+    application.add_handler(InlineQueryHandler(inline_search))
     
 
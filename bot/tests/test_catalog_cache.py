@@ -0,0 +1,109 @@
+"""
+catalog_cache and the cached catalog reads of async_db_operations.
+
+The reads are driven with a stand-in session and operation, so these tests
+need no database.
+"""
+import asyncio
+import uuid
+from datetime import datetime
+from types import SimpleNamespace
+import pytest
+from database import async_db_operations
+from database.catalog_cache import LISTS_TAG, CatalogCache, ItemSnapshot, catalog_cache, item_tag, type_tag
+from database.models import ItemType
+
+
+def _item(name="item", item_type=ItemType.LIQUID_SALT) -> ItemSnapshot:
+    now = datetime(2024, 1, 1)
+    return ItemSnapshot(uuid.uuid4(), item_type, name, name, None, 4.0, 1, 4, 0, 0, 0, 1, 0, 0, now, now)
+
+
+class _Session:
+    """Just enough of an AsyncSession for the cached reads."""
+
+    def __init__(self, primary: bool):
+        self.sync_session = SimpleNamespace(reads_from_primary=lambda: primary)
+
+
+@pytest.fixture(autouse=True)
+def empty_cache():
+    catalog_cache.clear()
+    yield
+    catalog_cache.clear()
+
+
+def test_put_and_get_return_copies():
+    cache = CatalogCache()
+    items = [_item()]
+    cache.put("key", items, {LISTS_TAG}, cache.generation)
+    hit, cached = cache.get("key")
+    assert hit and cached == items
+    cached.clear()
+    assert cache.get("key")[1] == items
+
+
+def test_read_overtaken_by_an_invalidation_is_not_stored():
+    cache = CatalogCache()
+    generation = cache.generation
+    cache.invalidate(LISTS_TAG)
+    cache.put("key", [_item()], {LISTS_TAG}, generation)
+    assert cache.get("key") == (False, None)
+
+
+def test_invalidate_item_drops_the_item_and_its_lists():
+    cache = CatalogCache()
+    item = _item()
+    cache.put("item", item, {item_tag(item.item_id)}, cache.generation)
+    cache.put("salts", [item], {LISTS_TAG, type_tag(ItemType.LIQUID_SALT)}, cache.generation)
+    cache.put("juices", [], {LISTS_TAG, type_tag(ItemType.LIQUID_JUICE)}, cache.generation)
+    cache.invalidate_item(item.item_id, ItemType.LIQUID_SALT)
+    assert not cache.get("item")[0]
+    assert not cache.get("salts")[0]
+    assert cache.get("juices")[0]
+
+
+def test_expired_and_evicted_entries_miss():
+    expired = CatalogCache(ttl=-1)
+    expired.put("key", 1, (), expired.generation)
+    assert expired.get("key") == (False, None)
+
+    small = CatalogCache(max_entries=2)
+    for key in ("a", "b", "c"):
+        small.put(key, key, (), small.generation)
+    assert [small.get(key)[0] for key in ("a", "b", "c")] == [False, True, True]
+
+
+def _read(calls: list, during=None):
+    """A cached catalog read that records its calls and runs during() while 'in flight'."""
+    async def get_items(db):
+        calls.append(db)
+        if during is not None:
+            during()
+        return [_item()]
+    return async_db_operations._cached_catalog_read(get_items, lambda arguments: {LISTS_TAG})
+
+
+def test_primary_read_is_cached():
+    calls = []
+    read = _read(calls)
+    first = asyncio.run(read(_Session(primary=True)))
+    second = asyncio.run(read(_Session(primary=False)))
+    assert len(calls) == 1
+    assert first == second
+
+
+def test_replica_read_is_never_cached():
+    calls = []
+    read = _read(calls)
+    asyncio.run(read(_Session(primary=False)))
+    asyncio.run(read(_Session(primary=False)))
+    assert len(calls) == 2
+    assert len(catalog_cache) == 0
+
+
+def test_read_in_flight_during_an_invalidation_is_not_cached():
+    calls = []
+    read = _read(calls, during=lambda: catalog_cache.invalidate(LISTS_TAG))
+    asyncio.run(read(_Session(primary=True)))
+    assert len(catalog_cache) == 0
@@ -0,0 +1,208 @@
+"""
+Every query issued by db_operations must be served by the index meant for it.
+
+Each operation is run with sequential scans disabled, and every SELECT/UPDATE
+it sends is passed to EXPLAIN. The plan must not contain a Seq Scan on one of
+our tables and must use each index listed for the operation in
+EXPECTED_INDEXES; any other usable index (say, one on a different column of
+the same table) does not count.
+
+Which index the planner picks depends on table sizes: on a handful of rows
+a composite btree filtered on status is as cheap as any other index. So the
+module first loads SEED_ROWS rows of synthetic content and ANALYZEs the
+tables, inside a savepoint that is rolled back after the module.
+"""
+import uuid
+from types import SimpleNamespace
+import pytest
+from sqlalchemy import text
+from database import db_operations as ops
+from database.models import Base, ContentStatus, ItemType, MessageStatus
+
+pytestmark = pytest.mark.postgres
+
+APP_TABLES = set(Base.metadata.tables)
+
+# Operations that read a whole table on purpose
+FULL_SCAN_ALLOWED = {
+    "get_items",     # لیست کامل محصولات (بدون فیلتر)
+}
+
+EXPLAINED = ("SELECT", "UPDATE", "DELETE", "WITH")
+
+SEED_ROWS = 5000
+# Synthetic content, none of it matching the rows or queries of the tests
+_SEED = [
+    """INSERT INTO users (user_id, status, rank_score, created_at, updated_at)
+       SELECT -1000 - g, 'VERIFIED', g % 100, now(), now() FROM generate_series(1, :rows) g""",
+    """INSERT INTO items (item_id, type, name, name_normalized, average_rating, rating_count, rating_sum,
+                          rating_1_count, rating_2_count, rating_3_count, rating_4_count, rating_5_count,
+                          comment_count, created_at, updated_at)
+       SELECT gen_random_uuid(), (ARRAY['DEVICE_PERMANENT', 'DEVICE_DISPOSABLE', 'LIQUID_SALT', 'LIQUID_JUICE'])[1 + g % 4]::itemtype,
+              'seed ' || g, 'seed ' || g, g % 5, 0, 0, 0, 0, 0, 0, 0, 0, now(), now()
+       FROM generate_series(1, :rows) g""",
+    """INSERT INTO comments (comment_id, item_id, user_id, text, status, reply_count, created_at, updated_at)
+       SELECT gen_random_uuid(), item_id, -1000 - (row_number() OVER () % :rows) - 1, 'seed', 'APPROVED', 1,
+              now() - random() * interval '365 days', now()
+       FROM items, generate_series(1, 4) WHERE items.name LIKE 'seed %'""",
+    """INSERT INTO comment_replies (reply_id, comment_id, user_id, path, depth, text, status, reply_count, created_at, updated_at)
+       SELECT reply_id, comment_id, user_id, replace(reply_id::text, '-', '') || '/', 0, 'seed', 'APPROVED', 0, created_at, now()
+       FROM (SELECT gen_random_uuid() AS reply_id, comment_id, user_id, created_at FROM comments WHERE text = 'seed') replies""",
+    """INSERT INTO tech_questions (question_id, user_id, text, status, average_rating, rating_count, rating_sum,
+                                   rating_1_count, rating_2_count, rating_3_count, rating_4_count, rating_5_count,
+                                   reply_count, created_at, updated_at)
+       SELECT gen_random_uuid(), -1000 - g, 'seed', 'APPROVED', g % 5, 0, 0, 0, 0, 0, 0, 0, 4,
+              now() - random() * interval '365 days', now()
+       FROM generate_series(1, :rows) g""",
+    """INSERT INTO question_replies (reply_id, question_id, user_id, text, status, created_at, updated_at)
+       SELECT gen_random_uuid(), question_id, user_id, 'seed', 'APPROVED', created_at, now()
+       FROM tech_questions, generate_series(1, 4) WHERE text = 'seed'""",
+    """INSERT INTO product_suggestions (suggestion_id, user_id, name, status, created_at, updated_at)
+       SELECT gen_random_uuid(), -1000 - g, 'seed', 'APPROVED', now() - random() * interval '365 days', now()
+       FROM generate_series(1, :rows) g""",
+    """INSERT INTO contact_messages (message_id, user_id, text, status, created_at, updated_at)
+       SELECT gen_random_uuid(), -1000 - g, 'seed', 'ANSWERED', now() - random() * interval '365 days', now()
+       FROM generate_series(1, :rows) g""",
+]
+
+
+@pytest.fixture(scope="module", autouse=True)
+def realistic_volume(pg_database):
+    savepoint = pg_database.begin_nested()
+    for statement in _SEED:
+        pg_database.execute(text(statement), {"rows": SEED_ROWS})
+    pg_database.execute(text("ANALYZE " + ", ".join(sorted(APP_TABLES))))
+    yield
+    savepoint.rollback()
+
+
+def _run(name: str, db, rows):
+    """Run the db_operations call called name."""
+    return {
+        "get_user": lambda: ops.get_user(db, rows.user.user_id),
+        "update_user_status": lambda: ops.update_user_status(db, rows.user.user_id, rows.user.status),
+        "update_user_rank_score": lambda: ops.update_user_rank_score(db, rows.user.user_id, 1),
+        "update_user": lambda: ops.update_user(db, rows.user.user_id, username="index_check"),
+        "add_rank_scores": lambda: ops.add_rank_scores(db, {rows.user.user_id: 1, -2: 1}),
+        "get_items_by_type": lambda: ops.get_items_by_type(db, ItemType.DEVICE_PERMANENT),
+        "get_item_page": lambda: ops.get_item_page(db, ItemType.DEVICE_PERMANENT),
+        "get_item_page[after]": lambda: ops.get_item_page(db, ItemType.DEVICE_PERMANENT, (rows.item.average_rating, rows.item.item_id)),
+        "get_item_page[before]": lambda: ops.get_item_page(db, ItemType.DEVICE_PERMANENT, (rows.item.average_rating, rows.item.item_id), backward=True),
+        "search_items": lambda: ops.search_items(db, "index"),
+        "update_item": lambda: ops.update_item(db, rows.item.item_id, description="index check"),
+        "get_item": lambda: ops.get_item(db, rows.item.item_id),
+        "get_items": lambda: ops.get_items(db),
+        "get_comments_by_item": lambda: ops.get_comments_by_item(db, rows.item.item_id),
+        "get_comment_page": lambda: ops.get_comment_page(db, rows.item.item_id),
+        "get_comment_replies": lambda: ops.get_comment_replies(db, rows.comment.comment_id),
+        "get_reply_replies": lambda: ops.get_reply_replies(db, rows.reply.reply_id),
+        "count_direct_replies_to_comment": lambda: ops.count_direct_replies_to_comment(db, rows.comment.comment_id),
+        "count_sub_replies": lambda: ops.count_sub_replies(db, rows.reply.reply_id),
+        "get_reply_page[comment]": lambda: ops.get_reply_page(db, comment_id=rows.comment.comment_id),
+        "get_reply_page[reply]": lambda: ops.get_reply_page(db, parent_reply_id=rows.reply.reply_id),
+        "get_reply_tree_info": lambda: ops.get_reply_tree_info(db, [rows.reply.reply_id]),
+        "get_reply_subtree": lambda: ops.get_reply_subtree(db, rows.reply.reply_id),
+        "get_reply_ancestors": lambda: ops.get_reply_ancestors(db, rows.reply.reply_id),
+        "get_top_tech_questions": lambda: ops.get_top_tech_questions(db),
+        "get_tech_question": lambda: ops.get_tech_question(db, rows.question.question_id),
+        "get_question_replies": lambda: ops.get_question_replies(db, rows.question.question_id),
+        "get_question_reply_page": lambda: ops.get_question_reply_page(db, rows.question.question_id),
+        "create_item_rating": lambda: ops.create_item_rating(db, rows.user.user_id, rows.item.item_id, 5),
+        "create_question_rating": lambda: ops.create_question_rating(db, rows.user.user_id, rows.question.question_id, 5),
+        "get_product_suggestions": lambda: ops.get_product_suggestions(db),
+        "get_contact_messages": lambda: ops.get_contact_messages(db),
+        "update_message_status": lambda: ops.update_message_status(db, uuid.uuid4(), MessageStatus.ANSWERED),
+        "update_content_status": lambda: ops.update_content_status(db, "comment", rows.comment.comment_id, ContentStatus.APPROVED),
+        "search_content": lambda: ops.search_content(db, "index check"),
+        "check_daily_limit[comment]": lambda: ops.check_daily_limit(db, rows.user.user_id, "comment"),
+        "check_daily_limit[question]": lambda: ops.check_daily_limit(db, rows.user.user_id, "question"),
+        "check_daily_limit[message]": lambda: ops.check_daily_limit(db, rows.user.user_id, "message"),
+    }[name]()
+
+
+# Indexes each operation's plans must use
+EXPECTED_INDEXES = {
+    "get_user": {"users_pkey"},
+    "update_user_status": {"users_pkey"},
+    "update_user_rank_score": {"users_pkey"},
+    "update_user": {"users_pkey"},
+    "add_rank_scores": {"users_pkey"},
+    "get_items_by_type": {"ix_items_type_average_rating_item_id"},
+    "get_item_page": {"ix_items_type_average_rating_item_id"},
+    "get_item_page[after]": {"ix_items_type_average_rating_item_id"},
+    "get_item_page[before]": {"ix_items_type_average_rating_item_id"},
+    "search_items": {"ix_items_name_normalized_trgm", "ix_items_description_trgm"},
+    "update_item": {"items_pkey"},
+    "get_item": {"items_pkey"},
+    "get_items": set(),
+    "get_comments_by_item": {"ix_comments_item_id_status_created_at"},
+    "get_comment_page": {"ix_comments_item_id_status_created_at", "users_pkey"},
+    "get_comment_replies": {"ix_comment_replies_comment_id_status_created_at"},
+    "get_reply_replies": {"ix_comment_replies_parent_reply_id_status_created_at"},
+    "count_direct_replies_to_comment": {"comments_pkey"},
+    "count_sub_replies": {"comment_replies_pkey"},
+    "get_reply_page[comment]": {"ix_comment_replies_comment_id_status_created_at", "users_pkey"},
+    "get_reply_page[reply]": {"ix_comment_replies_parent_reply_id_status_created_at", "users_pkey"},
+    "get_reply_tree_info": {"comment_replies_pkey"},
+    "get_reply_subtree": {"comment_replies_pkey", "ix_comment_replies_path"},
+    "get_reply_ancestors": {"comment_replies_pkey"},
+    "get_top_tech_questions": {"ix_tech_questions_status_average_rating_created_at"},
+    "get_tech_question": {"tech_questions_pkey"},
+    "get_question_replies": {"ix_question_replies_question_id_status_created_at"},
+    "get_question_reply_page": {"ix_question_replies_question_id_status_created_at", "users_pkey"},
+    "create_item_rating": {"items_pkey"},
+    "create_question_rating": {"tech_questions_pkey"},
+    "get_product_suggestions": {"ix_product_suggestions_status_created_at"},
+    "get_contact_messages": {"ix_contact_messages_status_created_at"},
+    "update_message_status": {"contact_messages_pkey"},
+    "update_content_status": {"comments_pkey"},
+    "search_content": {
+        "ix_items_search_vector", "ix_tech_questions_search_vector",
+        "ix_question_replies_search_vector", "ix_comments_search_vector",
+    },
+    "check_daily_limit[comment]": {"ix_comments_user_id_created_at"},
+    "check_daily_limit[question]": {"ix_tech_questions_user_id_created_at"},
+    "check_daily_limit[message]": {"ix_contact_messages_user_id_created_at"},
+}
+
+
+@pytest.fixture
+def rows(pg_session):
+    """The rows the operations read or change."""
+    user = ops.create_user(pg_session, -1)  # شناسه‌های تلگرام مثبت هستند، پس با کاربر واقعی تداخل ندارد
+    item = ops.create_item(pg_session, ItemType.DEVICE_PERMANENT, "index check")
+    comment = ops.create_comment(pg_session, item.item_id, user.user_id, "index check")
+    reply = ops.create_comment_reply(pg_session, comment.comment_id, user.user_id, "index check")
+    question = ops.create_tech_question(pg_session, user.user_id, "index check")
+    ops.create_question_reply(pg_session, question.question_id, user.user_id, "index check")
+    return SimpleNamespace(user=user, item=item, comment=comment, reply=reply, question=question)
+
+
+def _nodes(plan: dict):
+    """Yield every node of an EXPLAIN plan."""
+    yield plan
+    for child in plan.get("Plans", []):
+        yield from _nodes(child)
+
+
+@pytest.mark.parametrize("name", EXPECTED_INDEXES)
+def test_operation_uses_its_indexes(name, pg_connection, pg_session, rows, sent_statements):
+    cursor = pg_connection.connection.cursor()
+    cursor.execute("SET LOCAL enable_seqscan = off")
+    sent_statements.clear()
+    _run(name, pg_session, rows)
+
+    used, seq_scans = set(), []
+    for statement, parameters in list(sent_statements):
+        if not statement.lstrip().upper().startswith(EXPLAINED):
+            continue
+        cursor.execute("EXPLAIN (FORMAT JSON) " + statement, parameters)
+        for node in _nodes(cursor.fetchone()[0][0]["Plan"]):
+            if "Index Name" in node:
+                used.add(node["Index Name"])
+            if node["Node Type"] == "Seq Scan" and node["Relation Name"] in APP_TABLES:
+                seq_scans.append(node["Relation Name"])
+
+    if name not in FULL_SCAN_ALLOWED:
+        assert not seq_scans, f"{name}: sequential scan on {', '.join(seq_scans)}"
+    assert EXPECTED_INDEXES[name] <= used, f"{name}: missing {EXPECTED_INDEXES[name] - used}, used {used}"
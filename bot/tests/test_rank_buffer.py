@@ -0,0 +1,135 @@
+"""
+Staging rank points on commit and flushing them from rank_buffer.
+
+add_rank_scores and get_async_db are replaced with stand-ins running on an
+in-memory SQLite RoutingSession, so these tests need no database.
+"""
+import asyncio
+from contextlib import asynccontextmanager
+from types import SimpleNamespace
+import pytest
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.orm import Session
+from database import async_db_operations, metrics
+from database import rank_buffer as rank_buffer_module
+from database.db_handler import RoutingSession
+from database.rank_buffer import RankBuffer, rank_buffer, stage
+from database.user_cache import user_cache
+
+
+@pytest.fixture
+def engine():
+    engine = create_engine("sqlite://")
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture
+def empty_buffer():
+    rank_buffer._take()
+    yield rank_buffer
+    rank_buffer._take()
+
+
+@pytest.fixture
+def flush_session(engine, monkeypatch):
+    """Make flush() use a RoutingSession on engine; the stand-in add_rank_scores goes in flush_session.add_rank_scores."""
+    session = RoutingSession(bind=engine)
+    state = SimpleNamespace(add_rank_scores=None)
+
+    @asynccontextmanager
+    async def get_async_db():
+        yield SimpleNamespace(sync_session=session)
+
+    async def add_rank_scores(db, points):
+        return state.add_rank_scores(db.sync_session, points)
+
+    monkeypatch.setattr(rank_buffer_module, "get_async_db", get_async_db)
+    monkeypatch.setattr(async_db_operations, "add_rank_scores", add_rank_scores)
+    yield state
+    session.close()
+
+
+def test_points_are_buffered_on_commit(engine, empty_buffer):
+    with RoutingSession(bind=engine) as db:
+        stage(db, 1, 5)
+        stage(db, 1, 3)
+        db.commit()
+    assert dict(empty_buffer._pending) == {1: 8}
+
+
+def test_points_are_dropped_on_rollback(engine, empty_buffer):
+    with RoutingSession(bind=engine) as db:
+        db.execute(text("SELECT 1"))  # مثل عملیات‌ها: امتیاز بعد از نوشتن stage می‌شود
+        stage(db, 1, 5)
+        db.rollback()
+        db.commit()
+    assert len(empty_buffer) == 0
+
+
+def test_plain_sessions_are_not_hooked(engine, empty_buffer):
+    with Session(bind=engine) as db:
+        stage(db, 1, 5)
+        db.commit()
+    assert len(empty_buffer) == 0
+
+
+def test_flush_writes_and_invalidates(flush_session, monkeypatch):
+    buffer = RankBuffer()
+    buffer.add({1: 5, 2: 0, 3: 1})
+    written = []
+
+    def add_rank_scores(db, points):
+        written.append(points)
+        db.commit()
+        return len(points)
+    flush_session.add_rank_scores = add_rank_scores
+    invalidated = []
+    monkeypatch.setattr(user_cache, "invalidate", invalidated.append)
+
+    assert asyncio.run(buffer.flush()) == 2
+    assert written == [{1: 5, 3: 1}]  # کاربر بدون امتیاز نوشته نمی‌شود
+    assert sorted(invalidated) == [1, 3]
+    assert len(buffer) == 0
+
+
+def test_failure_before_commit_keeps_the_points(flush_session):
+    buffer = RankBuffer()
+    buffer.add({1: 5})
+
+    def add_rank_scores(db, points):
+        raise ConnectionError("no connection")
+    flush_session.add_rank_scores = add_rank_scores
+
+    with pytest.raises(ConnectionError):
+        asyncio.run(buffer.flush())
+    assert dict(buffer._pending) == {1: 5}
+
+
+def test_failure_during_commit_drops_the_points(engine, flush_session, monkeypatch):
+    buffer = RankBuffer()
+    buffer.add({1: 5})
+    runs = []
+
+    def add_rank_scores(db, points):
+        runs.append(points)
+        db.execute(text("SELECT 1"))
+        db.commit()
+        return len(points)
+
+    def lose_connection(connection):
+        raise ConnectionError("connection lost during COMMIT")
+    event.listen(engine, "commit", lose_connection)
+    flush_session.add_rank_scores = add_rank_scores
+    invalidated = []
+    monkeypatch.setattr(user_cache, "invalidate", invalidated.append)
+    dropped = metrics.get("rank_buffer.dropped_users")
+
+    with pytest.raises(ConnectionError):
+        asyncio.run(buffer.flush())
+    assert len(buffer) == 0
+    assert metrics.get("rank_buffer.dropped_users") == dropped + 1
+    assert invalidated == [1]  # شاید نوشته شده باشد
+    # فلاش بعدی همان امتیازها را دوباره نمی‌نویسد
+    assert asyncio.run(buffer.flush()) == 0
+    assert runs == [{1: 5}]
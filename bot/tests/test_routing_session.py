@@ -0,0 +1,63 @@
+"""
+RoutingSession sends only plain SELECTs to the replica.
+
+Two in-memory SQLite engines stand in for the primary and the replica, so
+these tests need no database.
+"""
+import pytest
+from sqlalchemy import create_engine, select, text, union_all, update
+from database.db_handler import RoutingSession
+from database.models import Item, User
+
+
+@pytest.fixture
+def engines():
+    primary, replica = create_engine("sqlite://"), create_engine("sqlite://")
+    yield primary, replica
+    primary.dispose()
+    replica.dispose()
+
+
+@pytest.fixture
+def session(engines):
+    primary, replica = engines
+    session = RoutingSession(bind=primary, replica_bind=replica)
+    yield session
+    session.close()
+
+
+@pytest.mark.parametrize("statement", [
+    select(User).where(User.user_id == 1),
+    union_all(select(User.user_id), select(Item.comment_count)),
+], ids=["select", "union"])
+def test_plain_reads_go_to_the_replica(session, engines, statement):
+    assert session.get_bind(clause=statement) is engines[1]
+    assert not session.reads_from_primary()
+
+
+@pytest.mark.parametrize("statement", [
+    text("UPDATE users SET rank_score = rank_score + 1"),
+    text("SELECT 1"),
+    update(User).values(rank_score=0),
+    select(User).with_for_update(),
+], ids=["text write", "text select", "update", "for update"])
+def test_other_statements_go_to_the_primary(session, engines, statement):
+    assert session.get_bind(clause=statement) is engines[0]
+    # بعد از نوشتن، خواندن‌های بعدی هم از primary است
+    assert session.reads_from_primary()
+    assert session.get_bind(clause=select(User)) is engines[0]
+
+
+def test_connection_without_statement_uses_the_primary(session, engines):
+    assert session.connection().engine is engines[0]
+    assert session.get_bind(clause=select(User)) is engines[0]
+
+
+def test_without_replica_everything_goes_to_the_bind(engines):
+    session = RoutingSession(bind=engines[0])
+    try:
+        assert session.get_bind(clause=select(User)) is engines[0]
+        assert session.get_bind(clause=text("SELECT 1")) is engines[0]
+        assert session.reads_from_primary()
+    finally:
+        session.close()
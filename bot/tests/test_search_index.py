@@ -0,0 +1,132 @@
+"""
+The in-process item search index behind inline queries, and its periodic rebuild.
+
+Items are plain stand-ins and the rebuild reads a stand-in get_items_uncached,
+so these tests need no database.
+"""
+import asyncio
+import uuid
+from contextlib import asynccontextmanager
+from types import SimpleNamespace
+import pytest
+from database.models import ItemType
+from database.normalization import normalize_name
+from database.search_index import MAX_PREFIX_LENGTH, ItemSearchIndex, item_index
+from pages import search
+
+
+def _item(name: str, rating: float = 0, item_type=ItemType.LIQUID_SALT):
+    return SimpleNamespace(
+        item_id=uuid.uuid4(), type=item_type, name=name, description=None,
+        average_rating=rating, name_normalized=normalize_name(name),
+    )
+
+
+def _names(results) -> list:
+    return [result.name for result in results]
+
+
+@pytest.fixture
+def index():
+    index = ItemSearchIndex()
+    index.rebuild([
+        _item("Vaporesso Xros 3", 4.5),
+        _item("Vaporesso Luxe", 3.0),
+        _item("Voopoo Drag X", 4.0),
+        _item("سالت نیکوتین کیوی", 2.0),
+    ])
+    return index
+
+
+def test_prefixes_of_any_word_match_best_rated_first(index):
+    assert _names(index.search("vap")) == ["Vaporesso Xros 3", "Vaporesso Luxe"]
+    assert _names(index.search("x")) == ["Vaporesso Xros 3", "Voopoo Drag X"]
+
+
+def test_every_query_word_must_match(index):
+    assert _names(index.search("vaporesso lu")) == ["Vaporesso Luxe"]
+    assert _names(index.search("voopoo x")) == ["Voopoo Drag X"]
+
+
+def test_query_is_normalized_like_names(index):
+    # ي و ك عربی مثل ی و ک فارسی نام ذخیره‌شده تطبیق می‌خورند
+    assert _names(index.search("نيكوتين")) == ["سالت نیکوتین کیوی"]
+
+
+def test_long_words_are_checked_against_the_name():
+    index = ItemSearchIndex()
+    long_word = "a" * (MAX_PREFIX_LENGTH + 5)
+    index.rebuild([_item(long_word), _item("a" * MAX_PREFIX_LENGTH + "b")])
+    assert _names(index.search(long_word)) == [long_word]
+
+
+def test_typos_fall_back_to_trigrams(index):
+    assert _names(index.search("vaporeso")) == ["Vaporesso Xros 3", "Vaporesso Luxe"]
+    assert index.search("zzzz") == []
+
+
+def test_empty_query_returns_top_rated(index):
+    assert _names(index.search("", limit=2)) == ["Vaporesso Xros 3", "Voopoo Drag X"]
+
+
+def test_add_replaces_and_remove_forgets(index):
+    luxe = next(result for result in index.search("luxe"))
+    renamed = _item("Vaporesso Gen", 5.0)
+    renamed.item_id = luxe.item_id
+    index.add(renamed)
+    assert index.search("luxe") == []
+    assert _names(index.search("vap")) == ["Vaporesso Gen", "Vaporesso Xros 3"]
+    index.remove(luxe.item_id)
+    assert _names(index.search("vap")) == ["Vaporesso Xros 3"]
+    assert len(index) == 3
+
+
+@pytest.fixture
+def catalog(monkeypatch):
+    """Items the stand-in get_items_uncached returns; item_index is emptied afterwards."""
+    items = []
+
+    @asynccontextmanager
+    async def get_async_db():
+        yield None
+
+    async def get_items_uncached(db):
+        return list(items)
+
+    monkeypatch.setattr(search, "get_async_db", get_async_db)
+    monkeypatch.setattr(search, "get_items_uncached", get_items_uncached)
+    monkeypatch.setattr(search, "ITEM_INDEX_REFRESH_INTERVAL", 0.01)
+    yield items
+    item_index.rebuild([])
+
+
+def test_periodic_rebuild_picks_up_items_added_later(catalog):
+    async def scenario():
+        catalog.append(_item("Vaporesso Xros 3"))
+        await search.load_item_search_index()
+        refresh = asyncio.create_task(search.refresh_item_search_index())
+        try:
+            # محصولی که بیرون از این پروسه ثبت شده (مثلاً import_items)
+            catalog.append(_item("Uwell Caliburn"))
+            assert item_index.search("caliburn") == []
+            await asyncio.sleep(0.05)
+            assert _names(item_index.search("caliburn")) == ["Uwell Caliburn"]
+        finally:
+            refresh.cancel()
+    asyncio.run(scenario())
+
+
+def test_failed_rebuild_keeps_the_index(catalog, monkeypatch):
+    async def failing(db):
+        raise ConnectionError("database is down")
+
+    async def scenario():
+        catalog.append(_item("Vaporesso Xros 3"))
+        await search.load_item_search_index()
+        monkeypatch.setattr(search, "get_items_uncached", failing)
+        refresh = asyncio.create_task(search.refresh_item_search_index())
+        await asyncio.sleep(0.05)
+        assert not refresh.done()
+        refresh.cancel()
+        assert _names(item_index.search("vap")) == ["Vaporesso Xros 3"]
+    asyncio.run(scenario())
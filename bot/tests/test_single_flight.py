@@ -0,0 +1,132 @@
+"""
+SingleFlight and the coalesced reads of async_db_operations.
+
+Queries are stood in for by coroutines that wait on an event, so these
+tests need no database.
+"""
+import asyncio
+from types import SimpleNamespace
+import pytest
+from database import async_db_operations
+from database.single_flight import SingleFlight
+
+
+class _Query:
+    """A stand-in query: counts its runs and finishes when release() is called."""
+
+    def __init__(self, result="rows", error=None):
+        self.result = result
+        self.error = error
+        self.runs = 0
+        self.started = asyncio.Event()
+        self._released = asyncio.Event()
+
+    def release(self):
+        self._released.set()
+
+    async def __call__(self):
+        self.runs += 1
+        self.started.set()
+        await self._released.wait()
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+
+async def _settle():
+    """Let every task that can run, run."""
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+
+def test_concurrent_calls_share_one_query():
+    async def scenario():
+        flight, query = SingleFlight(), _Query()
+        calls = [asyncio.create_task(flight.do("key", query)) for _ in range(3)]
+        await _settle()
+        query.release()
+        results = await asyncio.gather(*calls)
+        assert query.runs == 1
+        assert sorted(shared for _, shared in results) == [False, True, True]
+        assert {result for result, _ in results} == {"rows"}
+        assert len(flight) == 0
+    asyncio.run(scenario())
+
+
+def test_different_keys_do_not_share():
+    async def scenario():
+        flight, query = SingleFlight(), _Query()
+        calls = [asyncio.create_task(flight.do(key, query)) for key in ("a", "b")]
+        await _settle()
+        query.release()
+        await asyncio.gather(*calls)
+        assert query.runs == 2
+    asyncio.run(scenario())
+
+
+def test_leader_error_reaches_every_caller():
+    async def scenario():
+        flight, query = SingleFlight(), _Query(error=ValueError("boom"))
+        calls = [asyncio.create_task(flight.do("key", query)) for _ in range(2)]
+        await _settle()
+        query.release()
+        results = await asyncio.gather(*calls, return_exceptions=True)
+        assert all(isinstance(result, ValueError) for result in results)
+        assert query.runs == 1
+        assert len(flight) == 0
+    asyncio.run(scenario())
+
+
+def test_followers_run_the_query_when_the_leader_is_cancelled():
+    async def scenario():
+        flight, query = SingleFlight(), _Query()
+        leader = asyncio.create_task(flight.do("key", query))
+        await query.started.wait()
+        followers = [asyncio.create_task(flight.do("key", query)) for _ in range(2)]
+        await _settle()
+        leader.cancel()
+        await _settle()
+        query.release()
+        results = await asyncio.gather(*followers)
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+        # یکی از منتظرها leader جدید شد و دیگری نتیجه او را گرفت
+        assert query.runs == 2
+        assert sorted(shared for _, shared in results) == [False, True]
+        assert len(flight) == 0
+    asyncio.run(scenario())
+
+
+def test_cancelled_follower_leaves_the_leader_running():
+    async def scenario():
+        flight, query = SingleFlight(), _Query()
+        leader = asyncio.create_task(flight.do("key", query))
+        await query.started.wait()
+        follower = asyncio.create_task(flight.do("key", query))
+        await _settle()
+        follower.cancel()
+        await _settle()
+        query.release()
+        assert await leader == ("rows", False)
+        with pytest.raises(asyncio.CancelledError):
+            await follower
+        assert query.runs == 1
+    asyncio.run(scenario())
+
+
+def test_primary_and_replica_readers_do_not_share():
+    async def scenario():
+        query = _Query()
+
+        async def get_item(db, item_id):
+            return await query()
+
+        read = async_db_operations._single_flight(get_item)
+        sessions = [SimpleNamespace(sync_session=SimpleNamespace(reads_from_primary=lambda primary=primary: primary))
+                    for primary in (True, False, False)]
+        calls = [asyncio.create_task(read(db, 1)) for db in sessions]
+        await _settle()
+        query.release()
+        await asyncio.gather(*calls)
+        assert query.runs == 2
+    asyncio.run(scenario())
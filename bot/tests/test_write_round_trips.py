@@ -0,0 +1,83 @@
+"""
+Every db_operations write must cost the expected number of statements and commit exactly once.
+
+Each case runs the write sequence below up to the operation under test, so
+the rows it needs exist, and counts only that operation's statements. A
+stray refresh, re-select or extra commit shows up as a failure.
+"""
+import pytest
+from sqlalchemy import event
+from database import db_operations as ops
+from database.models import ContentStatus, ItemType, MessageStatus, UserStatus
+
+pytestmark = pytest.mark.postgres
+
+# Expected number of SQL statements per operation
+EXPECTED_STATEMENTS = {
+    "create_user": 1,               # INSERT … RETURNING
+    "update_user_status": 1,        # UPDATE … RETURNING
+    "update_user_rank_score": 1,    # UPDATE … RETURNING
+    "update_user": 1,               # UPDATE … RETURNING
+    "add_rank_scores": 1,           # UPDATE … FROM (VALUES …)
+    "create_item": 1,               # INSERT … RETURNING
+    "update_item": 1,               # UPDATE … RETURNING
+    "create_comment": 2,            # INSERT … RETURNING, comment_count UPDATE (rank points go to rank_buffer)
+    "create_comment_reply": 2,      # INSERT … RETURNING, reply_count UPDATE
+    "create_tech_question": 1,      # INSERT … RETURNING
+    "create_question_reply": 2,     # INSERT … RETURNING, reply_count UPDATE
+    "create_item_rating": 1,        # INSERT ON CONFLICT + aggregates, one statement
+    "create_item_rating[again]": 1, # same statement, nothing changes
+    "create_question_rating": 1,    # INSERT ON CONFLICT + aggregates, one statement
+    "create_product_suggestion": 1, # INSERT … RETURNING
+    "create_contact_message": 1,    # INSERT … RETURNING
+    "update_message_status": 1,     # UPDATE … RETURNING
+    "update_content_status": 1,     # UPDATE (already approved, counters unchanged)
+    "update_content_status[reject]": 2,  # UPDATE … RETURNING previous status, comment_count UPDATE
+}
+
+
+def _operations(db):
+    """Yield (name, callable) for every write operation; later steps use rows made by earlier ones."""
+    created = {}
+    user_id = -1  # شناسه‌های تلگرام مثبت هستند، پس با کاربر واقعی تداخل ندارد
+
+    def run(name, call):
+        return name, lambda: created.setdefault(name, call())
+
+    yield run("create_user", lambda: ops.create_user(db, user_id))
+    yield run("update_user_status", lambda: ops.update_user_status(db, user_id, UserStatus.VERIFIED))
+    yield run("update_user_rank_score", lambda: ops.update_user_rank_score(db, user_id, 1))
+    yield run("update_user", lambda: ops.update_user(db, user_id, username="write_check"))
+    yield run("add_rank_scores", lambda: ops.add_rank_scores(db, {user_id: 5, -2: 1}))
+    yield run("create_item", lambda: ops.create_item(db, ItemType.DEVICE_PERMANENT, "write check"))
+    item_id = lambda: created["create_item"].item_id
+    yield run("update_item", lambda: ops.update_item(db, item_id(), name="write check ۲"))
+    yield run("create_comment", lambda: ops.create_comment(db, item_id(), user_id, "write check"))
+    yield run("create_comment_reply", lambda: ops.create_comment_reply(db, created["create_comment"].comment_id, user_id, "write check"))
+    yield run("create_tech_question", lambda: ops.create_tech_question(db, user_id, "write check"))
+    question_id = lambda: created["create_tech_question"].question_id
+    yield run("create_question_reply", lambda: ops.create_question_reply(db, question_id(), user_id, "write check"))
+    yield run("create_item_rating", lambda: ops.create_item_rating(db, user_id, item_id(), 4))
+    yield run("create_item_rating[again]", lambda: ops.create_item_rating(db, user_id, item_id(), 2))
+    yield run("create_question_rating", lambda: ops.create_question_rating(db, user_id, question_id(), 4))
+    yield run("create_product_suggestion", lambda: ops.create_product_suggestion(db, user_id, "write check", None))
+    yield run("create_contact_message", lambda: ops.create_contact_message(db, user_id, "write check"))
+    yield run("update_message_status", lambda: ops.update_message_status(db, created["create_contact_message"].message_id, MessageStatus.ANSWERED))
+    yield run("update_content_status", lambda: ops.update_content_status(db, "comment", created["create_comment"].comment_id, ContentStatus.APPROVED))
+    yield run("update_content_status[reject]", lambda: ops.update_content_status(db, "comment", created["create_comment"].comment_id, ContentStatus.REJECTED))
+
+
+@pytest.mark.parametrize("name", EXPECTED_STATEMENTS)
+def test_write_round_trips(name, pg_session, sent_statements):
+    commits = []
+    event.listen(pg_session, "after_commit", lambda session: commits.append(1))
+    for operation, run in _operations(pg_session):
+        sent_statements.clear()
+        commits.clear()
+        run()
+        if operation == name:
+            break
+
+    statements = [statement for statement, _ in sent_statements]
+    assert len(statements) == EXPECTED_STATEMENTS[name], "\n".join(statements)
+    assert len(commits) == 1
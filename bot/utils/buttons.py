@@ -7,7 +7,7 @@ def create_main_menu_buttons():
         [InlineKeyboardButton("🛠️ دستگاه‌ها", callback_data="devices")],
         [InlineKeyboardButton("💧 لیکوئیدها", callback_data="liquids")],
         [InlineKeyboardButton("❓ سوالات فنی", callback_data="tech")],
-        [InlineKeyboardButton("🔍 جستجوی محصولات", callback_data="search")],
+        [InlineKeyboardButton("🔍 جستجو", callback_data="search")],
         [InlineKeyboardButton("📞 تماس با ما", callback_data="contact_us")],
         [InlineKeyboardButton("👤 نام کاربری", callback_data="user_name")]
     ]
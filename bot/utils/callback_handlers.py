@@ -3,8 +3,8 @@ from telegram.ext import CallbackContext, ConversationHandler, CallbackQueryHand
 from typing import Dict, Any, List, Optional, Tuple
 from uuid import UUID
 import logging
-from database.db_handler import get_db
-from database.db_operations import (
+from database.db_handler import get_async_db
+from database.async_db_operations import (
     create_user, get_items_by_type, get_item, get_comments_by_item, get_comment_replies,
     get_top_tech_questions, get_tech_question, get_question_replies, create_item_rating, create_question_rating,
     get_user, create_item, create_comment, create_tech_question, create_comment_reply,
@@ -30,19 +30,15 @@ async def main_menu_callback(update: Update, context: CallbackContext) -> None:
     """Handle main menu callback."""
     query = update.callback_query
     await query.answer()
-    db = next(get_db())
     # Check if user exists in database
-    user = get_user(db,query.from_user.id)
+    async with get_async_db() as db:
+        user = await get_user(db, query.from_user.id)
     
     # If user doesn't exist, create new user
     if not user:
         try:
-            await create_user(
-                telegram_id=query.from_user.id,
-                username=query.from_user.username,
-                first_name=query.from_user.first_name,
-                last_name=query.from_user.last_name
-            )
+            async with get_async_db() as db:
+                await create_user(db, user_id=query.from_user.id)
             logger.info(f"Created new user: {query.from_user.id}")
         except Exception as e:
             logger.error(f"Error creating user: {e}")
@@ -0,0 +1,36 @@
+from functools import wraps
+from telegram import Update
+from telegram.ext import Application, BaseHandler, CallbackContext, ConversationHandler
+from database.db_handler import update_session_scope
+
+
+def _with_update_session(callback):
+    """Run a handler callback inside a per-update database session."""
+    @wraps(callback)
+    async def wrapper(update: Update, context: CallbackContext):
+        user = update.effective_user if isinstance(update, Update) else None
+        async with update_session_scope(user.id if user else None):
+            return await callback(update, context)
+    wrapper.uses_update_session = True
+    return wrapper
+
+
+def _wrap_handler(handler: BaseHandler) -> None:
+    if isinstance(handler, ConversationHandler):
+        for child in handler.entry_points + handler.fallbacks:
+            _wrap_handler(child)
+        for state_handlers in handler.states.values():
+            for child in state_handlers:
+                _wrap_handler(child)
+    elif not getattr(handler.callback, "uses_update_session", False):
+        handler.callback = _with_update_session(handler.callback)
+
+
+def register_db_session_middleware(application: Application) -> None:
+    """Give every registered handler one database session per Update.
+
+    Must be called after all other handlers have been registered.
+    """
+    for handlers in application.handlers.values():
+        for handler in handlers:
+            _wrap_handler(handler)
@@ -1,9 +1,9 @@
 from unicodedata import category
 from telegram import InlineKeyboardButton, InlineKeyboardMarkup
 from typing import List, Dict, Any, Optional
-from database.db_operations import count_direct_replies_to_comment ,count_sub_replies
 from database.db_handler import get_db
 from uuid import UUID
+from utils.items.item_cursor import ItemCursor, encode_item_cursor
 
 def create_device_category_buttons() -> InlineKeyboardMarkup:
     """Create device category buttons."""
@@ -23,26 +23,34 @@ def create_liquid_category_buttons() -> InlineKeyboardMarkup:
     ]
     return InlineKeyboardMarkup(keyboard)
 
-def create_item_list_buttons(items: List[Dict[str, Any]], category: str, page: int = 0, items_per_page: int = 5) -> InlineKeyboardMarkup:
-    """Create buttons for item list with pagination."""
-    start_idx = page * items_per_page
-    end_idx = min(start_idx + items_per_page, len(items))
-    current_items = items[start_idx:end_idx]
-    
+def create_item_list_buttons(items: List[Dict[str, Any]], category: str, page: int = 0, has_previous: bool = False, has_next: bool = False) -> InlineKeyboardMarkup:
+    """
+    Create buttons for one page of an item list.
+
+    items is the current page as loaded from the database. The previous/next
+    buttons carry a keyset cursor taken from the first/last item, so the
+    neighbouring page can be loaded without any per-user state.
+    """
     keyboard = []
-    for item in current_items:
+    for item in items:
         item_id = item.get("item_id")
         name = item.get("name")
         rating = item.get("average_rating", 0)
         stars = "★" * int(rating) + "☆" * (5 - int(rating))
-        keyboard.append([InlineKeyboardButton(f"{name} ({stars})", callback_data=f"item_{category}_{item_id}")])
+        comments = item.get("comment_count", 0)
+        label = f"{name} ({stars})" + (f" 💬{comments}" if comments else "")
+        keyboard.append([InlineKeyboardButton(label, callback_data=f"item_{category}_{item_id}")])
     
     # Pagination buttons
     pagination = []
-    if page > 0:
-        pagination.append(InlineKeyboardButton("◀️ قبلی", callback_data=f"page_{category}_{page-1}"))
-    if end_idx < len(items):
-        pagination.append(InlineKeyboardButton("بعدی ▶️", callback_data=f"page_{category}_{page+1}"))
+    if items and has_previous:
+        first = items[0]
+        cursor = ItemCursor(first["average_rating"], UUID(first["item_id"]), page - 1, backward=True)
+        pagination.append(InlineKeyboardButton("◀️ قبلی", callback_data=f"page_{category}_{encode_item_cursor(cursor)}"))
+    if items and has_next:
+        last = items[-1]
+        cursor = ItemCursor(last["average_rating"], UUID(last["item_id"]), page + 1)
+        pagination.append(InlineKeyboardButton("بعدی ▶️", callback_data=f"page_{category}_{encode_item_cursor(cursor)}"))
     
     if pagination:
         keyboard.append(pagination)
@@ -0,0 +1,49 @@
+"""
+Keyset cursors for item-list paging, carried in `page_` callback data.
+
+A cursor holds the (average_rating, item_id) key of the item a page starts
+after (or, going back, ends before), the direction of travel and the page
+number shown in the title. It is packed to 27 bytes and base64 encoded to
+36 characters, so `page_<category>_<cursor>` stays within Telegram's 64-byte
+callback_data limit for every category.
+"""
+import base64
+import binascii
+import struct
+from typing import NamedTuple, Optional
+from uuid import UUID
+
+# "-" and "." instead of "+" and "/": no "_", so the cursor splits cleanly off the category
+_ALTCHARS = b"-."
+
+# backward flag, page number, average_rating (float8, exact), item_id
+_CURSOR_FORMAT = struct.Struct(">?Hd16s")
+
+
+class ItemCursor(NamedTuple):
+    average_rating: float
+    item_id: UUID
+    page: int
+    backward: bool = False
+
+    @property
+    def key(self):
+        return self.average_rating, self.item_id
+
+
+def encode_item_cursor(cursor: ItemCursor) -> str:
+    """Pack a cursor into a callback_data-safe string."""
+    packed = _CURSOR_FORMAT.pack(
+        cursor.backward, max(0, min(cursor.page, 0xFFFF)), cursor.average_rating, cursor.item_id.bytes
+    )
+    return base64.b64encode(packed, altchars=_ALTCHARS).decode("ascii")
+
+
+def decode_item_cursor(value: str) -> Optional[ItemCursor]:
+    """Unpack a cursor made by encode_item_cursor; None if it is malformed."""
+    try:
+        packed = base64.b64decode(value, altchars=_ALTCHARS, validate=True)
+        backward, page, average_rating, item_id = _CURSOR_FORMAT.unpack(packed)
+    except (binascii.Error, struct.error, ValueError):
+        return None
+    return ItemCursor(average_rating, UUID(bytes=item_id), page, backward)
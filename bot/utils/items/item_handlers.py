@@ -4,12 +4,14 @@ from typing import Dict, Any, List, Optional, Tuple
 from uuid import UUID
 from datetime import datetime
 import logging
-from database.db_handler import get_db
-from database.db_operations import (
-    get_items_by_type, get_item, get_comments_by_item, get_comment_replies,
+from sqlalchemy import select
+from database.db_handler import get_async_db
+from database.async_db_operations import (
+    get_items_by_type, get_item_page, get_item, get_comments_by_item, get_comment_page, get_comment_replies,
     create_item_rating, 
     get_user, create_item, create_comment, create_comment_reply,
-    create_item_rating , count_direct_replies_to_comment, count_sub_replies,get_reply_replies
+    create_item_rating , count_direct_replies_to_comment, count_sub_replies,get_reply_replies,
+    get_reply_page, get_reply_tree_info
 )
 from database.models import ItemType, ContentStatus, TargetType , CommentReply , Comment
 
@@ -25,7 +27,19 @@ from utils.items.item_buttons import (
 from utils.callback_handlers import (
     cancel_callback
 )
+from utils.items.item_cursor import decode_item_cursor
+from utils.ratings import format_rating_distribution
 NAME,DESCRIPTION,COMMENT, REPLY ,REPLY_AWAITING_CONTENT = range(5)
+COMMENTS_PER_PAGE = 5  # تعداد نظرات در هر صفحه
+ITEMS_PER_PAGE = 5  # تعداد محصولات در هر صفحه
+
+# دسته‌بندی‌ها: نوع محصول و عنوان نمایشی
+CATEGORY_ITEM_TYPES = {
+    "devices_permanent": (ItemType.DEVICE_PERMANENT, "دستگاه‌های دائمی"),
+    "devices_disposable": (ItemType.DEVICE_DISPOSABLE, "دستگاه‌های یکبارمصرف"),
+    "liquid_salt": (ItemType.LIQUID_SALT, "سالت نیکوتین"),
+    "liquid_juice": (ItemType.LIQUID_JUICE, "جویس"),
+}
 
 ####################################
 
@@ -69,13 +83,10 @@ async def device_category_callback(update: Update, context: CallbackContext) ->
     page = 0
     
     # Get items based on category
-    db = next(get_db())
     if category == "devices_permanent":
-        items = get_items_by_type(db, ItemType.DEVICE_PERMANENT)
         title = "دستگاه‌های دائمی"
         item_type = ItemType.DEVICE_PERMANENT
     elif category == "devices_disposable":
-        items = get_items_by_type(db, ItemType.DEVICE_DISPOSABLE)
         title = "دستگاه‌های یکبارمصرف"
         item_type = ItemType.DEVICE_DISPOSABLE
     else:
@@ -84,6 +95,8 @@ async def device_category_callback(update: Update, context: CallbackContext) ->
             reply_markup=create_device_category_buttons()
         )
         return
+    async with get_async_db() as db:
+        items, has_next = await get_item_page(db, item_type, limit=ITEMS_PER_PAGE)
     
     if not items:
         # ایجاد دکمه برای افزودن آیتم جدید
@@ -106,16 +119,16 @@ async def device_category_callback(update: Update, context: CallbackContext) ->
         {
             "item_id": str(item.item_id),
             "name": item.name,
-            "average_rating": item.average_rating
+            "average_rating": item.average_rating,
+            "comment_count": item.comment_count
         } for item in items
     ]
     
     context.user_data["current_category"] = category
-    context.user_data["items"] = items_dict
     
     await query.edit_message_text(
         f"لیست {title}:",
-        reply_markup=create_item_list_buttons(items_dict, category, page)
+        reply_markup=create_item_list_buttons(items_dict, category, page, has_next=has_next)
     )
 
 # Liquid category callback handler
@@ -128,13 +141,10 @@ async def liquid_category_callback(update: Update, context: CallbackContext) ->
     page = 0
     
     # Get items based on category
-    db = next(get_db())
     if category == "liquid_salt":
-        items = get_items_by_type(db, ItemType.LIQUID_SALT)
         title = "سالت نیکوتین"
         item_type = ItemType.LIQUID_SALT
     elif category == "liquid_juice":
-        items = get_items_by_type(db, ItemType.LIQUID_JUICE)
         title = "جویس"
         item_type = ItemType.LIQUID_JUICE
     else:
@@ -143,6 +153,8 @@ async def liquid_category_callback(update: Update, context: CallbackContext) ->
             reply_markup=create_liquid_category_buttons()
         )
         return
+    async with get_async_db() as db:
+        items, has_next = await get_item_page(db, item_type, limit=ITEMS_PER_PAGE)
     
     if not items:
         # ایجاد دکمه برای افزودن آیتم جدید
@@ -165,16 +177,16 @@ async def liquid_category_callback(update: Update, context: CallbackContext) ->
         {
             "item_id": str(item.item_id),
             "name": item.name,
-            "average_rating": item.average_rating
+            "average_rating": item.average_rating,
+            "comment_count": item.comment_count
         } for item in items
     ]
     
     context.user_data["current_category"] = category
-    context.user_data["items"] = items_dict
     
     await query.edit_message_text(
         f"لیست {title}:",
-        reply_markup=create_item_list_buttons(items_dict, category, page)
+        reply_markup=create_item_list_buttons(items_dict, category, page, has_next=has_next)
     )
 
 ##################################
@@ -188,34 +200,47 @@ async def page_callback(update: Update, context: CallbackContext) -> None:
     query = update.callback_query
     await query.answer()
     
-    # Extract category and page from callback data
-    _, category, page = query.data.split("_", 2)
-    page = int(page)
-    
-    items = context.user_data.get("items", [])
+    # Extract category and keyset cursor from callback data
+    category, encoded_cursor = query.data[len("page_"):].rsplit("_", 1)
+    cursor = decode_item_cursor(encoded_cursor)
     
-    if not items:
+    if category not in CATEGORY_ITEM_TYPES:
         await query.edit_message_text(
             "خطا در بارگذاری محصولات. لطفاً دوباره تلاش کنید.",
             reply_markup=create_main_menu_buttons()
         )
         return
-    
-    # Get category title
-    if category == "devices_permanent":
-        title = "دستگاه‌های دائمی"
-    elif category == "devices_disposable":
-        title = "دستگاه‌های یکبارمصرف"
-    elif category == "liquids_salt":
-        title = "سالت نیکوتین"
-    elif category == "liquids_juice":
-        title = "جویس"
+    item_type, title = CATEGORY_ITEM_TYPES[category]
+    
+    # One indexed query per page; a stale or malformed cursor falls back to the first page
+    async with get_async_db() as db:
+        if cursor is not None:
+            items, has_more = await get_item_page(db, item_type, cursor.key, cursor.backward, limit=ITEMS_PER_PAGE)
+        if cursor is None or not items:
+            cursor = None
+            items, has_more = await get_item_page(db, item_type, limit=ITEMS_PER_PAGE)
+    
+    if cursor is None:
+        page, has_previous, has_next = 0, False, has_more
+    elif cursor.backward:
+        # رسیدن به ابتدای لیست هنگام برگشت یعنی صفحه اول هستیم
+        page = cursor.page if has_more else 0
+        has_previous, has_next = has_more, True
     else:
-        title = "محصولات"
+        page, has_previous, has_next = cursor.page, True, has_more
+    
+    items_dict = [
+        {
+            "item_id": str(item.item_id),
+            "name": item.name,
+            "average_rating": item.average_rating,
+            "comment_count": item.comment_count
+        } for item in items
+    ]
     
     await query.edit_message_text(
         f"لیست {title} (صفحه {page + 1}):",
-        reply_markup=create_item_list_buttons(items, category, page)
+        reply_markup=create_item_list_buttons(items_dict, category, page, has_previous, has_next)
     )
 
 ##################################
@@ -233,21 +258,21 @@ async def item_detail_callback(update: Update, context: CallbackContext) -> None
         # Extract item ID from callback data
         _,itemtype, category, item_id = query.data.split("_", 3)
         context.user_data["current_itemtype"] = itemtype
-        # Get item details
-        db = next(get_db())
-        
         # Try to convert item_id to UUID, handle potential errors
         try:
-            item_uuid = item_id
-            item = get_item(db, item_uuid)
+            item_uuid = UUID(item_id)
         except ValueError:
             # Handle invalid UUID format
             await query.edit_message_text(
-                f"شناسه محصول نامعتبر است. لطفاً دوباره تلاش کنید.\n{item_uuid}",
+                f"شناسه محصول نامعتبر است. لطفاً دوباره تلاش کنید.\n{item_id}",
                 reply_markup=create_main_menu_buttons()
             )
             return
         
+        # Get item details
+        async with get_async_db() as db:
+            item = await get_item(db, item_uuid)
+        
         if not item:
             await query.edit_message_text(
                 "محصول مورد نظر یافت نشد. لطفاً دوباره تلاش کنید.",
@@ -260,8 +285,11 @@ async def item_detail_callback(update: Update, context: CallbackContext) -> None
         item_details = (
             f"🏷️ نام: {item.name}\n\n"
             f"📝 توضیحات: {item.description or 'بدون توضیحات'}\n\n"
-            f"⭐ امتیاز: {rating_stars} ({item.average_rating:.1f} از 5 - {item.rating_count} رأی)"
+            f"⭐ امتیاز: {rating_stars} ({item.average_rating:.1f} از 5 - {item.rating_count} رأی)\n"
+            f"💬 {item.comment_count} نظر"
         )
+        if item.rating_count:
+            item_details += "\n\n" + format_rating_distribution(item)
         
         # Save item ID in user data for future use
         context.user_data["current_item_id"] = str(item.item_id)
@@ -296,17 +324,21 @@ async def item_comments_callback(update: Update, context: CallbackContext) -> No
     try:
         # Extract item ID from callback data
         _, item_id = query.data.split("_", 1)
-        # Get item details
-        db = next(get_db())
-        
         try:
-            item = get_item(db, item_id)
+            item_uuid = UUID(item_id)
         except ValueError:
             await query.edit_message_text(
                 "شناسه محصول نامعتبر است. لطفاً دوباره تلاش کنید.",
                 reply_markup=create_main_menu_buttons()
             )
             return
+
+        # Get item details and the first page of approved comments with authors and reply counts
+        # (اتصال دیتابیس پیش از ارسال پیام‌ها آزاد می‌شود)
+        async with get_async_db() as db:
+            item = await get_item(db, item_uuid)
+            if item:
+                comments, total_comments = await get_comment_page(db, item.item_id, offset=0, limit=COMMENTS_PER_PAGE)
         
         if not item:
             await query.edit_message_text(
@@ -315,9 +347,6 @@ async def item_comments_callback(update: Update, context: CallbackContext) -> No
             )
             return
         
-        # Get approved comments for the item
-        comments = get_comments_by_item(db, item.item_id, ContentStatus.APPROVED)
-        
         # ابتدا پیام اصلی را به عنوان هدر نمایش می‌دهیم
         header_text = f"💬 نظرات کاربران برای {item.name}:"
         await query.edit_message_text(header_text)
@@ -336,40 +365,21 @@ async def item_comments_callback(update: Update, context: CallbackContext) -> No
             )
             return
         # نمایش هر نظر در یک پیام جداگانه (حداکثر ۵ نظر)
-        for i, comment in enumerate(comments[:5], 1):
-            user = get_user(db, comment.user_id)
-            username = user.username if user and user.username else f"کاربر {comment.user_id}"
-            # متن نظر
-            comment_text = f"💬 نظر #{i}:\n\n"
-            comment_text += f"👤 {username}:\n{comment.text}\n"
-            
-            # اگر رسانه داشت
-            if comment.media_url:
-                comment_text += "\n🖼️ [دارای تصویر یا ویدیو]\n"
-            
-            # تعداد پاسخ‌ها
-            reply_count = len(get_comment_replies(db, comment.comment_id, ContentStatus.APPROVED))
-            if reply_count > 0:
-                comment_text += f"\n↩️ {reply_count} پاسخ\n"
-            
-            # دکمه‌های هر نظر
-            comment_keyboard = create_comment_buttons(str(comment.comment_id), has_replies=bool(reply_count))
-            
-            # ارسال پیام نظر
+        for i, (comment, username, reply_count) in enumerate(comments, 1):
             await context.bot.send_message(
                 chat_id=update.effective_chat.id,
-                text=comment_text,
-                reply_markup=comment_keyboard
+                text=_comment_text(i, comment, username, reply_count),
+                reply_markup=create_comment_buttons(str(comment.comment_id), has_replies=bool(reply_count))
             )
         
         # پیام نهایی با دکمه‌های اصلی
         final_keyboard = []
-        # Save total comments count to user data
-        context.user_data["total_comments"] = i
+        # Save the number of comments shown so far to user data
+        context.user_data["total_comments"] = len(comments)
         # اگر نظرات بیشتر از ۵ تا بود
         
-        if len(comments) > 5:
-            final_keyboard.append([InlineKeyboardButton(f"👁️ نمایش {(len(comments) - context.user_data['total_comments'])%5} نظر دیگر",
+        if total_comments > len(comments):
+            final_keyboard.append([InlineKeyboardButton(f"👁️ نمایش {min(COMMENTS_PER_PAGE, total_comments - len(comments))} نظر دیگر",
                                                         callback_data=f"more_comments_{item_id}")])
         
         # دکمه‌های اصلی
@@ -381,7 +391,6 @@ async def item_comments_callback(update: Update, context: CallbackContext) -> No
             chat_id=update.effective_chat.id,
             text="برای ادامه یکی از گزینه‌های زیر را انتخاب کنید:",
             reply_markup=InlineKeyboardMarkup(final_keyboard)
-            
         )
         
     except Exception as e:
@@ -394,6 +403,22 @@ async def item_comments_callback(update: Update, context: CallbackContext) -> No
             reply_markup=create_main_menu_buttons()
         )
 
+def _comment_text(number: int, comment, username, reply_count: int) -> str:
+    """Text of one comment message in a comment page."""
+    username = username or f"کاربر {comment.user_id}"
+    # متن نظر
+    comment_text = f"💬 نظر #{number}:\n\n"
+    comment_text += f"👤 {username}:\n{comment.text}\n"
+
+    # اگر رسانه داشت
+    if comment.media_url:
+        comment_text += "\n🖼️ [دارای تصویر یا ویدیو]\n"
+
+    # تعداد پاسخ‌ها
+    if reply_count > 0:
+        comment_text += f"\n↩️ {reply_count} پاسخ\n"
+    return comment_text
+
 # Show more comments callback handler
 async def more_comments_callback(update: Update, context: CallbackContext) -> None:
     """Handle showing more comments."""
@@ -403,18 +428,22 @@ async def more_comments_callback(update: Update, context: CallbackContext) -> No
     try:
         # Extract item ID and offset from callback data
         _,_, item_id = query.data.split("_", 2)
-        
-        # Get item details
-        db = next(get_db())
-        
         try:
-            item = get_item(db, item_id)
+            item_uuid = UUID(item_id)
         except ValueError:
             await query.edit_message_text(
                 "شناسه محصول نامعتبر است. لطفاً دوباره تلاش کنید.",
                 reply_markup=create_main_menu_buttons()
             )
             return
+
+        # Get item details and the next page of approved comments with authors and reply counts
+        # (اتصال دیتابیس پیش از ارسال پیام‌ها آزاد می‌شود)
+        shown_comments = context.user_data.get('total_comments', 0)
+        async with get_async_db() as db:
+            item = await get_item(db, item_uuid)
+            if item:
+                comments, total_comments = await get_comment_page(db, item.item_id, offset=shown_comments, limit=COMMENTS_PER_PAGE)
         
         if not item:
             await query.edit_message_text(
@@ -423,11 +452,8 @@ async def more_comments_callback(update: Update, context: CallbackContext) -> No
             )
             return
         
-        # Get approved comments for the item
-        comments = get_comments_by_item(db, item.item_id, ContentStatus.APPROVED)
-        
         # اگر نظری وجود نداشت یا آفست بیشتر از تعداد نظرات بود
-        if not comments or context.user_data['total_comments'] >= len(comments):
+        if not comments:
             await query.edit_message_text(
                 "نظر بیشتری وجود ندارد.",
                 reply_markup=InlineKeyboardMarkup([
@@ -436,10 +462,6 @@ async def more_comments_callback(update: Update, context: CallbackContext) -> No
             )
             return
         
-        # تعداد نظرات باقیمانده
-        remaining_comments = (len(comments) - context.user_data['total_comments']) % 5
-        remaining_comments += context.user_data['total_comments']
-        
         # ابتدا پیام اصلی را به‌روزرسانی می‌کنیم
         await query.edit_message_text(
             f"💬 نظرات بیشتر برای {item.name}:",
@@ -449,42 +471,21 @@ async def more_comments_callback(update: Update, context: CallbackContext) -> No
         )
         
         # نمایش هر نظر در یک پیام جداگانه
-        for i, comment in enumerate(comments[context.user_data['total_comments']:remaining_comments], context.user_data['total_comments']):
-            remaining_comments += 1
-            user = get_user(db, comment.user_id)
-            username = user.username if user and user.username else f"کاربر {comment.user_id}"
-            
-            # متن نظر
-            comment_text = f"💬 نظر #{i}:\n\n"
-            comment_text += f"👤 {username}:\n{comment.text}\n"
-            
-            # اگر رسانه داشت
-            if comment.media_url:
-                comment_text += "\n🖼️ [دارای تصویر یا ویدیو]\n"
-            
-            # تعداد پاسخ‌ها
-            reply_count = len(get_comment_replies(db, comment.comment_id, ContentStatus.APPROVED))
-            if reply_count > 0:
-                comment_text += f"\n↩️ {reply_count} پاسخ\n"
-            
-            # دکمه‌های هر نظر
-            comment_keyboard = create_comment_buttons(str(comment.comment_id), has_replies=bool(reply_count))
-            
-            
-            # ارسال پیام نظر
+        for i, (comment, username, reply_count) in enumerate(comments, shown_comments + 1):
             await context.bot.send_message(
                 chat_id=update.effective_chat.id,
-                text=comment_text,
-                reply_markup=comment_keyboard
+                text=_comment_text(i, comment, username, reply_count),
+                reply_markup=create_comment_buttons(str(comment.comment_id), has_replies=bool(reply_count))
             )
         
         # پیام نهایی با دکمه‌های اصلی
         final_keyboard = []
-        context.user_data['total_comments'] = remaining_comments
+        shown_comments += len(comments)
+        context.user_data['total_comments'] = shown_comments
         # اگر نظرات بیشتری باقی مانده بود
 
-        if remaining_comments < len(comments):
-            final_keyboard.append([InlineKeyboardButton(f"👁️ نمایش {(len(comments) - context.user_data['total_comments'])%5} نظر دیگر",
+        if shown_comments < total_comments:
+            final_keyboard.append([InlineKeyboardButton(f"👁️ نمایش {min(COMMENTS_PER_PAGE, total_comments - shown_comments)} نظر دیگر",
                                                         callback_data=f"more_comments_{item_id}")])
         
         # دکمه‌های اصلی
@@ -551,11 +552,10 @@ async def handle_comment_text(update: Update, context: CallbackContext) -> int:
         return ConversationHandler.END
     
     try:
-        db = next(get_db())
-        
         if target_type == "item":
             # Create comment for item
-            comment = create_comment(db, UUID(target_id), user_id, text)
+            async with get_async_db() as db:
+                comment = await create_comment(db, UUID(target_id), user_id, text)
             success_message = "نظر شما با موفقیت ثبت شد و پس از تأیید نمایش داده خواهد شد."
         else:
             # Handle other target types if needed
@@ -612,11 +612,10 @@ async def handle_comment_photo(update: Update, context: CallbackContext) -> int:
         # For example: media_url = await save_media_file(photo_file, filename)
         media_url = f"media/comments/{filename}"  # This is just a placeholder
         
-        db = next(get_db())
-        
         if target_type == "item":
             # Create comment for item with media
-            comment = create_comment(db, UUID(target_id), user_id, text, media_url)
+            async with get_async_db() as db:
+                comment = await create_comment(db, UUID(target_id), user_id, text, media_url)
             success_message = "نظر شما با موفقیت ثبت شد و پس از تأیید نمایش داده خواهد شد."
         else:
             # Handle other target types if needed
@@ -681,11 +680,10 @@ async def handle_comment_video(update: Update, context: CallbackContext) -> int:
         # For example: media_url = await save_media_file(video_file, filename)
         media_url = f"media/comments/{filename}"  # This is just a placeholder
         
-        db = next(get_db())
-        
         if target_type == "item":
             # Create comment for item with media
-            comment = create_comment(db, UUID(target_id), user_id, text, media_url)
+            async with get_async_db() as db:
+                comment = await create_comment(db, UUID(target_id), user_id, text, media_url)
             success_message = "نظر شما با موفقیت ثبت شد و پس از تأیید نمایش داده خواهد شد."
         else:
             # Handle other target types if needed
@@ -788,20 +786,19 @@ async def _process_reply_submission(update: Update, context: CallbackContext, te
         return ConversationHandler.END
 
     try:
-        db = next(get_db()) # Ensure get_db() is properly managed (e.g., contextmanager)
-
-        root_comment_id_uuid = context.user_data.get("current_reply_root_comment_id")
-        parent_reply_id_uuid = context.user_data.get("current_reply_parent_reply_id")
+        root_comment_id_uuid = UUID(root_comment_id_str)
+        parent_reply_id_uuid = UUID(parent_reply_id_str) if parent_reply_id_str else None
 
         # Call your existing CRUD function for creating a reply
-        reply = create_comment_reply(
-            db=db,
-            comment_id=root_comment_id_uuid,    # This is the root_comment_id
-            user_id=user_id,
-            text=text,
-            media_url=media_url,
-            parent_reply_id=parent_reply_id_uuid # This will be None or the UUID of the parent CommentReply
-        )
+        async with get_async_db() as db:
+            reply = await create_comment_reply(
+                db,
+                comment_id=root_comment_id_uuid,    # This is the root_comment_id
+                user_id=user_id,
+                text=text,
+                media_url=media_url,
+                parent_reply_id=parent_reply_id_uuid # This will be None or the UUID of the parent CommentReply
+            )
         # The CRUD function `create_comment_reply` already sets status to APPROVED.
         success_message = "پاسخ شما با موفقیت ثبت شد و پس از تأیید نمایش داده خواهد شد."
         await update.message.reply_text(success_message, reply_markup=create_main_menu_buttons())
@@ -908,55 +905,48 @@ async def show_replies_or_sub_replies_callback(update: Update, context: Callback
         await query.edit_message_text("خطا: اطلاعات نامعتبر برای نمایش پاسخ‌ها.")
         return
 
-    db = next(get_db())
-    current_replies_list: List[CommentReply] = []
-    total_at_this_level: int = 0
-    header_message = ""
-    
-    root_comment_uuid = UUID(root_comment_id_str) if not "ROOT" else context.user_data.get("current_reply_root_comment_id")
+    root_comment_uuid = UUID(root_comment_id_str) if root_comment_id_str != "ROOT" else None
+    parent_reply_uuid = UUID(parent_id_str) if parent_id_str != "ROOT" else None
+    async with get_async_db() as db:
+        current_replies_list, total_at_this_level = await get_reply_page(
+            db, comment_id=root_comment_uuid, parent_reply_id=parent_reply_uuid, offset=offset, limit=limit
+        )
 
-    # Fetching data based on whether it's for root comment or a sub-reply
-    if parent_id_str == "ROOT":
-        # TODO: Fetch the main comment's text to show as header if desired
-        # main_comment = db.query(Comment).filter(Comment.comment_id == root_comment_uuid).first()
-        # if main_comment: header_message = f"پاسخ‌ها به نظر: \"{main_comment.text[:30]}...\"\n\n"
-        # else: header_message = "پاسخ‌ها به نظر اصلی:\n\n"
+        # Sub-reply counts for this page and the parent/grandparent for the back button, in one query
+        tree_info = await get_reply_tree_info(
+            db, [reply.reply_id for reply, _ in current_replies_list] + ([parent_reply_uuid] if parent_reply_uuid else [])
+        )
+
+    # Header based on whether it's for root comment or a sub-reply
+    current_parent_reply = tree_info.get(parent_reply_uuid)
+    if current_parent_reply:
+        header_message = f"پاسخ‌های داخلی (سطح {current_parent_reply.depth + 2}):\n\n"
+    elif parent_reply_uuid is None:
         header_message = "پاسخ‌ها به نظر اصلی:\n\n"
-        current_replies_list = get_comment_replies(db, root_comment_uuid, ContentStatus.APPROVED)
-        total_at_this_level = count_direct_replies_to_comment(db, root_comment_uuid, ContentStatus.APPROVED)
     else:
-        parent_reply_uuid = UUID(parent_id_str)
-        # TODO: Fetch the parent reply's text to show as header if desired
-        # parent_reply_for_header = db.query(CommentReply).filter(CommentReply.reply_id == parent_reply_uuid).first()
-        # if parent_reply_for_header: header_message = f"پاسخ‌های داخلی به: \"{parent_reply_for_header.text[:30]}...\"\n\n"
-        # else: header_message = f"پاسخ‌های داخلی:\n\n"
         header_message = "پاسخ‌های داخلی:\n\n"
-        current_replies_list = get_reply_replies(db, parent_reply_uuid, ContentStatus.APPROVED)
-        total_at_this_level = count_sub_replies(db, parent_reply_uuid, ContentStatus.APPROVED)
+
+    # Back button: sub-replies go back to the parent's level, root replies have no back target here
+    back_button = None
+    if current_parent_reply:
+        if current_parent_reply.parent_reply_id: # Go to grandparent's replies
+            back_button = InlineKeyboardButton("🔙 بازگشت به سطح بالاتر", callback_data=_replies_callback_data(None, current_parent_reply.parent_reply_id, 0))
+        else: # Parent was a direct reply to comment, so back to root replies
+            back_button = InlineKeyboardButton("🔙 بازگشت به پاسخ های نظر اصلی", callback_data=_replies_callback_data(current_parent_reply.comment_id, None, 0))
 
     if not current_replies_list and offset == 0:
         no_replies_text = header_message + "هیچ پاسخی در این سطح ثبت نشده است."
-        # Simplified back button logic for now
-        back_button_cb = f"show_comments_for_item_{root_comment_id_str}" # Needs item_id, or back to comment
-        if parent_id_str != "ROOT": # If viewing sub-replies, back goes to parent's replies (or root comment replies)
-             # This needs the parent of the current parent_id_str or the root_comment_id
-             # For simplicity, back to root replies of the original comment
-             # Needs a way to get the original comment if we only have parent_reply_uuid
-             original_comment_of_thread = db.execute(select(CommentReply.comment_id).where(CommentReply.reply_id == parent_reply_uuid)).scalar_one_or_none() if parent_id_str != "ROOT" else root_comment_uuid
-             if original_comment_of_thread:
-                back_button_cb = f"show_replies_{str(original_comment_of_thread)}_ROOT_0"
-
-        await query.edit_message_text(no_replies_text, reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("🔙 بازگشت", callback_data=back_button_cb)]]))
+        keyboard = [[back_button]] if back_button else []
+        await query.edit_message_text(no_replies_text, reply_markup=InlineKeyboardMarkup(keyboard))
         return
 
     # To avoid hitting message limits, send header, then each reply, then pagination.
     # Editing the original message might be too complex if many replies.
     await context.bot.send_message(chat_id=update.effective_chat.id, text=header_message)
 
-    for reply in current_replies_list:
-        user = get_user(db, reply.user_id) # Assume get_user exists
-        username = user.username if user and user.username else f"کاربر گمنام ({reply.user_id % 1000})" # Avoid showing full ID
-        
+    for reply, username in current_replies_list:
+        username = username or f"کاربر گمنام ({reply.user_id % 1000})" # Avoid showing full ID
+    
         reply_display_text = f"👤 {username}:\n{reply.text}"
         if reply.media_url:
             reply_display_text += f"\n🖼️ [رسانه]" # You might want to send media directly if it's just one
@@ -966,11 +956,11 @@ async def show_replies_or_sub_replies_callback(update: Update, context: Callback
         buttons_for_this_reply_row.append(
             [InlineKeyboardButton(f"↪️ پاسخ به این", callback_data=f"rtr_{reply.reply_id}")]
         )
-        
-        num_sub_replies = count_sub_replies(db, reply.reply_id, ContentStatus.APPROVED)
+    
+        num_sub_replies = tree_info[reply.reply_id].child_count
         if num_sub_replies > 0:
             buttons_for_this_reply_row.append(
-                [InlineKeyboardButton(f"👁️ {num_sub_replies} پاسخ داخلی", callback_data=f"show_replies_ROOT_{reply.reply_id}_0")]
+                [InlineKeyboardButton(f"👁️ {num_sub_replies} پاسخ داخلی", callback_data=_replies_callback_data(None, reply.reply_id, 0))]
             )
         await context.bot.send_message(
             chat_id=update.effective_chat.id,
@@ -985,11 +975,11 @@ async def show_replies_or_sub_replies_callback(update: Update, context: Callback
     pagination_row = []
     if offset > 0:
         pagination_row.append(
-            InlineKeyboardButton("صفحه قبل", callback_data=f"show_replies_ROOT_{parent_id_str}_{max(0, offset - limit)}")
+            InlineKeyboardButton("صفحه قبل", callback_data=_replies_callback_data(root_comment_uuid, parent_reply_uuid, max(0, offset - limit)))
         )
     if offset + len(current_replies_list) < total_at_this_level:
         pagination_row.append(
-            InlineKeyboardButton("صفحه بعد", callback_data=f"show_replies_ROOT_{parent_id_str}_{offset + limit}")
+            InlineKeyboardButton("صفحه بعد", callback_data=_replies_callback_data(root_comment_uuid, parent_reply_uuid, offset + limit))
         )
     if pagination_row:
         final_buttons_layout.append(pagination_row)
@@ -1000,23 +990,11 @@ async def show_replies_or_sub_replies_callback(update: Update, context: Callback
     else: # We are viewing sub-replies of parent_id_str
         final_buttons_layout.append([InlineKeyboardButton(f"💬 افزودن پاسخ به این سطح", callback_data=f"rtr_{root_comment_id_str}_{parent_id_str}")])
 
-    # Back button logic needs to be robust.
-    # If viewing sub-replies (parent_id_str is a UUID), "Back" should go to the parent of these sub-replies.
-    # This means finding the parent of parent_id_str or going to ROOT.
-    if parent_id_str != "ROOT":
-        current_parent_reply = db.execute(select(CommentReply.parent_reply_id, CommentReply.comment_id).where(CommentReply.reply_id == UUID(parent_id_str))).first()
-        if current_parent_reply:
-            grandparent_reply_id = current_parent_reply.parent_reply_id
-            actual_root_comment_id = current_parent_reply.comment_id # Should match root_comment_id_str
-            if grandparent_reply_id: # Go to grandparent's replies
-                 final_buttons_layout.append([InlineKeyboardButton("🔙 بازگشت به سطح بالاتر", callback_data=f"show_replies_{str(actual_root_comment_id)}_{str(grandparent_reply_id)}_0")])
-            else: # Parent was a direct reply to comment, so back to root replies
-                 final_buttons_layout.append([InlineKeyboardButton("🔙 بازگشت به پاسخ های نظر اصلی", callback_data=f"show_replies_{str(actual_root_comment_id)}_ROOT_0")])
-    else:
-        # We are at replies for the main comment. "Back" could go to the list of comments for the item.
-        # This depends on your overall bot structure.
-        # Example: final_buttons_layout.append([InlineKeyboardButton("🔙 بازگشت به لیست نظرات", callback_data=f"view_item_comments_{ITEM_ID_HERE}")])
-        pass # Add appropriate "back to main comments list" or "back to item" button if needed
+    if back_button:
+        final_buttons_layout.append([back_button])
+    if current_parent_reply and current_parent_reply.depth >= 1:
+        # رشته‌های عمیق: پرش مستقیم به پاسخ‌های نظر اصلی
+        final_buttons_layout.append([InlineKeyboardButton("⏫ بازگشت به ابتدای گفتگو", callback_data=_replies_callback_data(current_parent_reply.comment_id, None, 0))])
 
     if final_buttons_layout:
         await context.bot.send_message(
@@ -1024,6 +1002,17 @@ async def show_replies_or_sub_replies_callback(update: Update, context: Callback
             text="گزینه‌ها:",
             reply_markup=InlineKeyboardMarkup(final_buttons_layout)
         )
+
+def _replies_callback_data(comment_id: UUID | None, parent_reply_id: UUID | None, offset: int) -> str:
+    """
+    Build "show_replies_{root_comment_id}_{parent_id}_{offset}" for a reply level.
+
+    Only one of the two ids is sent (the other is ROOT) so the data stays
+    within Telegram's 64-byte callback limit.
+    """
+    if parent_reply_id is not None:
+        return f"show_replies_ROOT_{parent_reply_id}_{offset}"
+    return f"show_replies_{comment_id}_ROOT_{offset}"
 ############################################
 
 # اضافه کردن هندلر جدید برای افزودن آیتم
@@ -1108,9 +1097,9 @@ async def add_item_description(update: Update, context: CallbackContext) -> int:
         description = None
     
     # ایجاد آیتم جدید در دیتابیس
-    db = next(get_db())
     try:
-        new_item = create_item(db, item_type, item_name, description)
+        async with get_async_db() as db:
+            new_item = await create_item(db, item_type, item_name, description)
         
         # پاک کردن داده‌های موقت
         context.user_data.pop("add_item_type", None)
@@ -1157,13 +1146,12 @@ async def rate_item_callback(update: Update, context: CallbackContext):
         _,_, target_type, target_id, score = query.data.split("_", 4)
         score = int(score)
         
-        # Create rating
-        db = next(get_db())
         logging.info(f"Rating item {target_type} {target_id} with score {score}")
         # Create rating based on target type
         if target_type in ["devices", "liquid"]:
             
-            rating = create_item_rating(db, user_id, UUID(target_id), score)
+            async with get_async_db() as db:
+                rating = await create_item_rating(db, user_id, UUID(target_id), score)
             if rating:
                 await query.answer(f"امتیاز {score} با موفقیت ثبت شد!")
             else:
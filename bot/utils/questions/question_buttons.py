@@ -18,6 +18,8 @@ def create_tech_question_buttons(questions: List[Dict[str, Any]]) -> InlineKeybo
         # نمایش متن سوال و امتیاز آن
         rating_stars = "★" * int(question["average_rating"]) + "☆" * (5 - int(question["average_rating"]))
         button_text = f"{question['text'][:30]}... ({rating_stars})"
+        if question.get("reply_count"):
+            button_text += f" 💬{question['reply_count']}"
         
         keyboard.append([
             InlineKeyboardButton(
@@ -132,6 +134,8 @@ def create_more_questions_buttons(questions: List[Dict[str, Any]], start_index:
     for question in questions[start_index:start_index+10]:
         rating_stars = "★" * int(question["average_rating"]) + "☆" * (5 - int(question["average_rating"]))
         button_text = f"{question['text'][:30]}... ({rating_stars})"
+        if question.get("reply_count"):
+            button_text += f" 💬{question['reply_count']}"
         
         keyboard.append([
             InlineKeyboardButton(
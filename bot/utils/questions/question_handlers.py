@@ -3,14 +3,14 @@ from telegram.ext import CallbackContext, ConversationHandler, CallbackQueryHand
 from typing import Dict, Any, List, Optional, Tuple
 from uuid import UUID
 import logging
-from database.db_handler import get_db
-from database.db_operations import (
+from database.db_handler import get_async_db
+from database.async_db_operations import (
     get_items_by_type, get_item, get_comments_by_item, get_comment_replies,
-    get_top_tech_questions, get_tech_question, get_question_replies, create_item_rating, create_question_rating,
+    get_top_tech_questions, get_tech_question, get_question_replies, get_question_reply_page, create_item_rating, create_question_rating,
     get_user, create_item, create_comment, create_tech_question, create_comment_reply,
     create_question_reply
 )
-from database.models import ItemType, ContentStatus, TargetType
+from database.models import ItemType, ContentStatus, TargetType, QuestionReply
 from utils.buttons import (
     create_main_menu_buttons, 
     create_cancel_button, create_back_to_main_button
@@ -22,9 +22,11 @@ from utils.questions.question_buttons import (
     create_more_questions_buttons,
     create_question_replies_buttons
 )
+from utils.ratings import format_rating_distribution
 
 # حالت‌های مکالمه برای ثبت سوال یا ریپلای
 ADD_QUESTION_TEXT, ADD_QUESTION_MEDIA, ADD_REPLY_TEXT, ADD_REPLY_MEDIA = range(4)
+REPLIES_PER_PAGE = 5  # تعداد پاسخ‌های سوال در هر صفحه
 
 # Technical questions callback handler
 async def tech_callback(update: Update, context: CallbackContext) -> None:
@@ -33,8 +35,8 @@ async def tech_callback(update: Update, context: CallbackContext) -> None:
     await query.answer()
     
     # Get top technical questions
-    db = next(get_db())
-    questions = get_top_tech_questions(db)
+    async with get_async_db() as db:
+        questions = await get_top_tech_questions(db, limit=11)  # یکی بیشتر برای دکمه «سوالات بیشتر»
     
     if not questions:
         await query.edit_message_text(
@@ -51,7 +53,8 @@ async def tech_callback(update: Update, context: CallbackContext) -> None:
         {
             "question_id": str(q.question_id),
             "text": q.text,
-            "average_rating": q.average_rating
+            "average_rating": q.average_rating,
+            "reply_count": q.reply_count
         } for q in questions
     ]
     
@@ -72,8 +75,8 @@ async def question_detail_callback(update: Update, context: CallbackContext) ->
     _, question_id = query.data.split("_", 1)
     
     # Get question details
-    db = next(get_db())
-    question = get_tech_question(db, UUID(question_id))
+    async with get_async_db() as db:
+        question = await get_tech_question(db, UUID(question_id))
     
     if not question:
         await query.edit_message_text(
@@ -82,15 +85,15 @@ async def question_detail_callback(update: Update, context: CallbackContext) ->
         )
         return
     
-    # Get approved replies for the question
-    replies = get_question_replies(db, question.question_id, ContentStatus.APPROVED)
-    
     # Format question details
     rating_stars = "★" * int(question.average_rating) + "☆" * (5 - int(question.average_rating))
     question_details = (
         f"❓ سوال: {question.text}\n\n"
-        f"⭐ امتیاز: {rating_stars} ({question.average_rating:.1f} از 5 - {question.rating_count} رأی)"
+        f"⭐ امتیاز: {rating_stars} ({question.average_rating:.1f} از 5 - {question.rating_count} رأی)\n"
+        f"💬 {question.reply_count} پاسخ"
     )
+    if question.rating_count:
+        question_details += "\n\n" + format_rating_distribution(question)
     
     # Check if question has media
     if question.media_url:
@@ -130,17 +133,16 @@ async def add_question_text_callback(update: Update, context: CallbackContext) -
     context.user_data['question_text'] = message.text
     
     # Save the question to the database
-    db = next(get_db())
     user_id = update.effective_user.id
     
     try:
         # Create the tech question in the database
-        question = create_tech_question(
-            db=db,
-            user_id=user_id,
-            text=context.user_data['question_text'],
-        )
-        db.commit()
+        async with get_async_db() as db:
+            question = await create_tech_question(
+                db,
+                user_id=user_id,
+                text=context.user_data['question_text'],
+            )
         
         # Store question ID in user data
         context.user_data['current_question_id'] = str(question.question_id)
@@ -158,7 +160,6 @@ async def add_question_text_callback(update: Update, context: CallbackContext) -
         return ADD_QUESTION_MEDIA
         
     except Exception as e:
-        db.rollback()
         logger = logging.getLogger(__name__)
         logger.error(f"Error in add_question_text_callback: {str(e)}")
         
@@ -219,15 +220,16 @@ async def add_question_media_handler(update: Update, context: CallbackContext) -
         return ADD_QUESTION_MEDIA
     
     # Save file_id to database
-    db = next(get_db())
     try:
         # Update the question with media information
-        question = get_tech_question(db, UUID(question_id))
+        async with get_async_db() as db:
+            question = await get_tech_question(db, UUID(question_id))
+            if question:
+                question.media_url = file
+                question.media_type = media_type
+                await db.commit()
+        
         if question:
-            question.media_url = file
-            question.media_type = media_type
-            db.commit()
-            
             await message.reply_text(
                 "رسانه با موفقیت به سوال شما اضافه شد.",
                 reply_markup=InlineKeyboardMarkup([
@@ -243,7 +245,6 @@ async def add_question_media_handler(update: Update, context: CallbackContext) -
             return ConversationHandler.END
             
     except Exception as e:
-        db.rollback()
         logger = logging.getLogger(__name__)
         logger.error(f"Error in add_question_media_handler: {str(e)}")
         
@@ -314,21 +315,24 @@ async def rate_question_callback(update: Update, context: CallbackContext) -> No
     rating = int(rating)
     
     # ثبت امتیاز
-    db = next(get_db())
     user_id = update.effective_user.id
     
     try:
-        create_question_rating(db,user_id, UUID(question_id), rating)
-        db.commit()
+        async with get_async_db() as db:
+            rated_question = await create_question_rating(db, user_id, UUID(question_id), rating)
+        
+        if rated_question:
+            result_text = f"امتیاز {rating} ستاره با موفقیت ثبت شد. با تشکر از شما!"
+        else:
+            result_text = "شما قبلاً به این سوال امتیاز داده‌اید."
         
         await query.edit_message_text(
-            f"امتیاز {rating} ستاره با موفقیت ثبت شد. با تشکر از شما!",
+            result_text,
             reply_markup=InlineKeyboardMarkup([
                 [InlineKeyboardButton("🔙 بازگشت به جزئیات سوال", callback_data=f"question_{question_id}")]
             ])
         )
     except Exception as e:
-        db.rollback()
         logger = logging.getLogger(__name__)
         logger.error(f"Error in rate_question_callback: {str(e)}")
         
@@ -380,18 +384,17 @@ async def add_reply_text_callback(update: Update, context: CallbackContext) -> i
     context.user_data["reply_text"] = message.text
     
     # Save the reply to the database
-    db = next(get_db())
     user_id = update.effective_user.id
     
     try:
         # Create the reply in the database
-        reply = create_question_reply(
-            db=db,
-            user_id=user_id,
-            question_id=UUID(question_id),
-            text=context.user_data["reply_text"],
-        )
-        db.commit()
+        async with get_async_db() as db:
+            reply = await create_question_reply(
+                db,
+                user_id=user_id,
+                question_id=UUID(question_id),
+                text=context.user_data["reply_text"],
+            )
         
         # Store reply ID in user data
         context.user_data["current_reply_id"] = str(reply.reply_id)
@@ -409,7 +412,6 @@ async def add_reply_text_callback(update: Update, context: CallbackContext) -> i
         return ADD_REPLY_MEDIA
         
     except Exception as e:
-        db.rollback()
         logger = logging.getLogger(__name__)
         logger.error(f"Error in add_reply_text_callback: {str(e)}")
         
@@ -470,15 +472,16 @@ async def add_reply_media_handler(update: Update, context: CallbackContext) -> i
         return ADD_REPLY_MEDIA
     
     # Save file_id to database
-    db = next(get_db())
     try:
         # Get the reply and update with media information
-        reply = db.query(QuestionReply).filter(QuestionReply.reply_id == UUID(reply_id)).first()
+        async with get_async_db() as db:
+            reply = await db.get(QuestionReply, UUID(reply_id))
+            if reply:
+                reply.media_url = file
+                reply.media_type = media_type
+                await db.commit()
+        
         if reply:
-            reply.media_url = file
-            reply.media_type = media_type
-            db.commit()
-            
             await message.reply_text(
                 "رسانه با موفقیت به پاسخ شما اضافه شد.",
                 reply_markup=InlineKeyboardMarkup([
@@ -494,7 +497,6 @@ async def add_reply_media_handler(update: Update, context: CallbackContext) -> i
             return ConversationHandler.END
             
     except Exception as e:
-        db.rollback()
         logger = logging.getLogger(__name__)
         logger.error(f"Error in add_reply_media_handler: {str(e)}")
         
@@ -563,68 +565,75 @@ async def cancel_callback(update: Update, context: CallbackContext) -> int:
 ########################################
 
 async def view_question_replies_callback(update: Update, context: CallbackContext) -> None:
-    """Handle sending comments for a question."""
+    """Handle sending comments for a question, one page at a time ("question_replies_{id}" or "more_question_replies_{id}_{offset}")."""
     query = update.callback_query
     await query.answer()
     
-    # Extract question ID from callback data
-    _,_, question_id = query.data.split("_", 2)
+    # Extract question ID and offset from callback data
+    if query.data.startswith("more_"):
+        question_id, offset = query.data[len("more_question_replies_"):].rsplit("_", 1)
+        offset = int(offset)
+    else:
+        _,_, question_id = query.data.split("_", 2)
+        offset = 0
     
-    # Get question details and comments
-    db = next(get_db())
-
     try:
-        question = get_tech_question(db,question_id)
+        question_uuid = UUID(question_id)
     except ValueError:
         await query.edit_message_text(
             "شناسه محصول نامعتبر است. لطفاً دوباره تلاش کنید.",
             reply_markup=create_main_menu_buttons()
            )
         return
+
+    # Get question details and one page of comments (اتصال دیتابیس پیش از ارسال پیام‌ها آزاد می‌شود)
+    async with get_async_db() as db:
+        question = await get_tech_question(db, question_uuid)
+        if question:
+            comments, total_comments = await get_question_reply_page(db, question_uuid, offset=offset, limit=REPLIES_PER_PAGE)
+
     if not question:
         await query.edit_message_text(
             "سوال مورد نظر یافت نشد.",
             reply_markup=create_main_menu_buttons()
         )
         return
-    
-    
-    comments = get_question_replies(db, UUID(question_id), ContentStatus.APPROVED)    
-        # ابتدا پیام اصلی را به عنوان هدر نمایش می‌دهیم
-    header_text = f"💬 نظرات کاربران برای \n\n{question.text}:"
+
+    # ابتدا پیام اصلی را به عنوان هدر نمایش می‌دهیم
+    if offset:
+        header_text = f"💬 نظرات بیشتر برای \n\n{question.text}:"
+    else:
+        header_text = f"💬 نظرات کاربران برای \n\n{question.text}:"
     await query.edit_message_text(header_text)
     try:
         #no reply
         if not comments:
-            no_comments_text = "هنوز نظری ثبت نشده است. شما می‌توانید اولین نظر را ثبت کنید."
+            no_comments_text = "هنوز نظری ثبت نشده است. شما می‌توانید اولین نظر را ثبت کنید." if not offset else "نظر بیشتری وجود ندارد."
             keyboard = InlineKeyboardMarkup([
-                [InlineKeyboardButton("💬 افزودن پاسخ",callback_data=f"reply_question_{question}")]
+                [InlineKeyboardButton("💬 افزودن پاسخ",callback_data=f"reply_question_{question.question_id}")],
                 [InlineKeyboardButton("🔙 بازگشت به منوی اصلی", callback_data="main_menu")]
             ])
             await context.bot.send_message(chat_id=query.message.chat_id, text=no_comments_text, reply_markup=keyboard)
             return
         
-        
-        if comments:
-            for i, comment in enumerate(comments, 1):
-                user = get_user(db, comment.user_id)
-                username = user.username if user and user.username else f"کاربر {comment.user_id}"
-                comment_text = f"💬 نظر #{i}:\n\n"
-                comment_text += f"👤 {username}:\n{comment.text}\n"
-                
-                # Add media indicator if comment has media
-                if comment.media_url:
-                    comment_text += "🖼️ [دارای تصویر یا ویدیو]\n"
-                await context.bot.send_message(chat_id=query.message.chat_id, text=comment_text)
+        for i, (comment, username) in enumerate(comments, offset + 1):
+            username = username or f"کاربر {comment.user_id}"
+            comment_text = f"💬 نظر #{i}:\n\n"
+            comment_text += f"👤 {username}:\n{comment.text}\n"
             
-                
-        
+            # Add media indicator if comment has media
+            if comment.media_url:
+                comment_text += "🖼️ [دارای تصویر یا ویدیو]\n"
+            await context.bot.send_message(chat_id=query.message.chat_id, text=comment_text)
         
-        # Create reply markup with pagination if needed
-        reply_markup = create_question_replies_buttons(str(question.question_id))
-        
-        await query.edit_message_text(
-            comment_text,
+        # پیام نهایی با دکمه «نمایش پاسخ‌های بیشتر» اگر پاسخ دیگری مانده باشد
+        shown = offset + len(comments)
+        reply_markup = create_question_replies_buttons(
+            str(question.question_id), has_more_replies=shown < total_comments, offset=shown
+        )
+        await context.bot.send_message(
+            chat_id=query.message.chat_id,
+            text="برای ادامه یکی از گزینه‌های زیر را انتخاب کنید:",
             reply_markup=reply_markup
         )
 
@@ -693,4 +702,5 @@ def register_questions_callback_handlers(application):
         persistent=False
     )
     application.add_handler(add_reply_conv)
-    application.add_handler(CallbackQueryHandler(view_question_replies_callback, pattern="^question_replies_[0-9a-f-]+$"))
\ No newline at end of file
+    application.add_handler(CallbackQueryHandler(view_question_replies_callback, pattern="^question_replies_[0-9a-f-]+$"))
+    application.add_handler(CallbackQueryHandler(view_question_replies_callback, pattern=r"^more_question_replies_[0-9a-f-]+_\d+$"))
\ No newline at end of file
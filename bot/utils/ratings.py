@@ -0,0 +1,8 @@
+def format_rating_distribution(target, bar_width: int = 10) -> str:
+    """Return one bar per star (5 down to 1) from an Item's or TechQuestion's rating counters."""
+    lines = []
+    for star in range(5, 0, -1):
+        count = getattr(target, f"rating_{star}_count") or 0
+        filled = round(count / target.rating_count * bar_width) if target.rating_count else 0
+        lines.append(f"{star}★ {'█' * filled}{'░' * (bar_width - filled)} {count}")
+    return "\n".join(lines)